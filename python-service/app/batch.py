@@ -0,0 +1,86 @@
+"""
+Batch Processing Module
+
+Processes many trial balance files from one request - a ZIP archive or a
+multipart list - by fanning them out over the ProcessingPipeline with bounded
+concurrency, and consolidates the per-file outcomes into one response.
+"""
+
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from .ingest import SpooledUpload
+from .models import BatchFileResult, BatchProcessingResponse
+from .pipeline import ProcessingPipeline
+from .utils.env import env_int
+
+logger = logging.getLogger(__name__)
+
+
+class BatchProcessor:
+    """Runs the processing pipeline over a batch of spooled files"""
+
+    def __init__(self, pipeline: ProcessingPipeline, concurrency: Optional[int] = None):
+        """
+        Configuration (environment):
+        - BATCH_CONCURRENCY: files processed at the same time (default: pool worker count)
+        - BATCH_MAX_FILES: files accepted per batch, archive members included (default: 500)
+        - BATCH_MAX_UNCOMPRESSED_BYTES: total size of extracted archive members (default: 2 GiB)
+        """
+        self.pipeline = pipeline
+        self.concurrency = concurrency or env_int('BATCH_CONCURRENCY', pipeline.processing_pool.max_workers)
+        self.max_files = env_int('BATCH_MAX_FILES', 500)
+        self.max_uncompressed_bytes = env_int('BATCH_MAX_UNCOMPRESSED_BYTES', 2 * 1024 ** 3)
+
+    async def process(
+        self,
+        uploads: List[SpooledUpload],
+        entity_uuid: str,
+        source_system_hint: Optional[str] = None
+    ) -> BatchProcessingResponse:
+        """Process all files; one failing file does not fail the batch"""
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def process_one(upload: SpooledUpload) -> BatchFileResult:
+            async with semaphore:
+                queued_seconds = time.perf_counter() - started
+                file_started = time.perf_counter()
+                try:
+                    response = await self.pipeline.process(
+                        upload.path, upload.filename, entity_uuid, source_system_hint
+                    )
+                    status, error = "succeeded", None
+                except Exception as e:
+                    logger.warning(f"Batch file {upload.filename} failed: {str(e)}")
+                    response, status, error = None, "failed", str(e)
+                return BatchFileResult(
+                    filename=upload.filename,
+                    status=status,
+                    file_size=upload.size,
+                    file_sha256=upload.sha256,
+                    row_count=response.row_count if response else 0,
+                    queued_seconds=round(queued_seconds, 4),
+                    processing_time_seconds=round(time.perf_counter() - file_started, 4),
+                    result=response,
+                    error=error
+                )
+
+        files = await asyncio.gather(*(process_one(upload) for upload in uploads))
+        succeeded = sum(1 for result in files if result.status == "succeeded")
+        elapsed = time.perf_counter() - started
+
+        logger.info(f"Batch of {len(files)} files done in {elapsed:.2f}s ({succeeded} succeeded)")
+        return BatchProcessingResponse(
+            success=succeeded == len(files) and len(files) > 0,
+            file_count=len(files),
+            succeeded_count=succeeded,
+            failed_count=len(files) - succeeded,
+            total_row_count=sum(result.row_count for result in files),
+            concurrency=self.concurrency,
+            processing_time_seconds=round(elapsed, 4),
+            files=list(files),
+            message=f"Processed {succeeded} of {len(files)} files"
+        )
@@ -0,0 +1,225 @@
+"""
+Chart of Accounts Module
+
+Bundled index of the DATEV standard charts SKR03 and SKR04 (app/data/*.csv,
+the most common general ledger accounts). It provides exact lookups of
+account descriptions and a sorted interval index that classifies account
+numbers by range into balance sheet (bs), P&L (pl), subledger or
+statistical accounts plus a category. Lookups run vectorized over a whole
+column of account numbers, so most rows are resolved locally and only the
+misses are sent to the LLM.
+
+Account numbers are read with the file's general ledger account length
+(4 digits, or longer with trailing zeros); numbers one digit longer are
+personal accounts: debtors (1-6...) or creditors (7-9...).
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SKR03 = "skr03"
+SKR04 = "skr04"
+CHARTS = (SKR03, SKR04)
+AUTO = "auto"
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+# Base length of general ledger account numbers
+BASE_LENGTH = 4
+
+# Accounts of one length needed to take it as the ledger length (a stray number is not)
+MIN_LEDGER_ACCOUNTS = 2
+
+
+@dataclass(frozen=True)
+class AccountRange:
+    """Inclusive range of 4-digit general ledger accounts"""
+    start: int
+    end: int
+    account_type: str
+    category: str
+
+
+# Account classes by chart. SKR03 is organized by process (classes 2-4 and 8 are
+# P&L, 7 holds inventories), SKR04 by financial statement (classes 0-3 balance sheet).
+RANGES = {
+    SKR03: [
+        AccountRange(0, 99, "bs", "intangible_assets"),
+        AccountRange(100, 499, "bs", "fixed_assets"),
+        AccountRange(500, 599, "bs", "financial_assets"),
+        AccountRange(600, 799, "bs", "liabilities"),
+        AccountRange(800, 899, "bs", "equity"),
+        AccountRange(900, 979, "bs", "provisions"),
+        AccountRange(980, 999, "bs", "accruals"),
+        AccountRange(1000, 1299, "bs", "cash"),
+        AccountRange(1300, 1399, "bs", "current_assets"),
+        AccountRange(1400, 1499, "bs", "receivables"),
+        AccountRange(1500, 1599, "bs", "other_assets"),
+        AccountRange(1600, 1799, "bs", "liabilities"),
+        AccountRange(1800, 1999, "bs", "equity"),
+        AccountRange(2000, 2999, "pl", "non_operating"),
+        AccountRange(3000, 3969, "pl", "material_expense"),
+        AccountRange(3970, 3999, "bs", "inventory"),
+        AccountRange(4000, 6999, "pl", "operating_expense"),
+        AccountRange(7000, 7999, "bs", "inventory"),
+        AccountRange(8000, 8999, "pl", "revenue"),
+        AccountRange(9000, 9999, "statistical", "statistical"),
+    ],
+    SKR04: [
+        AccountRange(0, 199, "bs", "intangible_assets"),
+        AccountRange(200, 799, "bs", "fixed_assets"),
+        AccountRange(800, 999, "bs", "financial_assets"),
+        AccountRange(1000, 1199, "bs", "inventory"),
+        AccountRange(1200, 1299, "bs", "receivables"),
+        AccountRange(1300, 1499, "bs", "other_assets"),
+        AccountRange(1500, 1599, "bs", "current_assets"),
+        AccountRange(1600, 1899, "bs", "cash"),
+        AccountRange(1900, 1999, "bs", "accruals"),
+        AccountRange(2000, 2999, "bs", "equity"),
+        AccountRange(3000, 3099, "bs", "provisions"),
+        AccountRange(3100, 3899, "bs", "liabilities"),
+        AccountRange(3900, 3999, "bs", "accruals"),
+        AccountRange(4000, 4999, "pl", "revenue"),
+        AccountRange(5000, 5999, "pl", "material_expense"),
+        AccountRange(6000, 6999, "pl", "operating_expense"),
+        AccountRange(7000, 7999, "pl", "non_operating"),
+        AccountRange(9000, 9999, "statistical", "statistical"),
+    ],
+}
+
+
+class ChartIndex:
+    """Sorted account numbers with descriptions, and the account class intervals of one chart"""
+
+    def __init__(self, chart: str, numbers: np.ndarray, descriptions: np.ndarray, ranges: List[AccountRange]):
+        order = np.argsort(numbers, kind="stable")
+        self.chart = chart
+        self.numbers = numbers[order].astype(np.int32)
+        self.descriptions = descriptions[order]
+        self.range_starts = np.array([r.start for r in ranges], dtype=np.int32)
+        self.range_ends = np.array([r.end for r in ranges], dtype=np.int32)
+        self.range_types = np.array([r.account_type for r in ranges], dtype=object)
+        self.range_categories = np.array([r.category for r in ranges], dtype=object)
+
+    @classmethod
+    def load(cls, chart: str) -> 'ChartIndex':
+        """Index of a bundled chart (skr03 or skr04)"""
+        if chart not in CHARTS:
+            raise ValueError(f"Unknown chart of accounts: {chart} (expected one of {', '.join(CHARTS)})")
+        frame = pd.read_csv(os.path.join(DATA_DIR, f"{chart}.csv"), sep=";", dtype=str, encoding="utf-8")
+        return cls(
+            chart,
+            frame["account_number"].astype(int).to_numpy(),
+            frame["description"].to_numpy(dtype=object),
+            RANGES[chart]
+        )
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def describe(self, account_number: str) -> Optional[str]:
+        """Standard description of one account, or None"""
+        return self.lookup([account_number])["description"].iloc[0]
+
+    def lookup(self, account_numbers: Sequence[str], ledger_length: Optional[int] = None) -> pd.DataFrame:
+        """
+        Description, account_type and category for each account number (None where
+        unknown), aligned with the input. ledger_length defaults to ledger_length_of(account_numbers).
+        """
+        keys = pd.Series(list(account_numbers), dtype=object).astype(str).str.strip()
+        numeric = keys.str.fullmatch(r"\d{1,9}").fillna(False).to_numpy(dtype=bool)
+        lengths = np.where(numeric, np.maximum(keys.str.len().to_numpy(dtype=np.int64), BASE_LENGTH), 0)
+        values = np.zeros(len(keys), dtype=np.int64)
+        values[numeric] = keys[numeric].astype(np.int64).to_numpy()
+        ledger_length = ledger_length or ledger_length_of(account_numbers)
+
+        descriptions = np.full(len(keys), None, dtype=object)
+        account_types = np.full(len(keys), None, dtype=object)
+        categories = np.full(len(keys), None, dtype=object)
+
+        # General ledger accounts: scale down to the 4-digit base number
+        ledger = numeric & (lengths == ledger_length)
+        scale = 10 ** (ledger_length - BASE_LENGTH)
+        base = values // scale
+
+        position = np.searchsorted(self.range_starts, base, side="right") - 1
+        in_range = ledger & (position >= 0)
+        in_range[in_range] &= base[in_range] <= self.range_ends[position[in_range]]
+        account_types[in_range] = self.range_types[position[in_range]]
+        categories[in_range] = self.range_categories[position[in_range]]
+
+        # Exact descriptions only for base numbers (no suffix digits)
+        exact = ledger & (values % scale == 0)
+        position = np.minimum(np.searchsorted(self.numbers, base), len(self.numbers) - 1)
+        found = exact & (self.numbers[position] == base)
+        descriptions[found] = self.descriptions[position[found]]
+
+        # Personal accounts: one digit longer than the ledger accounts
+        personal = numeric & (lengths == ledger_length + 1)
+        account_types[personal] = "subledger"
+        first_digit = values // 10 ** np.maximum(lengths - 1, 0)
+        categories[personal & (first_digit < 7)] = "receivables"
+        categories[personal & (first_digit >= 7)] = "liabilities"
+
+        return pd.DataFrame({"description": descriptions, "account_type": account_types, "category": categories})
+
+
+def ledger_length_of(account_numbers: Sequence[str]) -> int:
+    """
+    General ledger account length of a file - the shortest numeric length (at least 4)
+    held by at least MIN_LEDGER_ACCOUNTS accounts. Not the most common length: personal
+    accounts are one digit longer and often outnumber the ledger accounts.
+    """
+    lengths = [max(len(number), BASE_LENGTH) for number in map(str, account_numbers) if number.isdigit()]
+    if not lengths:
+        return BASE_LENGTH
+    counts = np.bincount(lengths)
+    plausible = np.flatnonzero(counts >= MIN_LEDGER_ACCOUNTS)
+    return int(plausible[0]) if len(plausible) else min(lengths)
+
+
+@lru_cache(maxsize=None)
+def get_chart_index(chart: str) -> ChartIndex:
+    """Process-wide index of a bundled chart, loaded on first use"""
+    index = ChartIndex.load(chart)
+    logger.info(f"Loaded chart of accounts {chart} with {len(index)} accounts")
+    return index
+
+
+def _normalize_description(value: Optional[str]) -> str:
+    return " ".join(str(value).lower().split()) if value else ""
+
+
+def detect_chart(account_numbers: Sequence[str], descriptions: Optional[Sequence[Optional[str]]] = None) -> str:
+    """
+    Chart a file most likely uses: CHART_OF_ACCOUNTS (skr03|skr04|auto, default auto),
+    else the chart whose standard accounts match more numbers - and, where the file
+    has descriptions, more descriptions. Ties go to SKR03.
+    """
+    configured = os.getenv('CHART_OF_ACCOUNTS', AUTO).strip().lower()
+    if configured in CHARTS:
+        return configured
+
+    ledger_length = ledger_length_of(account_numbers)
+    scores = {}
+    for chart in CHARTS:
+        entries = get_chart_index(chart).lookup(account_numbers, ledger_length)
+        known = entries["description"].notna()
+        score = int(known.sum())
+        if descriptions is not None:
+            # A matching description is much stronger evidence than a matching number
+            standard = entries["description"].map(_normalize_description)
+            given = pd.Series([_normalize_description(value) for value in descriptions])
+            score += 3 * int((known & (standard == given)).sum())
+        scores[chart] = score
+    chart = SKR04 if scores[SKR04] > scores[SKR03] else SKR03
+    logger.info(f"Detected chart of accounts {chart} (scores {scores})")
+    return chart
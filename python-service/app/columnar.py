@@ -0,0 +1,130 @@
+"""
+Columnar Output Module
+
+Arrow representation of normalized trial balance rows for the format=arrow and
+format=parquet response modes. Rows are collected column by column straight
+from normalization into a pyarrow Table - no response model holding every row
+- and serialized as an Arrow IPC stream or a Parquet file. Each record is still
+validated against ProcessedTrialBalanceRow and skipped, as in the JSON path,
+when it fails, so both outputs carry the same rows.
+
+The schema mirrors ProcessedTrialBalanceRow field for field; the free-form
+processing_metadata dict is stored as a JSON string column.
+"""
+
+import io
+import json
+import logging
+import typing
+from typing import Any, AsyncIterator, Dict, List
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .models import ProcessedTrialBalanceRow, ProcessingResponse
+
+logger = logging.getLogger(__name__)
+
+# Output formats of /process-file besides the default JSON
+ARROW = "arrow"
+PARQUET = "parquet"
+
+MEDIA_TYPES = {
+    ARROW: "application/vnd.apache.arrow.stream",
+    PARQUET: "application/vnd.apache.parquet",
+}
+
+# Schema metadata key holding the ProcessingResponse summary (everything but the rows)
+SUMMARY_METADATA_KEY = b"processing_summary"
+
+_ARROW_TYPES = {
+    str: pa.string(),
+    int: pa.int64(),
+    float: pa.float64(),
+    bool: pa.bool_(),
+}
+
+
+def _arrow_field(name: str, annotation: Any) -> pa.Field:
+    nullable = False
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        nullable = len(args) < len(typing.get_args(annotation))
+        annotation = args[0]
+    # Dicts (processing_metadata) are serialized to JSON text
+    arrow_type = _ARROW_TYPES.get(annotation, pa.string())
+    return pa.field(name, arrow_type, nullable=nullable)
+
+
+TRIAL_BALANCE_SCHEMA = pa.schema([
+    _arrow_field(name, field.annotation)
+    for name, field in ProcessedTrialBalanceRow.model_fields.items()
+])
+
+# Columns filled from the model defaults when normalization does not set them
+_DEFAULTS = {
+    name: field.get_default(call_default_factory=True)
+    for name, field in ProcessedTrialBalanceRow.model_fields.items()
+    if not field.is_required()
+}
+
+_JSON_COLUMNS = {
+    name for name, field in ProcessedTrialBalanceRow.model_fields.items()
+    if typing.get_origin(field.annotation) is dict
+}
+
+
+class TrialBalanceTableBuilder:
+    """Accumulates normalized records into per-column lists"""
+
+    def __init__(self):
+        self.columns: Dict[str, List[Any]] = {name: [] for name in TRIAL_BALANCE_SCHEMA.names}
+        self.row_count = 0
+
+    def append(self, record: Dict[str, Any]):
+        for name, values in self.columns.items():
+            value = record.get(name, _DEFAULTS.get(name))
+            if name in _JSON_COLUMNS:
+                value = json.dumps(value, default=str)
+            values.append(value)
+        self.row_count += 1
+
+    def to_table(self) -> pa.Table:
+        return pa.table(
+            [pa.array(self.columns[field.name], type=field.type) for field in TRIAL_BALANCE_SCHEMA],
+            schema=TRIAL_BALANCE_SCHEMA
+        )
+
+
+async def collect_table(records: AsyncIterator[Dict[str, Any]]) -> pa.Table:
+    """Build a Table from an async stream of normalized records, skipping records that fail validation"""
+    builder = TrialBalanceTableBuilder()
+    async for record in records:
+        try:
+            row = ProcessedTrialBalanceRow.model_validate(record)
+        except Exception as e:
+            logger.warning(f"Failed to normalize row {record.get('source_row_number')}: {str(e)}")
+            continue
+        builder.append(dict(row))
+    return builder.to_table()
+
+
+def with_summary(table: pa.Table, summary: ProcessingResponse) -> pa.Table:
+    """Attach the response summary (characteristics, validation, quality, timings) as schema metadata"""
+    metadata = dict(table.schema.metadata or {})
+    metadata[SUMMARY_METADATA_KEY] = summary.model_dump_json(exclude={"data"}).encode()
+    return table.replace_schema_metadata(metadata)
+
+
+def serialize_table(table: pa.Table, output_format: str) -> bytes:
+    """Arrow IPC stream or Parquet file bytes for a table"""
+    if output_format == ARROW:
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    if output_format == PARQUET:
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, compression="zstd")
+        return buffer.getvalue()
+    raise ValueError(f"Unsupported output format: {output_format}")
@@ -1,12 +1,13 @@
 import logging
+import os
 from typing import List, Dict, Any, Optional
 import hashlib
 from docling.document_converter import DocumentConverter
 from docling.datamodel.base_models import InputFormat
 from docling.datamodel.pipeline_options import PdfPipelineOptions
 from docling.document_converter import PdfFormatOption
-import tempfile
-import os
+from .ingest import FileSource, materialize_path
+from .progress import PAGE, JobCancelled, raise_if_cancelled, report
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,11 @@ class DoclingProcessor:
         pipeline_options.do_ocr = True  # Enable OCR for scanned PDFs
         pipeline_options.do_table_structure = True  # Enable table structure detection
         
+        # Models baked into the image (docling-tools models download) instead of fetched at runtime
+        artifacts_path = os.getenv('DOCLING_ARTIFACTS_PATH')
+        if artifacts_path:
+            pipeline_options.artifacts_path = artifacts_path
+        
         # Initialize DocumentConverter with PDF-specific options
         self.converter = DocumentConverter(
             format_options={
@@ -26,32 +32,48 @@ class DoclingProcessor:
         )
         logger.info("Docling processor initialized with table extraction enabled")
 
-    async def process_pdf(self, file_content: bytes) -> List[Dict[str, Any]]:
+    def warm_up(self):
+        """Load the PDF pipeline models up front so the first conversion does not pay for it"""
+        self.converter.initialize_pipeline(InputFormat.PDF)
+        logger.info("Docling PDF pipeline initialized")
+
+    async def process_pdf(self, file_content: FileSource) -> List[Dict[str, Any]]:
         """
         Process PDF file using Docling's advanced table detection
         """
+        return self.extract_pdf_rows(file_content)
+
+    def extract_pdf_rows(self, file_content: FileSource) -> List[Dict[str, Any]]:
+        """
+        Synchronous PDF extraction - blocks for the whole conversion, so callers
+        on the event loop should go through the ProcessingPool
+        """
         try:
             logger.info("Starting PDF processing with Docling")
             
-            # Write content to temporary file (Docling requires file path)
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(file_content)
-                tmp_file_path = tmp_file.name
-            
-            try:
+            # Docling requires a file path - spooled uploads are converted in place
+            with materialize_path(file_content, suffix='.pdf') as pdf_path:
                 # Convert PDF using Docling
-                result = self.converter.convert(tmp_file_path)
+                result = self.converter.convert(pdf_path)
                 logger.info(f"Docling conversion completed, document has {len(result.document.pages)} pages")
                 
                 # Extract tables from all pages
                 all_tables_data = []
+                page_count = len(result.document.pages)
                 
                 for page_num, page in enumerate(result.document.pages):
                     logger.info(f"Processing page {page_num + 1}")
+                    raise_if_cancelled()
                     
                     # Extract tables from this page
                     page_tables = self._extract_tables_from_page(page, page_num + 1)
                     all_tables_data.extend(page_tables)
+                    
+                    # Throttled and non-blocking; the last page is always reported
+                    report(
+                        PAGE, force=page_num + 1 == page_count,
+                        page=page_num + 1, pages=page_count, rows_parsed=len(all_tables_data)
+                    )
                 
                 logger.info(f"Extracted {len(all_tables_data)} total rows from all tables")
                 
@@ -61,12 +83,9 @@ class DoclingProcessor:
                     all_tables_data = self._extract_from_text(result.document)
                 
                 return all_tables_data
-                
-            finally:
-                # Clean up temporary file
-                if os.path.exists(tmp_file_path):
-                    os.unlink(tmp_file_path)
                     
+        except JobCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error processing PDF with Docling: {str(e)}")
             raise Exception(f"PDF processing failed: {str(e)}")
@@ -193,15 +212,15 @@ class DoclingProcessor:
         logger.info(f"Text fallback extraction found {len(text_data)} potential rows")
         return text_data
 
-    async def analyze_pdf_structure(self, file_content: bytes) -> Dict[str, Any]:
+    async def analyze_pdf_structure(self, file_content: FileSource) -> Dict[str, Any]:
         """Analyze PDF structure without full processing"""
+        return self.describe_pdf_structure(file_content)
+
+    def describe_pdf_structure(self, file_content: FileSource) -> Dict[str, Any]:
+        """Synchronous counterpart of analyze_pdf_structure"""
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(file_content)
-                tmp_file_path = tmp_file.name
-            
-            try:
-                result = self.converter.convert(tmp_file_path)
+            with materialize_path(file_content, suffix='.pdf') as pdf_path:
+                result = self.converter.convert(pdf_path)
                 
                 analysis = {
                     'page_count': len(result.document.pages),
@@ -224,10 +243,6 @@ class DoclingProcessor:
                         analysis['has_images'] = True
                 
                 return analysis
-                
-            finally:
-                if os.path.exists(tmp_file_path):
-                    os.unlink(tmp_file_path)
                     
         except Exception as e:
             logger.error(f"Error analyzing PDF structure: {str(e)}")
@@ -2,12 +2,41 @@ import asyncio
 import json
 import logging
 from typing import Dict, List, Optional, Any, Tuple
-import httpx
 import os
 from dataclasses import dataclass
+import pandas as pd
+from .llm_cache import LLMResponseCache, llm_cache_key
+from .llm_client import get_llm_client
+from .llm_scheduler import LLMCallError, get_llm_scheduler, record_fallback
+from .metrics import LLM_PROMPT_TOKENS, time_llm_call
+from .prompt_compiler import (
+    DATA_SLOT, PRIORITY_COLUMNS, PROFILE_LEGEND, PromptCompiler, PromptLine, estimate_tokens,
+    raw_sheet_lines, sample_column_lines
+)
+from .utils.env import env_bool, env_int
 
 logger = logging.getLogger(__name__)
 
+GPT5_MODEL = "gpt-5-2025-08-07"
+
+# Completion token budget per account number in description inference
+DESCRIPTION_TOKENS_PER_ACCOUNT = 40
+
+# Call sites, for per-site deadlines (LLM_CALL_DEADLINES) and metrics
+RAW_ANALYSIS = "raw_analysis"
+COLUMN_MAPPING = "column_mapping"
+DESCRIPTIONS = "descriptions"
+
+SYSTEM_PROMPT = "You are a German accounting expert with deep knowledge of trial balance formats, chart of accounts (SKR03/SKR04), and German financial reporting standards. Always provide accurate, structured JSON responses."
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Retry-After header in seconds (the HTTP-date form is not used by the API)"""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
 @dataclass
 class ColumnAnalysis:
     """GPT-5 analysis result for column mapping"""
@@ -22,7 +51,17 @@ class GPT5ColumnAnalyzer:
     """GPT-5 powered intelligent column mapping and German accounting expertise"""
     
     def __init__(self):
-        self.openai_api_key = os.getenv('OPENAI_API_KEY')
+        """
+        Configuration (environment):
+        - OPENAI_API_KEY: required, unless LLM_STAND_IN is set
+        - LLM_STAND_IN: answer calls from the in-process stand-in (app/llm_stand_in.py)
+          instead of the API, for offline benchmarks and load tests (default: false)
+        - LLM_DESCRIPTION_CHUNK_SIZE: account numbers per description inference call (default: 50)
+        - LLM_DESCRIPTION_CONCURRENCY: description inference calls in flight per file (default: 4)
+        - LLM_PROMPT_TOKEN_BUDGET: estimated tokens per structure/column prompt (default: 1500)
+        """
+        self.stand_in = env_bool('LLM_STAND_IN', False)
+        self.openai_api_key = os.getenv('OPENAI_API_KEY') or ("stand-in" if self.stand_in else None)
         if not self.openai_api_key:
             raise ValueError("OPENAI_API_KEY environment variable is required")
         
@@ -50,21 +89,38 @@ class GPT5ColumnAnalyzer:
             ]
         }
         
+        self.description_chunk_size = max(1, env_int('LLM_DESCRIPTION_CHUNK_SIZE', 50))
+        self.description_concurrency = max(1, env_int('LLM_DESCRIPTION_CONCURRENCY', 4))
+        
+        # Column profiles instead of row dumps, under a hard token budget
+        self.prompt_compiler = PromptCompiler()
+        
+        # Identical prompts (same previews, headers, account numbers) are answered once
+        self.response_cache = LLMResponseCache()
+        if self.stand_in:
+            from .llm_stand_in import get_stand_in_client
+            self.llm_client = get_stand_in_client()
+        else:
+            self.llm_client = get_llm_client()
+        # Concurrency, rate limit, retries, deadlines and circuit breaker for API calls
+        self.scheduler = get_llm_scheduler()
+        
         logger.info("GPT-5 Column Analyzer initialized with German accounting expertise")
     
     async def analyze_raw_excel_structure(
         self, 
         sheet_names: List[str], 
         sheet_previews: Dict[str, str], 
-        filename: str
+        filename: str,
+        sheet_frames: Optional[Dict[str, pd.DataFrame]] = None
     ) -> 'RawAnalysisResult':
-        """Analyze raw Excel structure before processing"""
+        """Analyze raw Excel structure before processing (profiled from sheet_frames when given)"""
         from .models import RawAnalysisResult, RawFileStructure
         
-        prompt = self._build_raw_excel_analysis_prompt(sheet_names, sheet_previews, filename)
+        prompt = self._build_raw_excel_analysis_prompt(sheet_names, sheet_previews, filename, sheet_frames)
         
         try:
-            gpt_response = await self._call_gpt5_api(prompt)
+            gpt_response = await self._call_gpt5_api(prompt, call_site=RAW_ANALYSIS)
             return self._parse_raw_analysis_response(gpt_response, sheet_previews)
         except Exception as e:
             logger.error(f"GPT-5 raw Excel analysis failed: {str(e)}")
@@ -75,30 +131,44 @@ class GPT5ColumnAnalyzer:
         lines: List[str], 
         preview_text: str, 
         filename: str, 
-        delimiter: str
+        delimiter: str,
+        frame: Optional[pd.DataFrame] = None
     ) -> 'RawAnalysisResult':
-        """Analyze raw CSV structure before processing"""
+        """Analyze raw CSV structure before processing (profiled from the preview frame when given)"""
         from .models import RawAnalysisResult, RawFileStructure
         
-        prompt = self._build_raw_csv_analysis_prompt(lines, preview_text, filename, delimiter)
+        prompt = self._build_raw_csv_analysis_prompt(lines, preview_text, filename, delimiter, frame)
         
         try:
-            gpt_response = await self._call_gpt5_api(prompt)
+            gpt_response = await self._call_gpt5_api(prompt, call_site=RAW_ANALYSIS)
             return self._parse_raw_analysis_response(gpt_response, [preview_text])
         except Exception as e:
             logger.error(f"GPT-5 raw CSV analysis failed: {str(e)}")
             return self._fallback_raw_analysis("csv", [filename], [preview_text])
     
-    def _build_raw_excel_analysis_prompt(self, sheet_names: List[str], sheet_previews: Dict[str, str], filename: str) -> str:
-        """Build GPT-5 prompt for raw Excel analysis"""
-        return f"""
+    def _build_raw_excel_analysis_prompt(
+        self,
+        sheet_names: List[str],
+        sheet_previews: Dict[str, str],
+        filename: str,
+        sheet_frames: Optional[Dict[str, pd.DataFrame]] = None
+    ) -> str:
+        """Build GPT-5 prompt for raw Excel analysis from column profiles (text previews without frames)"""
+        if sheet_frames:
+            lines = []
+            for rank, (name, frame) in enumerate(sheet_frames.items()):
+                lines.extend(raw_sheet_lines(f'Sheet "{name}"', frame, rank))
+            data = f"SHEET PROFILES (rows are 1-based; {PROFILE_LEGEND}):\n{DATA_SLOT}"
+        else:
+            lines = self._preview_lines(sheet_previews.values())
+            data = f"SHEET PREVIEWS:\n{DATA_SLOT}"
+        template = f"""
 You are a German accounting expert analyzing raw Excel file structure BEFORE processing.
 
 FILENAME: {filename}
 AVAILABLE SHEETS: {', '.join(sheet_names)}
 
-SHEET PREVIEWS:
-{chr(10).join([f"Sheet: {name}{chr(10)}{preview[:2000]}" for name, preview in sheet_previews.items()])}
+{data}
 
 ANALYSIS TASKS:
 1. SELECT BEST SHEET: Which sheet contains the main accounting data?
@@ -128,21 +198,30 @@ Return JSON:
   "recommendations": ["recommendation1", "recommendation2"]
 }}
 """
+        return self.prompt_compiler.compile(template, lines, RAW_ANALYSIS).text
     
-    def _build_raw_csv_analysis_prompt(self, lines: List[str], preview_text: str, filename: str, delimiter: str) -> str:
-        """Build GPT-5 prompt for raw CSV analysis"""
-        first_10_lines = '\n'.join(lines[:10])
-        return f"""
+    def _build_raw_csv_analysis_prompt(
+        self,
+        lines: List[str],
+        preview_text: str,
+        filename: str,
+        delimiter: str,
+        frame: Optional[pd.DataFrame] = None
+    ) -> str:
+        """Build GPT-5 prompt for raw CSV analysis from column profiles (raw lines without a frame)"""
+        if frame is not None:
+            prompt_lines = raw_sheet_lines("CSV", frame, row_base=0)
+            data = f"FILE PROFILE (rows are 0-based; {PROFILE_LEGEND}):\n{DATA_SLOT}"
+        else:
+            prompt_lines = self._preview_lines(['\n'.join(lines[:10]), preview_text])
+            data = f"PREVIEW:\n{DATA_SLOT}"
+        template = f"""
 You are a German accounting expert analyzing raw CSV file structure BEFORE processing.
 
 FILENAME: {filename}
 DELIMITER: "{delimiter}"
 
-FIRST 10 LINES:
-{first_10_lines}
-
-FULL PREVIEW:
-{preview_text[:2000]}
+{data}
 
 ANALYSIS TASKS:
 1. DETECT HEADERS: What row number (0-based) contains the column headers?
@@ -170,6 +249,15 @@ Return JSON:
   "recommendations": ["recommendation1", "recommendation2"]
 }}
 """
+        return self.prompt_compiler.compile(template, prompt_lines, RAW_ANALYSIS).text
+    
+    def _preview_lines(self, previews) -> List[PromptLine]:
+        """Text preview lines, earlier previews kept first when trimmed to the budget"""
+        return [
+            PromptLine(PRIORITY_COLUMNS + rank, line)
+            for rank, preview in enumerate(previews)
+            for line in preview.splitlines()
+        ]
     
     def _parse_raw_analysis_response(self, gpt_response: str, content_preview: List[str]) -> 'RawAnalysisResult':
         """Parse GPT-5 response for raw analysis"""
@@ -206,6 +294,8 @@ Return JSON:
         """Fallback raw analysis when GPT-5 fails"""
         from .models import RawAnalysisResult, RawFileStructure
         
+        record_fallback(RAW_ANALYSIS)
+        
         return RawAnalysisResult(
             file_structure=RawFileStructure(
                 header_row=0 if file_type == "csv" else 1,
@@ -234,7 +324,7 @@ Return JSON:
             prompt = self._build_analysis_prompt(headers, sample_data, document_type)
             
             # Call GPT-5 API
-            response = await self._call_gpt5_api(prompt)
+            response = await self._call_gpt5_api(prompt, call_site=COLUMN_MAPPING)
             
             # Parse and validate response
             analysis = self._parse_gpt5_response(response, headers)
@@ -252,11 +342,41 @@ Return JSON:
         account_numbers: List[str], 
         context: Optional[str] = None
     ) -> Dict[str, str]:
-        """Use GPT-5 to infer account descriptions from account numbers"""
+        """
+        Use GPT-5 to infer account descriptions from account numbers. Numbers are
+        deduplicated and sent in chunks of description_chunk_size, with at most
+        description_concurrency chunks in flight; a failed chunk only loses its own numbers.
+        """
+        unique_numbers = sorted({str(number) for number in account_numbers if number})
+        if not unique_numbers:
+            return {}
+        
+        # Sorted chunks keep prompts (and their cache keys) stable across files
+        chunks = [
+            unique_numbers[i:i + self.description_chunk_size]
+            for i in range(0, len(unique_numbers), self.description_chunk_size)
+        ]
+        semaphore = asyncio.Semaphore(self.description_concurrency)
+        
+        async def infer_chunk(chunk: List[str]) -> Dict[str, str]:
+            async with semaphore:
+                return await self._infer_description_chunk(chunk, context)
+        
+        results = await asyncio.gather(*(infer_chunk(chunk) for chunk in chunks))
+        descriptions = {}
+        for result in results:
+            descriptions.update(result)
+        logger.info(
+            f"GPT-5 inferred {len(descriptions)} of {len(unique_numbers)} account descriptions in {len(chunks)} chunks"
+        )
+        return descriptions
+    
+    async def _infer_description_chunk(self, account_numbers: List[str], context: Optional[str]) -> Dict[str, str]:
+        """One GPT-5 call for a bounded chunk of account numbers"""
         try:
             prompt = f"""You are a German accounting expert. Based on these German account numbers, provide the most likely German account descriptions following SKR03/SKR04 standards.
 
-Account Numbers: {account_numbers[:10]}  # Limit to avoid token limits
+Account Numbers: {json.dumps(account_numbers)}
 Context: {context or 'German chart of accounts'}
 
 Return a JSON object mapping account numbers to descriptions:
@@ -264,16 +384,29 @@ Return a JSON object mapping account numbers to descriptions:
 
 Focus on German accounting terminology and standard chart of accounts."""
             
-            response = await self._call_gpt5_api(prompt, max_tokens=800)
+            # Room for one short description per account
+            max_tokens = max(800, DESCRIPTION_TOKENS_PER_ACCOUNT * len(account_numbers))
+            response = await self._call_gpt5_api(prompt, max_tokens=max_tokens, call_site=DESCRIPTIONS)
             
             try:
-                return json.loads(response)
+                inferred = json.loads(response)
             except json.JSONDecodeError:
                 logger.warning("GPT-5 description inference returned invalid JSON")
+                record_fallback(DESCRIPTIONS)
                 return {}
+            if not isinstance(inferred, dict):
+                return {}
+            # Only answers for numbers that were asked about
+            requested = set(account_numbers)
+            return {
+                str(number): str(description)
+                for number, description in inferred.items()
+                if str(number) in requested and description
+            }
                 
         except Exception as e:
             logger.error(f"GPT-5 description inference failed: {str(e)}")
+            record_fallback(DESCRIPTIONS)
             return {}
     
     def _build_analysis_prompt(
@@ -282,16 +415,14 @@ Focus on German accounting terminology and standard chart of accounts."""
         sample_data: List[Dict[str, Any]], 
         document_type: Optional[str]
     ) -> str:
-        """Build comprehensive analysis prompt for GPT-5"""
-        sample_preview = json.dumps(sample_data[:3], indent=2, ensure_ascii=False)
-        
-        return f"""You are a German accounting expert specializing in trial balance and financial document analysis. Analyze these column headers and sample data to create an optimal mapping for a German accounting system.
+        """Build comprehensive analysis prompt for GPT-5, with sample data as column profiles"""
+        template = f"""You are a German accounting expert specializing in trial balance and financial document analysis. Analyze these column headers and sample data to create an optimal mapping for a German accounting system.
 
 DOCUMENT TYPE: {document_type or 'Unknown German accounting document'}
 COLUMN HEADERS: {headers}
 
-SAMPLE DATA:
-{sample_preview}
+COLUMN PROFILES over {len(sample_data)} sample rows ({PROFILE_LEGEND}):
+{DATA_SLOT}
 
 GERMAN ACCOUNTING CONTEXT:
 - Document types: Entwicklungsübersicht, BWA (Jahresübersicht), Summen und Salden, Wertenachweis
@@ -317,23 +448,38 @@ Return JSON response:
 }}
 
 CRITICAL: Focus on German terminology. "Beschriftung" = account_description, "Konto" = account_number."""
+        return self.prompt_compiler.compile(template, sample_column_lines(headers, sample_data), COLUMN_MAPPING).text
     
-    async def _call_gpt5_api(self, prompt: str, max_tokens: int = 1500) -> str:
-        """Call GPT-5 API with error handling"""
+    async def _call_gpt5_api(self, prompt: str, max_tokens: int = 1500, call_site: str = "default") -> str:
+        """Call GPT-5 API through the response cache and the call scheduler"""
+        LLM_PROMPT_TOKENS.labels(call_site=call_site).observe(estimate_tokens(SYSTEM_PROMPT + prompt))
+        key = llm_cache_key(GPT5_MODEL, prompt, max_tokens, SYSTEM_PROMPT)
+        response, _ = await self.response_cache.get_or_call(
+            key,
+            lambda: self.scheduler.run(
+                lambda timeout: self._request_completion(prompt, max_tokens, timeout),
+                call_site=call_site
+            )
+        )
+        return response
+    
+    async def _request_completion(self, prompt: str, max_tokens: int, timeout: Optional[float] = None) -> str:
+        """Call GPT-5 API with error handling (one attempt, at most timeout seconds)"""
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
+            # Shared pooled client - connections stay open between calls
+            with time_llm_call():
+                response = await self.llm_client.post_json(
+                    "/chat/completions",
                     headers={
                         "Authorization": f"Bearer {self.openai_api_key}",
                         "Content-Type": "application/json"
                     },
-                    json={
-                        "model": "gpt-5-2025-08-07",
+                    payload={
+                        "model": GPT5_MODEL,
                         "messages": [
                             {
                                 "role": "system",
-                                "content": "You are a German accounting expert with deep knowledge of trial balance formats, chart of accounts (SKR03/SKR04), and German financial reporting standards. Always provide accurate, structured JSON responses."
+                                "content": SYSTEM_PROMPT
                             },
                             {
                                 "role": "user",
@@ -341,17 +487,22 @@ CRITICAL: Focus on German terminology. "Beschriftung" = account_description, "Ko
                             }
                         ],
                         "max_completion_tokens": max_tokens
-                    }
+                    },
+                    timeout=timeout
                 )
                 
                 if response.status_code != 200:
-                    raise Exception(f"GPT-5 API error {response.status_code}: {response.text}")
+                    raise LLMCallError(
+                        response.status_code,
+                        response.text[:500],
+                        retry_after=_retry_after_seconds(response.headers.get("retry-after"))
+                    )
                 
                 result = response.json()
                 return result["choices"][0]["message"]["content"]
                 
         except Exception as e:
-            logger.error(f"GPT-5 API call failed: {str(e)}")
+            logger.error(f"GPT-5 API call failed: {str(e) or type(e).__name__}")
             raise
     
     def _parse_gpt5_response(self, response: str, headers: List[str]) -> ColumnAnalysis:
@@ -417,4 +568,16 @@ CRITICAL: Focus on German terminology. "Beschriftung" = account_description, "Ko
             description_inference={},
             quality_score=overall_confidence * 0.8,  # Slightly lower for fallback
             recommendations=["GPT-5 analysis failed, using pattern matching fallback"]
-        )
\ No newline at end of file
+        )
+
+
+# One analyzer per process, shared by PandasAnalyzer, RawFileAnalyzer and friends
+_shared_analyzer: Optional[GPT5ColumnAnalyzer] = None
+
+
+def get_shared_analyzer() -> GPT5ColumnAnalyzer:
+    """Process-wide GPT5ColumnAnalyzer, built on first use (raises ValueError without OPENAI_API_KEY)"""
+    global _shared_analyzer
+    if _shared_analyzer is None:
+        _shared_analyzer = GPT5ColumnAnalyzer()
+    return _shared_analyzer
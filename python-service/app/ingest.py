@@ -0,0 +1,269 @@
+"""
+Ingest Module
+
+Spools an upload to disk (or tmpfs) exactly once while hashing it, and gives
+every pipeline stage the same underlying file - as a path, a file handle or a
+read-only memory map - instead of passing copies of the bytes around.
+"""
+
+import codecs
+import hashlib
+import io
+import logging
+import mmap
+import os
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, List, Optional, Union
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+# Anything a stage accepts as file input: raw bytes (tests, legacy callers),
+# a filesystem path, or a SpooledUpload
+FileSource = Union[bytes, str, os.PathLike]
+
+
+class SpooledUpload(os.PathLike):
+    """An uploaded file written once to the spool directory"""
+
+    def __init__(self, path: str, filename: str, size: int, sha256: str, content_type: Optional[str] = None):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+        self.content_type = content_type
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __repr__(self) -> str:
+        return f"SpooledUpload(filename={self.filename!r}, size={self.size}, sha256={self.sha256[:12]})"
+
+    def open(self) -> BinaryIO:
+        """Open a new read-only handle on the spooled file"""
+        return open(self.path, 'rb')
+
+    def cleanup(self):
+        """Remove the spooled file"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> 'SpooledUpload':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+
+
+def get_spool_dir() -> str:
+    """Spool directory from INGEST_SPOOL_DIR (e.g. /dev/shm for tmpfs), defaults to the system temp dir"""
+    spool_dir = os.getenv('INGEST_SPOOL_DIR') or tempfile.gettempdir()
+    os.makedirs(spool_dir, exist_ok=True)
+    return spool_dir
+
+
+async def spool_upload(upload: UploadFile, spool_dir: Optional[str] = None) -> SpooledUpload:
+    """Stream an UploadFile to the spool directory in chunks, hashing it on the way"""
+    filename = upload.filename or 'upload'
+    suffix = os.path.splitext(filename)[1]
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, path = tempfile.mkstemp(prefix='ingest-', suffix=suffix, dir=spool_dir or get_spool_dir())
+    try:
+        with os.fdopen(fd, 'wb') as spool_file:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                spool_file.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.unlink(path)
+        raise
+
+    spooled = SpooledUpload(path, filename, size, digest.hexdigest(), upload.content_type)
+    logger.info(f"Spooled upload {filename} ({size} bytes) to {path}")
+    return spooled
+
+
+def is_zip_archive(source: FileSource) -> bool:
+    """True if a source is a plain ZIP archive (not an Office document, which is also a ZIP)"""
+    if read_prefix(source, 4) != b'PK\x03\x04':
+        return False
+    try:
+        with open_source(source) as handle, zipfile.ZipFile(handle) as archive:
+            return '[Content_Types].xml' not in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+
+
+def spool_archive(
+    archive_source: FileSource,
+    spool_dir: Optional[str] = None,
+    max_files: int = 500,
+    max_total_bytes: int = 2 * 1024 ** 3
+) -> List[SpooledUpload]:
+    """
+    Extract every file of a ZIP archive to the spool directory, streaming and hashing
+    each member. Directories, hidden files and macOS metadata are skipped; the declared
+    and actual uncompressed sizes are capped to guard against zip bombs.
+    """
+    spool_dir = spool_dir or get_spool_dir()
+    spooled: List[SpooledUpload] = []
+    total_bytes = 0
+    try:
+        with open_source(archive_source) as handle, zipfile.ZipFile(handle) as archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir()
+                and not info.filename.startswith('__MACOSX/')
+                and not os.path.basename(info.filename).startswith('.')
+            ]
+            if len(members) > max_files:
+                raise ValueError(f"Archive contains {len(members)} files, limit is {max_files}")
+            if sum(info.file_size for info in members) > max_total_bytes:
+                raise ValueError(f"Archive expands beyond {max_total_bytes} bytes")
+
+            for info in members:
+                filename = os.path.basename(info.filename)
+                digest = hashlib.sha256()
+                size = 0
+                fd, path = tempfile.mkstemp(prefix='ingest-', suffix=os.path.splitext(filename)[1], dir=spool_dir)
+                # Registered first so a failure below still removes the partial file
+                spooled.append(SpooledUpload(path, filename, 0, ''))
+                with os.fdopen(fd, 'wb') as spool_file, archive.open(info) as member:
+                    for chunk in iter(lambda: member.read(CHUNK_SIZE), b''):
+                        size += len(chunk)
+                        total_bytes += len(chunk)
+                        if total_bytes > max_total_bytes:
+                            raise ValueError(f"Archive expands beyond {max_total_bytes} bytes")
+                        digest.update(chunk)
+                        spool_file.write(chunk)
+                spooled[-1] = SpooledUpload(path, filename, size, digest.hexdigest())
+    except Exception:
+        for upload in spooled:
+            upload.cleanup()
+        raise
+
+    logger.info(f"Spooled {len(spooled)} archive members ({total_bytes} bytes)")
+    return spooled
+
+
+def source_path(source: FileSource) -> Optional[str]:
+    """Filesystem path of a source, or None for in-memory bytes"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return None
+    return os.fspath(source)
+
+
+def source_size(source: FileSource) -> int:
+    """Size of a source in bytes"""
+    path = source_path(source)
+    if path is None:
+        return len(source)
+    return os.path.getsize(path)
+
+
+def open_source(source: FileSource) -> BinaryIO:
+    """Binary file handle for a source (caller closes it)"""
+    path = source_path(source)
+    if path is None:
+        return io.BytesIO(source)
+    return open(path, 'rb')
+
+
+def pandas_input(source: FileSource):
+    """Input accepted by pandas/openpyxl readers: the path itself, or a BytesIO over bytes"""
+    path = source_path(source)
+    return io.BytesIO(source) if path is None else path
+
+
+def read_prefix(source: FileSource, max_bytes: int) -> bytes:
+    """Read at most max_bytes from the start of a source"""
+    path = source_path(source)
+    if path is None:
+        return bytes(source[:max_bytes])
+    with open(path, 'rb') as handle:
+        return handle.read(max_bytes)
+
+
+@contextmanager
+def map_source(source: FileSource) -> Iterator[Union[bytes, mmap.mmap]]:
+    """Read-only buffer over a source - an mmap for files, the bytes themselves otherwise"""
+    path = source_path(source)
+    if path is None:
+        yield source
+        return
+    if os.path.getsize(path) == 0:
+        yield b''
+        return
+    with open(path, 'rb') as handle:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+@contextmanager
+def materialize_path(source: FileSource, suffix: str = '') -> Iterator[str]:
+    """Path for libraries that need a file on disk; bytes are written to a temporary file"""
+    path = source_path(source)
+    if path is not None:
+        yield path
+        return
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        tmp_file.write(source)
+        tmp_path = tmp_file.name
+    try:
+        yield tmp_path
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def hash_source(source: FileSource, algorithm: str = 'sha256') -> str:
+    """Hash a source in chunks without loading it into memory"""
+    digest = hashlib.new(algorithm)
+    with open_source(source) as handle:
+        for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_head_lines(source: FileSource, max_lines: int, encoding: str = 'utf-8', errors: str = 'ignore') -> List[str]:
+    """Decode only the first max_lines lines of a text source"""
+    with map_source(source) as buffer:
+        end = 0
+        for _ in range(max_lines):
+            newline = buffer.find(b'\n', end)
+            if newline == -1:
+                end = len(buffer)
+                break
+            end = newline + 1
+        head = bytes(buffer[:end])
+    return head.decode(encoding, errors=errors).split('\n')[:max_lines]
+
+
+def detect_text_encoding(source: FileSource, candidates: List[str]) -> Optional[str]:
+    """First candidate encoding that decodes the whole source, checked chunk by chunk"""
+    for encoding in candidates:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open_source(source) as handle:
+                for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+                    decoder.decode(chunk)
+                decoder.decode(b'', final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
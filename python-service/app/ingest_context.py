@@ -0,0 +1,224 @@
+"""
+Ingest Context Module
+
+Request-scoped parse cache for one tabular upload. Loading is bounded: it
+streams the first PREVIEW_ROWS rows of each sheet (or decodes the head of a
+CSV), which is all raw structure analysis needs, so its cost is the same for
+a 5 KB and a 500 MB file. A sheet is parsed in full only when a later stage
+asks for it through sheet_frame(), and then only once.
+
+Encoding and delimiter come from the upload's DetectionResult when the
+pipeline has one, so the CSV is not sniffed a second time.
+
+A loaded context is plain data (frames and strings), so it can be built in a
+worker process and handed to the next stage through the ProcessingPool. Only
+the previews cross process boundaries: pickling drops full frames, and the
+parse stage re-reads its sheet from the source inside its own worker.
+"""
+
+import codecs
+import logging
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .ingest import FileSource, detect_text_encoding, read_head_lines, read_prefix
+from .sheet_triage import SheetProfile, rank_sheet_names, triage_workbook
+from .spreadsheet_reader import read_csv_frame, read_excel_sheets
+from .xlsx_stream import XlsxArchive
+
+if TYPE_CHECKING:
+    from .utils.file_detector import DetectionResult
+
+logger = logging.getLogger(__name__)
+
+# Frame name used for the single table of a CSV file
+CSV_FRAME = "CSV Data"
+
+# Sheets previewed up front - the highest ranked by sheet triage
+DEFAULT_MAX_SHEETS = 5
+
+# Bytes of a CSV upload sampled for encoding detection
+ENCODING_SAMPLE_BYTES = 1024 * 1024
+
+# Encodings tried, in order, when the guessed one does not decode the whole file
+# (or the sample was plain ASCII) - typical of German accounting exports
+FALLBACK_ENCODINGS = ('utf-8', 'cp1252')
+
+# Lines kept decoded for previews and delimiter detection
+HEAD_LINES = 50
+
+# Raw rows per sheet kept as a preview for raw structure analysis
+PREVIEW_ROWS = 30
+
+
+def detect_csv_delimiter(lines: List[str]) -> str:
+    """Most frequent delimiter that is also consistent across the sample lines"""
+    # Common delimiters in order of preference
+    delimiters = [';', ',', '\t', '|']
+    sample_lines = lines[:5]
+
+    delimiter_scores = {}
+    for delim in delimiters:
+        # Count occurrences and consistency across lines
+        line_counts = [line.count(delim) for line in sample_lines if line.strip()]
+        if line_counts:
+            avg_count = sum(line_counts) / len(line_counts)
+            consistency = 1 - (np.std(line_counts) / (avg_count + 1))  # Avoid division by zero
+            delimiter_scores[delim] = avg_count * consistency
+
+    # Return delimiter with highest score
+    if delimiter_scores:
+        return max(delimiter_scores, key=delimiter_scores.get)
+
+    return ','  # Default fallback
+
+
+class IngestContext:
+    """Raw content of one XLSX/CSV upload, shared by all pipeline stages"""
+
+    def __init__(
+        self,
+        source: FileSource,
+        file_type: str,
+        filename: str,
+        max_sheets: int = DEFAULT_MAX_SHEETS,
+        detection: Optional['DetectionResult'] = None,
+        excel_engine: Optional[str] = None,
+        csv_engine: Optional[str] = None
+    ):
+        """Reader engines (see spreadsheet_reader) default to EXCEL_READER_ENGINE / CSV_READER_ENGINE"""
+        self.source = source
+        self.file_type = file_type
+        self.filename = filename
+        self.max_sheets = max_sheets
+        self.detection = detection
+        self.excel_engine = excel_engine
+        self.csv_engine = csv_engine
+
+        self.sheet_names: List[str] = []
+        # Sheet triage, best first (see sheet_triage)
+        self.sheet_profiles: List[SheetProfile] = []
+        # First PREVIEW_ROWS raw rows of the max_sheets best ranked sheets, best first
+        # (CSVs have a single CSV_FRAME)
+        self.previews: Dict[str, pd.DataFrame] = {}
+        # Fully parsed raw frames (header=None), filled on demand by sheet_frame()
+        self.frames: Dict[str, pd.DataFrame] = {}
+        self.encoding: Optional[str] = None
+        # Whether self.encoding decodes the whole file, not just the sample it was guessed from
+        self.encoding_verified = False
+        self.delimiter: Optional[str] = None
+        self.head_lines: List[str] = []
+        self.load_seconds = 0.0
+        self.loaded = False
+
+    @classmethod
+    def load(cls, source: FileSource, file_type: str, filename: str, **kwargs) -> 'IngestContext':
+        """Build a context with sheet names and bounded previews; sheets are parsed in full on demand"""
+        context = cls(source, file_type, filename, **kwargs)
+        context.ensure_loaded()
+        return context
+
+    def ensure_loaded(self) -> 'IngestContext':
+        if self.loaded:
+            return self
+        started = time.perf_counter()
+        if self.file_type == "xlsx":
+            self._load_excel()
+        elif self.file_type == "csv":
+            self._load_csv()
+        else:
+            raise ValueError(f"Unsupported file type for tabular ingest: {self.file_type}")
+        self.loaded = True
+        self.load_seconds = time.perf_counter() - started
+        logger.info(
+            f"Ingested {self.filename}: previews of {len(self.previews)} of {len(self.sheet_names)} sheets "
+            f"in {self.load_seconds:.2f}s"
+        )
+        return self
+
+    def __getstate__(self):
+        # Full frames stay in the process that parsed them - a 500 MB sheet would
+        # otherwise be pickled back to the API process and again into the parse worker
+        state = self.__dict__.copy()
+        state['frames'] = {}
+        return state
+
+    @property
+    def best_sheet(self) -> Optional[str]:
+        """Top ranked sheet of a workbook"""
+        return self.sheet_profiles[0].name if self.sheet_profiles else None
+
+    def sheet_frame(self, sheet_name: str) -> pd.DataFrame:
+        """Raw frame of a whole sheet, parsed on first use"""
+        self.ensure_loaded()
+        if sheet_name not in self.frames:
+            if sheet_name not in self.sheet_names:
+                raise KeyError(f"Sheet not found: {sheet_name}")
+            if self.file_type == "csv":
+                self.frames[sheet_name] = read_csv_frame(
+                    self.source, self.delimiter, self.encoding, engine=self.csv_engine,
+                    encoding_guessed=not self.encoding_verified
+                )
+            else:
+                self.frames.update(
+                    read_excel_sheets(self.source, sheet_names=[sheet_name], engine=self.excel_engine)[1]
+                )
+        return self.frames[sheet_name]
+
+    def _load_excel(self):
+        try:
+            # Rank sheets from metadata, then stream only the first rows of the best ones
+            with XlsxArchive(self.source) as archive:
+                self.sheet_names = archive.sheet_names
+                self.sheet_profiles = triage_workbook(archive)
+                for profile in self.sheet_profiles[:self.max_sheets]:
+                    rows = list(archive.iter_rows(profile.name, PREVIEW_ROWS))
+                    self.previews[profile.name] = pd.DataFrame(rows)
+        except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+            # Not a plain OOXML package - let the reader engines parse the sheets instead
+            logger.warning(f"Streaming preview failed ({str(e)}), parsing sheets for previews")
+            self.sheet_names, self.frames = read_excel_sheets(
+                self.source, max_sheets=self.max_sheets, engine=self.excel_engine
+            )
+            self.sheet_profiles = rank_sheet_names(self.sheet_names)
+            self.previews = {
+                profile.name: self.frames[profile.name].head(PREVIEW_ROWS)
+                for profile in self.sheet_profiles if profile.name in self.frames
+            }
+
+    def _load_csv(self):
+        if self.detection is not None:
+            guess = self.detection.encoding
+        else:
+            # Detect encoding from a bounded sample instead of the whole upload
+            import charset_normalizer
+            best = charset_normalizer.from_bytes(read_prefix(self.source, ENCODING_SAMPLE_BYTES)).best()
+            guess = best.encoding if best else None
+        if guess == 'ascii':
+            # An ASCII sample leaves the encoding of later umlauts undetermined
+            guess = None
+
+        # The guess only saw a sample: check it against the whole file, then the fallbacks
+        candidates = [codecs.lookup(guess).name] if guess else []
+        candidates += [encoding for encoding in FALLBACK_ENCODINGS if encoding not in candidates]
+        verified = detect_text_encoding(self.source, candidates)
+        self.encoding_verified = verified is not None
+        self.encoding = verified or candidates[0]
+
+        # Decode only the head for previews (and delimiter detection without a DetectionResult)
+        self.head_lines = read_head_lines(self.source, HEAD_LINES, self.encoding, errors='replace')
+        if self.detection is not None and self.detection.delimiter:
+            self.delimiter = self.detection.delimiter
+        else:
+            self.delimiter = detect_csv_delimiter(self.head_lines)
+        logger.info(f"CSV encoding: {self.encoding}, delimiter: '{self.delimiter}'")
+
+        self.sheet_names = [CSV_FRAME]
+        # The preview parses the decoded head only, never the rest of the file
+        head = '\n'.join(self.head_lines[:PREVIEW_ROWS]).encode('utf-8')
+        self.previews[CSV_FRAME] = read_csv_frame(head, self.delimiter, 'utf-8', engine=self.csv_engine)
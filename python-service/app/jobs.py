@@ -0,0 +1,518 @@
+"""
+Processing Jobs Module
+
+Asynchronous job API for /process-file: uploads are queued in a durable local
+SQLite queue and processed by background workers running the regular
+ProcessingPipeline. Results stay retrievable until their TTL expires, so
+clients can re-fetch them without reprocessing the file. Running jobs publish
+their progress as Server-Sent Events and can be cancelled by the client.
+
+Several API processes may share the queue. A claimed job records its owner
+(host, pid and a per-runner token) and a lease the owner keeps renewing;
+only jobs whose lease expired or whose owner process is gone are requeued.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from .ingest import SpooledUpload
+from .metrics import JOB_QUEUE_DEPTH
+from .pipeline import ProcessingPipeline
+from .progress import STATUS, JobCancelled, format_sse
+from .utils.env import env_int
+from .utils.storage import connect_sqlite, data_dir, data_path
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+def job_owner_id() -> str:
+    """Owner of the jobs one runner claims: host, pid and a token for this runner"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _owner_gone(owner: Optional[str], current_owner: str) -> bool:
+    """True if owner is a runner on this host that no longer exists"""
+    try:
+        host, pid, _ = owner.split(":")
+        current_host, current_pid, _ = current_owner.split(":")
+    except (AttributeError, ValueError):
+        return False
+    if host != current_host:
+        # Other hosts are only judged by their leases
+        return False
+    if pid == current_pid:
+        # An earlier runner of this process (or of a process that reused its pid)
+        return owner != current_owner
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except (PermissionError, ValueError):
+        pass
+    return False
+
+
+class JobStore:
+    """SQLite-backed job queue and result store"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv('JOB_DB_PATH') or data_path('jobs.sqlite3')
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = connect_sqlite(self.db_path)
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS processing_jobs (
+                    job_uuid TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    file_path TEXT,
+                    file_sha256 TEXT,
+                    params TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    expires_at REAL,
+                    owner TEXT,
+                    lease_expires_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_processing_jobs_status
+                    ON processing_jobs (status, created_at);
+                CREATE INDEX IF NOT EXISTS idx_processing_jobs_expires
+                    ON processing_jobs (expires_at);
+            """)
+            # Job databases created before claims had owners and leases
+            columns = {row["name"] for row in self._connection.execute("PRAGMA table_info(processing_jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease_expires_at", "REAL")):
+                if column not in columns:
+                    try:
+                        self._connection.execute(f"ALTER TABLE processing_jobs ADD COLUMN {column} {kind}")
+                    except sqlite3.OperationalError:
+                        # Added by another process in the meantime
+                        pass
+        return self._connection
+
+    def enqueue(self, filename: str, file_path: str, file_sha256: Optional[str], params: Dict[str, Any]) -> str:
+        """Insert a queued job and return its UUID"""
+        job_uuid = str(uuid.uuid4())
+        with self._lock:
+            self.connection.execute(
+                "INSERT INTO processing_jobs (job_uuid, status, filename, file_path, file_sha256, params, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_uuid, QUEUED, filename, file_path, file_sha256, json.dumps(params), time.time())
+            )
+        return job_uuid
+
+    def claim_next(self, owner: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running under owner's lease and return it"""
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute(
+                "UPDATE processing_jobs SET status = ?, started_at = ?, attempts = attempts + 1, "
+                "owner = ?, lease_expires_at = ? "
+                "WHERE job_uuid = (SELECT job_uuid FROM processing_jobs WHERE status = ? ORDER BY created_at LIMIT 1) "
+                "RETURNING *",
+                (RUNNING, now, owner, now + lease_seconds, QUEUED)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def renew_leases(self, owner: str, lease_seconds: float) -> int:
+        """Extend the leases of the jobs owner is running"""
+        with self._lock:
+            return self.connection.execute(
+                "UPDATE processing_jobs SET lease_expires_at = ? WHERE owner = ? AND status = ?",
+                (time.time() + lease_seconds, owner, RUNNING)
+            ).rowcount
+
+    def release(self, owner: str) -> int:
+        """Requeue the jobs owner is running (on shutdown)"""
+        with self._lock:
+            return self.connection.execute(
+                "UPDATE processing_jobs SET status = ?, started_at = NULL, owner = NULL, lease_expires_at = NULL "
+                "WHERE owner = ? AND status = ?",
+                (QUEUED, owner, RUNNING)
+            ).rowcount
+
+    def mark_succeeded(self, job_uuid: str, owner: str, result_json: str, ttl_seconds: int) -> bool:
+        """Store the result of a job owner is running; False if it was cancelled or taken over meanwhile"""
+        now = time.time()
+        with self._lock:
+            updated = self.connection.execute(
+                "UPDATE processing_jobs SET status = ?, result = ?, error = NULL, finished_at = ?, expires_at = ? "
+                "WHERE job_uuid = ? AND status = ? AND owner = ?",
+                (SUCCEEDED, result_json, now, now + ttl_seconds, job_uuid, RUNNING, owner)
+            ).rowcount
+        return updated > 0
+
+    def mark_failed(self, job_uuid: str, owner: str, error: str, ttl_seconds: int) -> bool:
+        """Fail a job owner is running; False if it was cancelled or taken over meanwhile"""
+        now = time.time()
+        with self._lock:
+            updated = self.connection.execute(
+                "UPDATE processing_jobs SET status = ?, error = ?, finished_at = ?, expires_at = ? "
+                "WHERE job_uuid = ? AND status = ? AND owner = ?",
+                (FAILED, error, now, now + ttl_seconds, job_uuid, RUNNING, owner)
+            ).rowcount
+        return updated > 0
+
+    def mark_cancelled(self, job_uuid: str, ttl_seconds: int) -> bool:
+        """Cancel a queued or running job; False if it had already finished"""
+        now = time.time()
+        with self._lock:
+            updated = self.connection.execute(
+                "UPDATE processing_jobs SET status = ?, error = ?, finished_at = ?, expires_at = ? "
+                "WHERE job_uuid = ? AND status IN (?, ?)",
+                (CANCELLED, "Cancelled by client", now, now + ttl_seconds, job_uuid, QUEUED, RUNNING)
+            ).rowcount
+        return updated > 0
+
+    def get(self, job_uuid: str) -> Optional[Dict[str, Any]]:
+        """Fetch a job; expired jobs are treated as gone"""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT * FROM processing_jobs WHERE job_uuid = ?", (job_uuid,)
+            ).fetchone()
+        if not row:
+            return None
+        job = self._row_to_job(row)
+        if job["expires_at"] is not None and job["expires_at"] <= time.time():
+            return None
+        return job
+
+    def recover_interrupted(self, owner: str, max_attempts: int, ttl_seconds: int) -> int:
+        """
+        Requeue running jobs whose lease expired or whose owner process on this host is
+        gone; fail those out of attempts. Jobs of live runners are left alone.
+        """
+        now = time.time()
+        requeued = failed = 0
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT job_uuid, owner, lease_expires_at, attempts FROM processing_jobs WHERE status = ?",
+                (RUNNING,)
+            ).fetchall()
+            for row in rows:
+                lease_expired = row["lease_expires_at"] is None or row["lease_expires_at"] <= now
+                if row["owner"] == owner or not (lease_expired or _owner_gone(row["owner"], owner)):
+                    continue
+                # Only if nobody claimed or renewed the job since it was read
+                guard = (row["job_uuid"], RUNNING, row["owner"], row["lease_expires_at"])
+                if row["attempts"] >= max_attempts:
+                    failed += self.connection.execute(
+                        "UPDATE processing_jobs SET status = ?, error = ?, finished_at = ?, expires_at = ? "
+                        "WHERE job_uuid = ? AND status = ? AND owner IS ? AND lease_expires_at IS ?",
+                        (FAILED, "Job interrupted too many times", now, now + ttl_seconds, *guard)
+                    ).rowcount
+                else:
+                    requeued += self.connection.execute(
+                        "UPDATE processing_jobs SET status = ?, started_at = NULL, owner = NULL, lease_expires_at = NULL "
+                        "WHERE job_uuid = ? AND status = ? AND owner IS ? AND lease_expires_at IS ?",
+                        (QUEUED, *guard)
+                    ).rowcount
+        if requeued or failed:
+            logger.warning(f"Recovered interrupted jobs: {requeued} requeued, {failed} failed")
+        return requeued
+
+    def purge_expired(self) -> List[str]:
+        """Delete expired jobs and return their leftover input file paths"""
+        now = time.time()
+        with self._lock:
+            rows = self.connection.execute(
+                "DELETE FROM processing_jobs WHERE expires_at IS NOT NULL AND expires_at <= ? RETURNING file_path",
+                (now,)
+            ).fetchall()
+        return [row["file_path"] for row in rows if row["file_path"]]
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT status, COUNT(*) AS count FROM processing_jobs GROUP BY status"
+            ).fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _row_to_job(self, row) -> Dict[str, Any]:
+        job = dict(row)
+        job["params"] = json.loads(job["params"]) if job["params"] else {}
+        return job
+
+
+class JobRunner:
+    """Background workers that drain the JobStore through the ProcessingPipeline"""
+
+    def __init__(self, store: JobStore, pipeline: ProcessingPipeline):
+        """
+        Configuration (environment):
+        - JOB_WORKERS: concurrent jobs per API process (default: 2)
+        - JOB_RESULT_TTL_SECONDS: how long results stay retrievable (default: 86400)
+        - JOB_MAX_ATTEMPTS: attempts before an interrupted job is failed (default: 2)
+        - JOB_STORAGE_DIR: where queued uploads wait for their worker (default: data/job_files)
+        - JOB_EVENTS_KEEPALIVE_SECONDS: idle time before an event stream sends a keep-alive (default: 15)
+        - JOB_LEASE_SECONDS: a running job whose owner stops renewing for this long is requeued (default: 60)
+        """
+        self.store = store
+        self.pipeline = pipeline
+        self.workers = env_int('JOB_WORKERS', 2)
+        self.result_ttl = env_int('JOB_RESULT_TTL_SECONDS', 86400)
+        self.max_attempts = env_int('JOB_MAX_ATTEMPTS', 2)
+        self.storage_dir = os.getenv('JOB_STORAGE_DIR') or data_dir('job_files')
+        self.keepalive_seconds = env_int('JOB_EVENTS_KEEPALIVE_SECONDS', 15)
+        self.lease_seconds = env_int('JOB_LEASE_SECONDS', 60)
+        self.owner = job_owner_id()
+        self.progress = pipeline.processing_pool.progress
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        # Jobs running in this process, and those the client asked to cancel
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancel_requested: Set[str] = set()
+
+    async def start(self):
+        """Recover interrupted jobs and start the worker, lease and cleanup tasks"""
+        os.makedirs(self.storage_dir, exist_ok=True)
+        await self._recover()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker_loop(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._lease_loop()))
+        self._tasks.append(asyncio.create_task(self._purge_loop()))
+        self._wakeup.set()
+        logger.info(f"Job runner started with {self.workers} workers")
+
+    async def stop(self):
+        """Stop workers and requeue the jobs they were running"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        released = await asyncio.to_thread(self.store.release, self.owner)
+        if released:
+            logger.info(f"Requeued {released} running jobs on shutdown")
+        self.store.close()
+
+    async def submit(self, upload: SpooledUpload, params: Dict[str, Any]) -> str:
+        """Take ownership of a spooled upload and queue it for processing"""
+        file_path = os.path.join(self.storage_dir, f"{uuid.uuid4()}{os.path.splitext(upload.filename)[1]}")
+        await asyncio.to_thread(shutil.move, upload.path, file_path)
+        job_uuid = await asyncio.to_thread(
+            self.store.enqueue, upload.filename, file_path, upload.sha256, params
+        )
+        self._wakeup.set()
+        await self.refresh_queue_depth()
+        logger.info(f"Queued job {job_uuid} for {upload.filename}")
+        return job_uuid
+
+    async def get(self, job_uuid: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_uuid)
+
+    async def cancel(self, job_uuid: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancel a job. Queued jobs never start; running jobs stop at the next await in
+        this process and at the next page boundary in pool workers. Returns the job, or None if unknown.
+        """
+        job = await self.get(job_uuid)
+        if job is None or job["status"] in FINISHED:
+            return job
+        # Flag first, so pool workers of a job running in another API process stop as well
+        await asyncio.to_thread(self.progress.cancel, job_uuid)
+        cancelled = await asyncio.to_thread(self.store.mark_cancelled, job_uuid, self.result_ttl)
+        task = self._running.get(job_uuid)
+        if task is not None:
+            self._cancel_requested.add(job_uuid)
+            task.cancel()
+        elif cancelled and job["status"] == QUEUED:
+            self._remove_file(job["file_path"])
+            await self.refresh_queue_depth()
+        logger.info(f"Cancelled job {job_uuid}")
+        return await self.get(job_uuid)
+
+    async def events(self, job_uuid: str, last_event_id: int = 0) -> AsyncIterator[str]:
+        """
+        Server-Sent Events for a job: progress while it runs, then a final status event.
+        Jobs running in another process only get the final status (checked on keep-alives).
+        """
+        with self.progress.subscription(job_uuid) as channel:
+            job = await self.get(job_uuid)
+            if job is None or job["status"] in FINISHED:
+                yield format_sse(last_event_id + 1, STATUS, _job_status(job, job_uuid))
+                return
+            if job["status"] == QUEUED and last_event_id == 0:
+                yield format_sse(0, STATUS, _job_status(job, job_uuid))
+            async for item in self.progress.iter_events(channel, last_event_id, self.keepalive_seconds):
+                if item is None:
+                    job = await self.get(job_uuid)
+                    if job is None or job["status"] in FINISHED:
+                        yield format_sse(last_event_id + 1, STATUS, _job_status(job, job_uuid))
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                last_event_id, event, data = item
+                yield format_sse(last_event_id, event, data)
+
+    async def refresh_queue_depth(self):
+        """Update the job queue depth gauge from the store"""
+        counts = await asyncio.to_thread(self.store.count_by_status)
+        JOB_QUEUE_DEPTH.set(counts.get(QUEUED, 0))
+
+    async def _worker_loop(self, worker_number: int):
+        while True:
+            job = await asyncio.to_thread(self.store.claim_next, self.owner, self.lease_seconds)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    # Poll occasionally as well, in case another process queued work
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=5.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.refresh_queue_depth()
+            # Separate task so a client cancel stops this job without stopping the worker
+            task = asyncio.create_task(self._run_job(job))
+            self._running[job["job_uuid"]] = task
+            try:
+                await asyncio.wait([task])
+            except asyncio.CancelledError:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise
+            finally:
+                self._running.pop(job["job_uuid"], None)
+
+    async def _run_job(self, job: Dict[str, Any]):
+        job_uuid = job["job_uuid"]
+        params = job["params"]
+        logger.info(f"Running job {job_uuid} ({job['filename']}, attempt {job['attempts']})")
+        self.progress.open(job_uuid)
+        self.progress.publish(job_uuid, STATUS, {"job_uuid": job_uuid, "status": RUNNING})
+        final = {"job_uuid": job_uuid, "status": SUCCEEDED}
+        try:
+            response = await self.pipeline.process(
+                job["file_path"],
+                job["filename"],
+                params["entity_uuid"],
+                params.get("source_system_hint"),
+                progress_token=job_uuid
+            )
+            if await asyncio.to_thread(
+                self.store.mark_succeeded, job_uuid, self.owner, response.model_dump_json(), self.result_ttl
+            ):
+                final["row_count"] = response.row_count
+                logger.info(f"Job {job_uuid} succeeded with {response.row_count} rows")
+            else:
+                final = await self._final_status(job_uuid)
+        except (asyncio.CancelledError, JobCancelled) as e:
+            if not await self._cancelled_by_client(job_uuid, e):
+                # Shutdown - stop() requeues the job
+                self.progress.close(job_uuid, STATUS, {"job_uuid": job_uuid, "status": "interrupted"})
+                raise
+            await asyncio.to_thread(self.store.mark_cancelled, job_uuid, self.result_ttl)
+            final["status"] = CANCELLED
+            logger.info(f"Job {job_uuid} stopped after cancellation")
+        except Exception as e:
+            logger.error(f"Job {job_uuid} failed: {str(e)}")
+            if await asyncio.to_thread(self.store.mark_failed, job_uuid, self.owner, str(e), self.result_ttl):
+                final.update(status=FAILED, error=str(e))
+            else:
+                final = await self._final_status(job_uuid)
+        finally:
+            self._cancel_requested.discard(job_uuid)
+        self.progress.close(job_uuid, STATUS, final)
+        self._remove_file(job["file_path"])
+
+    async def _cancelled_by_client(self, job_uuid: str, error: BaseException) -> bool:
+        """
+        Whether a job stopped because a client cancelled it rather than for shutdown. A cancel
+        made through another API process reaches this one only as the cancel flag (JobCancelled
+        from a pool worker) and the store's status, not through _cancel_requested.
+        """
+        if job_uuid in self._cancel_requested or isinstance(error, JobCancelled):
+            return True
+        job = await self.get(job_uuid)
+        return job is not None and job["status"] == CANCELLED
+
+    async def _final_status(self, job_uuid: str) -> Dict[str, Any]:
+        """Status of a job this runner finished after it was cancelled or taken over"""
+        job = await self.get(job_uuid)
+        logger.info(f"Job {job_uuid} finished, but is now {job['status'] if job else 'gone'}; result discarded")
+        return _job_status(job, job_uuid)
+
+    async def _recover(self):
+        await asyncio.to_thread(self.store.recover_interrupted, self.owner, self.max_attempts, self.result_ttl)
+
+    async def _lease_loop(self):
+        """Renew the leases of this runner's jobs, and requeue jobs of runners that stopped renewing"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.store.renew_leases, self.owner, self.lease_seconds)
+                await self._recover()
+            except Exception as e:
+                logger.warning(f"Job lease renewal failed: {str(e)}")
+
+    async def _purge_loop(self):
+        while True:
+            try:
+                for file_path in await asyncio.to_thread(self.store.purge_expired):
+                    self._remove_file(file_path)
+            except Exception as e:
+                logger.warning(f"Job purge failed: {str(e)}")
+            await asyncio.sleep(60)
+
+    def _remove_file(self, file_path: Optional[str]):
+        if file_path and os.path.exists(file_path):
+            os.unlink(file_path)
+
+
+def _job_status(job: Optional[Dict[str, Any]], job_uuid: str) -> Dict[str, Any]:
+    """Payload of a status event"""
+    if job is None:
+        return {"job_uuid": job_uuid, "status": "expired"}
+    status = {"job_uuid": job_uuid, "status": job["status"]}
+    if job["error"]:
+        status["error"] = job["error"]
+    return status
+
+
+def render_job(job: Dict[str, Any]) -> str:
+    """JSON body for GET /jobs/{job_uuid}; the stored result JSON is embedded as-is, not re-serialized"""
+    status = {
+        "job_uuid": job["job_uuid"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "expires_at": job["expires_at"],
+        "error": job["error"],
+    }
+    body = json.dumps(status)
+    if job["status"] == SUCCEEDED and job["result"]:
+        body = f'{body[:-1]}, "result": {job["result"]}}}'
+    return body
@@ -0,0 +1,318 @@
+"""
+Layout Cache Module
+
+Remembers the raw structure analysis and column mapping of file layouts seen
+before. Clients upload the same export layout (DATEV, Lexware, ...) every
+month; once the LLM has analyzed a layout, later uploads with the same
+fingerprint reuse the stored RawFileStructure and column mapping and skip the
+LLM entirely.
+
+The fingerprint is built from the ingest previews: sheet names, column
+counts, the token shapes of the rows above the header ("Summen- und
+Saldenliste 01/2024" -> "a- a a 9/9"), the header row itself and whether each
+column holds numbers or text. Balances and account descriptions of the data
+rows do not enter it, so next month's export of the same layout matches.
+
+Stored confidence decays with a half-life since the LLM last confirmed the
+layout; below a minimum the layout is analyzed again, and a fresh LLM answer
+re-confirms it. Entries are dropped when a file parsed with them yields no
+rows, or through the /layouts API; every invalidation bumps a generation that
+is part of the /process-file result cache key.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from .ingest_context import CSV_FRAME, IngestContext
+from .metrics import LAYOUT_CACHE_REQUESTS
+from .models import RawAnalysisResult
+from .prompt_compiler import header_candidates, profile_columns
+from .utils.env import env_bool, env_float, env_int
+from .utils.storage import connect_sqlite, data_path
+
+logger = logging.getLogger(__name__)
+
+# Bump when fingerprinting or the stored analysis format changes
+LAYOUT_CACHE_VERSION = "1"
+
+# Lookup outcomes, exported as layout_cache_requests_total
+HIT = "hit"
+MISS = "miss"
+STALE = "stale"
+INVALIDATED = "invalidated"
+
+# Non-empty rows fingerprinted by shape when no header row is found
+SHAPE_ROWS = 8
+MAX_SHAPE_CHARS = 40
+
+_LETTERS = re.compile(r"[^\W\d_]+")
+_DIGITS = re.compile(r"\d+")
+
+# Hints of the analysis that describe one upload rather than the layout
+_TRANSIENT_HINTS = ("analysis_timestamp", "layout_fingerprint", "layout_cache", "layout_confidence")
+
+
+def token_shape(value: Any) -> str:
+    """Shape of a cell: letter runs -> a, digit runs -> 9, signs dropped ("-1.234,56" -> "9.9,9")"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    text = " ".join(str(value).split()).lstrip("+-")
+    return _DIGITS.sub("9", _LETTERS.sub("a", text))[:MAX_SHAPE_CHARS]
+
+
+def frame_signature(frame: pd.DataFrame) -> List[str]:
+    """
+    Layout lines of a raw preview frame: column count, shapes of the rows above the
+    header, the header row (lowercased) and per column n(umeric)/t(ext)/_ below it
+    """
+    lines = [f"columns={frame.shape[1]}"]
+    candidates = header_candidates(frame)
+    if candidates:
+        header_position, header_cells = candidates[0]
+        for row in frame.head(header_position).itertuples(index=False):
+            shape = "|".join(token_shape(value) for value in row).rstrip("|")
+            if shape:
+                lines.append(shape)
+        lines.append("header=" + "|".join(cell.lower() for cell in header_cells))
+        body = frame.iloc[header_position + 1:]
+    else:
+        shapes = [
+            "|".join(token_shape(value) for value in row).rstrip("|")
+            for row in frame.itertuples(index=False)
+        ]
+        lines.extend([shape for shape in shapes if shape][:SHAPE_ROWS])
+        body = frame
+    kinds = [
+        "_" if not profile.filled else "n" if profile.numeric_ratio >= 0.5 else "t"
+        for profile in profile_columns(body)
+    ]
+    lines.append("kinds=" + "".join(kinds))
+    return lines
+
+
+def layout_fingerprint(context: IngestContext) -> str:
+    """Fingerprint of a file's layout from its ingest previews"""
+    lines = [LAYOUT_CACHE_VERSION, context.file_type]
+    if context.file_type == "csv":
+        lines.append(f"delimiter={context.delimiter}")
+    else:
+        lines.append("sheets=" + "|".join(context.sheet_names))
+    for name, frame in context.previews.items():
+        lines.append(f"[{name if name != CSV_FRAME else ''}]")
+        lines.extend(frame_signature(frame))
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+class LayoutCache:
+    """Stored raw analyses and column mappings by layout fingerprint, with confidence decay"""
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        enabled: Optional[bool] = None,
+        half_life_days: Optional[float] = None,
+        min_confidence: Optional[float] = None
+    ):
+        """
+        Configuration (environment):
+        - LAYOUT_CACHE_ENABLED: reuse analyses of known layouts (default: true)
+        - LAYOUT_CACHE_DB_PATH: SQLite file (default: <SERVICE_DATA_DIR>/layout_cache.sqlite3)
+        - LAYOUT_CACHE_HALF_LIFE_DAYS: days for a stored confidence to halve (default: 90)
+        - LAYOUT_CACHE_MIN_CONFIDENCE: below this decayed confidence the LLM analyzes again (default: 0.6)
+        - LAYOUT_CACHE_MAX_ENTRIES: layouts kept, least recently used pruned first (default: 10000)
+        """
+        self.enabled = env_bool('LAYOUT_CACHE_ENABLED', True) if enabled is None else enabled
+        self.db_path = db_path or os.getenv('LAYOUT_CACHE_DB_PATH') or data_path('layout_cache.sqlite3')
+        self.half_life_seconds = 86400 * (
+            half_life_days if half_life_days is not None else env_float('LAYOUT_CACHE_HALF_LIFE_DAYS', 90.0)
+        )
+        self.min_confidence = (
+            min_confidence if min_confidence is not None else env_float('LAYOUT_CACHE_MIN_CONFIDENCE', 0.6)
+        )
+        self.max_entries = env_int('LAYOUT_CACHE_MAX_ENTRIES', 10000)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = connect_sqlite(self.db_path)
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS layouts (
+                    fingerprint TEXT PRIMARY KEY,
+                    file_type TEXT NOT NULL,
+                    analysis TEXT NOT NULL,
+                    confidence REAL NOT NULL,
+                    column_headers TEXT,
+                    column_mapping TEXT,
+                    confirmed_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_layouts_last_used ON layouts (last_used_at);
+                CREATE TABLE IF NOT EXISTS layout_generation (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    generation INTEGER NOT NULL
+                );
+            """)
+        return self._connection
+
+    def decayed_confidence(self, confidence: float, confirmed_at: float, now: Optional[float] = None) -> float:
+        """Stored confidence halved every half-life since the layout was last confirmed"""
+        age = max(0.0, (now or time.time()) - confirmed_at)
+        return confidence * 0.5 ** (age / self.half_life_seconds)
+
+    async def lookup(self, fingerprint: str, content_preview: List[str]) -> Optional[RawAnalysisResult]:
+        """Stored analysis of a known layout with its decayed confidence, or None"""
+        if not self.enabled:
+            return None
+        row = await asyncio.to_thread(self._read, fingerprint, True)
+        if row is None:
+            LAYOUT_CACHE_REQUESTS.labels(outcome=MISS).inc()
+            return None
+        confidence = round(self.decayed_confidence(row["confidence"], row["confirmed_at"]), 3)
+        if confidence < self.min_confidence:
+            logger.info(f"Layout {fingerprint[:12]} confidence decayed to {confidence}, analyzing again")
+            LAYOUT_CACHE_REQUESTS.labels(outcome=STALE).inc()
+            return None
+
+        stored = RawAnalysisResult.model_validate_json(row["analysis"])
+        stored.file_structure.confidence = confidence
+        stored.analysis_confidence = confidence
+        stored.content_preview = content_preview
+        stored.processing_hints.update({
+            "layout_cache": True,
+            "layout_fingerprint": fingerprint,
+            "layout_confidence": confidence,
+        })
+        LAYOUT_CACHE_REQUESTS.labels(outcome=HIT).inc()
+        logger.info(f"Known layout {fingerprint[:12]} (seen {row['hits'] + 1}x), skipping LLM raw analysis")
+        return stored
+
+    async def store(self, fingerprint: str, file_type: str, analysis: RawAnalysisResult):
+        """Keep (or re-confirm) the LLM analysis of a layout"""
+        if not self.enabled:
+            return
+        stored = analysis.model_copy(deep=True)
+        stored.content_preview = []
+        stored.processing_hints = {
+            key: value for key, value in stored.processing_hints.items() if key not in _TRANSIENT_HINTS
+        }
+        await asyncio.to_thread(
+            self._write, fingerprint, file_type, stored.model_dump_json(), analysis.analysis_confidence
+        )
+
+    async def column_mapping(self, fingerprint: str, column_headers: List[str]) -> Optional[Dict[str, str]]:
+        """Stored column mapping of a layout, if it was made for the same column headers"""
+        if not self.enabled:
+            return None
+        row = await asyncio.to_thread(self._read, fingerprint, False)
+        if row is None or not row["column_mapping"]:
+            return None
+        if json.loads(row["column_headers"]) != list(column_headers):
+            return None
+        return json.loads(row["column_mapping"])
+
+    async def store_column_mapping(self, fingerprint: str, column_headers: List[str], mapping: Dict[str, str]):
+        """Attach a column mapping to a known layout"""
+        if not self.enabled:
+            return
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE layouts SET column_headers = ?, column_mapping = ? WHERE fingerprint = ?",
+            (json.dumps(list(column_headers)), json.dumps(mapping), fingerprint)
+        )
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Stored entry as a dict (for inspection), or None"""
+        row = self._read(fingerprint, False)
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["analysis"] = json.loads(entry["analysis"])
+        entry["column_headers"] = json.loads(entry["column_headers"]) if entry["column_headers"] else None
+        entry["column_mapping"] = json.loads(entry["column_mapping"]) if entry["column_mapping"] else None
+        entry["decayed_confidence"] = round(self.decayed_confidence(row["confidence"], row["confirmed_at"]), 3)
+        return entry
+
+    def invalidate(self, fingerprint: str, reason: str = "") -> bool:
+        """Forget a layout; True if it was stored"""
+        with self._lock:
+            removed = self.connection.execute("DELETE FROM layouts WHERE fingerprint = ?", (fingerprint,)).rowcount > 0
+            if removed:
+                self.connection.execute(
+                    "INSERT INTO layout_generation (id, generation) VALUES (0, 1) "
+                    "ON CONFLICT (id) DO UPDATE SET generation = generation + 1"
+                )
+        if removed:
+            LAYOUT_CACHE_REQUESTS.labels(outcome=INVALIDATED).inc()
+            logger.info(f"Layout {fingerprint[:12]} invalidated{': ' + reason if reason else ''}")
+        return removed
+
+    def generation(self) -> int:
+        """Counter of layout invalidations (results built with a dropped layout are stale)"""
+        with self._lock:
+            row = self.connection.execute("SELECT generation FROM layout_generation WHERE id = 0").fetchone()
+        return row["generation"] if row else 0
+
+    def _read(self, fingerprint: str, touch: bool):
+        with self._lock:
+            if touch:
+                return self.connection.execute(
+                    "UPDATE layouts SET last_used_at = ?, hits = hits + 1 WHERE fingerprint = ? "
+                    "RETURNING analysis, confidence, confirmed_at, hits - 1 AS hits",
+                    (time.time(), fingerprint)
+                ).fetchone()
+            return self.connection.execute("SELECT * FROM layouts WHERE fingerprint = ?", (fingerprint,)).fetchone()
+
+    def _write(self, fingerprint: str, file_type: str, analysis: str, confidence: float):
+        now = time.time()
+        try:
+            with self._lock:
+                # A re-confirmed layout keeps its column mapping
+                self.connection.execute(
+                    "INSERT INTO layouts (fingerprint, file_type, analysis, confidence, confirmed_at, last_used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (fingerprint) DO UPDATE SET "
+                    "analysis = excluded.analysis, confidence = excluded.confidence, "
+                    "confirmed_at = excluded.confirmed_at, last_used_at = excluded.last_used_at",
+                    (fingerprint, file_type, analysis, confidence, now, now)
+                )
+                excess = self.connection.execute("SELECT COUNT(*) FROM layouts").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    self.connection.execute(
+                        "DELETE FROM layouts WHERE fingerprint IN "
+                        "(SELECT fingerprint FROM layouts ORDER BY last_used_at LIMIT ?)",
+                        (excess,)
+                    )
+        except Exception as e:
+            logger.warning(f"Could not store layout {fingerprint[:12]}: {str(e)}")
+
+    def _execute(self, sql: str, parameters: tuple) -> int:
+        with self._lock:
+            return self.connection.execute(sql, parameters).rowcount
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+# One cache per process, shared by RawFileAnalyzer, PandasAnalyzer and the API
+_shared_cache: Optional[LayoutCache] = None
+
+
+def get_layout_cache() -> LayoutCache:
+    """Process-wide LayoutCache, built on first use"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = LayoutCache()
+    return _shared_cache
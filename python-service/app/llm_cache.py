@@ -0,0 +1,210 @@
+"""
+LLM Cache Module
+
+Response cache for LLM chat completions. Entries are keyed by model, system
+prompt, token limit and a whitespace-normalized prompt hash, so the same
+sheet previews, headers or account numbers are answered once. An in-memory
+LRU sits in front of a SQLite store that survives restarts; both expire
+entries after a TTL and are bounded by entry count. Concurrent identical
+prompts share one in-flight request.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+from .metrics import LLM_CACHE_REQUESTS
+from .result_cache import COALESCED, HIT, MISS
+from .utils.env import env_bool, env_int
+from .utils.single_flight import SingleFlight
+from .utils.storage import connect_sqlite, data_path
+
+logger = logging.getLogger(__name__)
+
+# Bump when response parsing changes make cached answers unusable
+LLM_CACHE_VERSION = "1"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Prompt with whitespace runs collapsed, so formatting-only differences share a key"""
+    return " ".join(prompt.split())
+
+
+def llm_cache_key(model: str, prompt: str, max_tokens: int, system_prompt: str = "") -> str:
+    """Cache key for one completion request"""
+    material = "\x1f".join([
+        LLM_CACHE_VERSION, model, str(max_tokens), normalize_prompt(system_prompt), normalize_prompt(prompt)
+    ])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class LLMResponseCache:
+    """LRU of completion texts with TTL, backed by SQLite, with single-flight calls"""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        db_path: Optional[str] = None,
+        disk_max_entries: Optional[int] = None,
+        enabled: Optional[bool] = None
+    ):
+        """
+        Configuration (environment):
+        - LLM_CACHE_ENABLED: cache LLM responses (default: true)
+        - LLM_CACHE_MAX_ENTRIES: in-memory entries (default: 2048)
+        - LLM_CACHE_TTL_SECONDS: entry lifetime (default: 7 days)
+        - LLM_CACHE_PERSIST: keep entries in SQLite across restarts (default: true)
+        - LLM_CACHE_DB_PATH: SQLite file (default: <SERVICE_DATA_DIR>/llm_cache.sqlite3)
+        - LLM_CACHE_DISK_MAX_ENTRIES: persisted entries, least recently used pruned first (default: 100000)
+        """
+        self.enabled = env_bool('LLM_CACHE_ENABLED', True) if enabled is None else enabled
+        self.max_entries = max_entries if max_entries is not None else env_int('LLM_CACHE_MAX_ENTRIES', 2048)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else env_int('LLM_CACHE_TTL_SECONDS', 7 * 86400)
+        if db_path is None and env_bool('LLM_CACHE_PERSIST', True):
+            db_path = os.getenv('LLM_CACHE_DB_PATH') or data_path('llm_cache.sqlite3')
+        self.db_path = db_path or None
+        self.disk_max_entries = (
+            disk_max_entries if disk_max_entries is not None
+            else env_int('LLM_CACHE_DISK_MAX_ENTRIES', 100000)
+        )
+
+        # key -> (expires_at, response)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._single_flight: SingleFlight[Tuple[str, str]] = SingleFlight()
+        self._connection = None
+        self._lock = threading.Lock()
+        # Lookups by outcome since start, also exported as llm_cache_requests_total
+        self.stats = {HIT: 0, MISS: 0, COALESCED: 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = connect_sqlite(self.db_path)
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    cache_key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used
+                    ON llm_responses (last_used_at);
+            """)
+        return self._connection
+
+    async def get_or_call(self, key: str, call: Callable[[], Awaitable[str]]) -> Tuple[str, str]:
+        """
+        Cached response for key, or the result of call() stored under it.
+        Returns (response, outcome) with outcome one of hit, miss or coalesced.
+        Failed calls are not cached; every waiter of a failed call gets the error.
+        """
+        if not self.enabled:
+            return await call(), MISS
+
+        response = self.get(key)
+        if response is not None:
+            self._count(HIT)
+            return response, HIT
+
+        # A caller being cancelled (e.g. an abandoned hedge) does not cancel the shared call
+        (response, outcome), joined = await self._single_flight.run(key, lambda: self._call(key, call))
+        if joined:
+            self._count(COALESCED)
+            return response, COALESCED
+        return response, outcome
+
+    async def _call(self, key: str, call: Callable[[], Awaitable[str]]) -> Tuple[str, str]:
+        response = await self._load_disk(key)
+        outcome = HIT if response is not None else MISS
+        if response is None:
+            response = await call()
+            await self.put(key, response)
+        self._count(outcome)
+        return response, outcome
+
+    def get(self, key: str) -> Optional[str]:
+        """Unexpired in-memory response, refreshed as most recently used"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    async def put(self, key: str, response: str):
+        expires_at = time.time() + self.ttl_seconds
+        self._store(key, expires_at, response)
+        if self.db_path:
+            await asyncio.to_thread(self._write_disk, key, expires_at, response)
+
+    def _count(self, outcome: str):
+        self.stats[outcome] += 1
+        LLM_CACHE_REQUESTS.labels(outcome=outcome).inc()
+
+    def _store(self, key: str, expires_at: float, response: str):
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _load_disk(self, key: str) -> Optional[str]:
+        """Promote a persisted, unexpired entry into memory"""
+        if not self.db_path:
+            return None
+        entry = await asyncio.to_thread(self._read_disk, key)
+        if entry is None:
+            return None
+        self._store(key, *entry)
+        return entry[1]
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, str]]:
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute(
+                "UPDATE llm_responses SET last_used_at = ? WHERE cache_key = ? AND expires_at > ? "
+                "RETURNING expires_at, response",
+                (now, key, now)
+            ).fetchone()
+        return (row["expires_at"], row["response"]) if row else None
+
+    def _write_disk(self, key: str, expires_at: float, response: str):
+        now = time.time()
+        try:
+            with self._lock:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO llm_responses (cache_key, response, created_at, expires_at, last_used_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, response, now, expires_at, now)
+                )
+                self._prune_disk(now)
+        except Exception as e:
+            logger.warning(f"Could not persist LLM response {key[:12]}: {str(e)}")
+
+    def _prune_disk(self, now: float):
+        """Drop expired rows, then least recently used rows beyond the disk budget"""
+        self.connection.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (now,))
+        excess = self.connection.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0] - self.disk_max_entries
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM llm_responses WHERE cache_key IN "
+                "(SELECT cache_key FROM llm_responses ORDER BY last_used_at LIMIT ?)",
+                (excess,)
+            )
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,135 @@
+"""
+LLM Client Module
+
+One pooled httpx.AsyncClient per process for LLM API calls. Prompts reuse
+keep-alive connections (multiplexed over HTTP/2 when the h2 package is
+installed) instead of paying TCP and TLS setup on every call. The client is
+closed by the FastAPI lifespan.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+
+from .utils.env import env_bool, env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+H2_AVAILABLE = _h2_available()
+
+
+class LLMHttpClient:
+    """Lazily built, pooled AsyncClient bound to the event loop that uses it"""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        http2: Optional[bool] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Configuration (environment):
+        - LLM_BASE_URL: API base URL (default: https://api.openai.com/v1), e.g. a local
+          stand-in server for tests and benchmarks
+        - LLM_HTTP2: negotiate HTTP/2 (default: true; needs the h2 package)
+        - LLM_MAX_CONNECTIONS: open connections at most (default: 20)
+        - LLM_MAX_KEEPALIVE_CONNECTIONS: idle connections kept open (default: 10)
+        - LLM_KEEPALIVE_EXPIRY_SECONDS: idle time before a connection is closed (default: 60)
+        - LLM_TIMEOUT_SECONDS: read timeout per call (default: 30)
+        - LLM_CONNECT_TIMEOUT_SECONDS: connect timeout (default: 5)
+        """
+        self.base_url = (base_url or os.getenv('LLM_BASE_URL') or DEFAULT_BASE_URL).rstrip('/')
+        self.http2 = env_bool('LLM_HTTP2', True) if http2 is None else http2
+        if self.http2 and not H2_AVAILABLE:
+            logger.warning("h2 is not installed, LLM calls use HTTP/1.1")
+            self.http2 = False
+        self.limits = httpx.Limits(
+            max_connections=env_int('LLM_MAX_CONNECTIONS', 20),
+            max_keepalive_connections=env_int('LLM_MAX_KEEPALIVE_CONNECTIONS', 10),
+            keepalive_expiry=env_float('LLM_KEEPALIVE_EXPIRY_SECONDS', 60.0)
+        )
+        self.timeout = httpx.Timeout(
+            env_float('LLM_TIMEOUT_SECONDS', 30.0),
+            connect=env_float('LLM_CONNECT_TIMEOUT_SECONDS', 5.0)
+        )
+        self.transport = transport
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Clients built so far - more than one per loop means connections were not reused
+        self.clients_created = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The pooled client, rebuilt if closed or used from another event loop"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            # Pooled connections belong to the loop that opened them
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout,
+                transport=self.transport
+            )
+            self._loop = loop
+            self.clients_created += 1
+            logger.info(f"LLM HTTP client opened for {self.base_url} (http2={self.http2})")
+        return self._client
+
+    async def post_json(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None
+    ) -> httpx.Response:
+        """POST a JSON body to a path relative to the base URL; timeout caps the client timeouts"""
+        request_timeout = httpx.USE_CLIENT_DEFAULT
+        if timeout is not None:
+            request_timeout = httpx.Timeout(
+                min(timeout, self.timeout.read or timeout),
+                connect=min(timeout, self.timeout.connect or timeout)
+            )
+        return await self.client.post(path, json=payload, headers=headers, timeout=request_timeout)
+
+    async def aclose(self):
+        """Close pooled connections; the next call opens a new client"""
+        client, self._client = self._client, None
+        if client is None or client.is_closed:
+            return
+        if self._loop is asyncio.get_running_loop():
+            await client.aclose()
+        logger.info("LLM HTTP client closed")
+
+
+# One client per process, shared by every GPT5ColumnAnalyzer call site
+_shared_client: Optional[LLMHttpClient] = None
+
+
+def get_llm_client() -> LLMHttpClient:
+    """Process-wide LLMHttpClient, built on first use"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = LLMHttpClient()
+    return _shared_client
+
+
+async def close_llm_client():
+    """Close the process-wide client (app shutdown)"""
+    if _shared_client is not None:
+        await _shared_client.aclose()
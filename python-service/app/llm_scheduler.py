@@ -0,0 +1,422 @@
+"""
+LLM Scheduler Module
+
+Admission control for LLM calls. Every call goes through one process-wide
+scheduler, which applies:
+
+- a token bucket rate limiter and a concurrency semaphore;
+- a deadline per call (configurable per call site) covering waiting, every
+  attempt and the backoff between attempts;
+- bounded retries on 429, 5xx, timeouts and connection errors, with
+  exponential backoff, full jitter and Retry-After support;
+- a circuit breaker that opens after consecutive failed calls. While it is
+  open, calls fail immediately with CircuitOpen, so callers use their
+  fallback at once instead of paying the timeout on every request. After
+  a cool-down, one trial call decides whether it closes again.
+
+Analyses with a deterministic fallback can be hedged: the fallback runs
+alongside the LLM call, and when the LLM has not answered within the call
+site's latency budget the fallback result is used. The LLM call keeps
+running in the background, so its late answer still lands in the response
+cache for the next upload of the same layout. Call sites that fell back are
+recorded for the enclosing track_fallbacks() block, so results built from a
+fallback are not cached as if the LLM had answered.
+
+Breaker state, waiting/in-flight calls, limiter wait time and outcomes are
+exported as Prometheus metrics.
+"""
+
+import asyncio
+import logging
+import random
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Set, TypeVar, Union
+
+import httpx
+
+from .metrics import (
+    LLM_BREAKER_STATE,
+    LLM_CALLS_IN_FLIGHT,
+    LLM_CALLS_WAITING,
+    LLM_HEDGED_CALLS,
+    LLM_LIMITER_WAIT,
+    LLM_SCHEDULED_CALLS,
+)
+from .utils.env import env_float, env_int, env_mapping
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Circuit breaker states, exported as the llm_breaker_state gauge value
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+BREAKER_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# HTTP statuses worth retrying: rate limited, or a server-side failure
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Call sites that used their fallback within the current track_fallbacks() block
+_fallbacks: ContextVar[Optional[List[str]]] = ContextVar('llm_fallbacks', default=None)
+
+
+@contextmanager
+def track_fallbacks() -> Iterator[List[str]]:
+    """Collect the call sites that fell back from the LLM (over budget, failed or unusable) within the block"""
+    fallbacks: List[str] = []
+    token = _fallbacks.set(fallbacks)
+    try:
+        yield fallbacks
+    finally:
+        _fallbacks.reset(token)
+
+
+def record_fallback(call_site: str):
+    """Note that a result in the current track_fallbacks() block was built without the LLM"""
+    fallbacks = _fallbacks.get()
+    if fallbacks is not None:
+        fallbacks.append(call_site)
+
+
+class CircuitOpen(Exception):
+    """Raised without calling the API while the circuit breaker is open"""
+
+
+class DeadlineExceeded(Exception):
+    """The call's deadline passed while waiting, calling or backing off"""
+
+
+class LLMCallError(Exception):
+    """An LLM API call answered with an error status"""
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"LLM API error {status_code}: {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code in RETRYABLE_STATUS
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, LLMCallError):
+        return error.retryable
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError))
+
+
+class TokenBucket:
+    """Token bucket: rate tokens per second, up to burst tokens saved up"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, deadline: float):
+        """Take one token, waiting for it unless that would pass the deadline"""
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                raise DeadlineExceeded("Rate limit wait would exceed the call deadline")
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; half-opens for one trial call after reset_seconds"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        LLM_BREAKER_STATE.set(BREAKER_STATE_VALUES[CLOSED])
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"LLM circuit breaker {self.state} -> {state}")
+        self.state = state
+        LLM_BREAKER_STATE.set(BREAKER_STATE_VALUES[state])
+
+    def admit(self):
+        """Raise CircuitOpen unless a call may go ahead"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                raise CircuitOpen("LLM circuit breaker is open")
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._trial_in_flight:
+                raise CircuitOpen("LLM circuit breaker is half-open, trial call in flight")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self._trial_in_flight = False
+        self.failures = 0
+        self._set_state(CLOSED)
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def release(self):
+        """A call ended without a verdict on the API's health (e.g. cancelled)"""
+        self._trial_in_flight = False
+
+
+class LLMScheduler:
+    """Process-wide limiter, retry policy and circuit breaker for LLM calls"""
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        rate_per_second: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        deadline_seconds: Optional[float] = None
+    ):
+        """
+        Configuration (environment):
+        - LLM_MAX_CONCURRENCY: calls in flight per process (default: 8)
+        - LLM_RATE_LIMIT_PER_SECOND: calls started per second, 0 for no limit (default: 5)
+        - LLM_RATE_LIMIT_BURST: calls that may start at once after an idle period (default: 10)
+        - LLM_MAX_RETRIES: retries after the first attempt (default: 2)
+        - LLM_BACKOFF_BASE_SECONDS / LLM_BACKOFF_MAX_SECONDS: exponential backoff (default: 0.5 / 8)
+        - LLM_DEADLINE_SECONDS: default deadline per call, retries included (default: 45)
+        - LLM_CALL_DEADLINES: per call site deadlines, e.g. "raw_analysis=20,column_mapping=20"
+        - LLM_BREAKER_FAILURES: consecutive failed calls that open the breaker (default: 5)
+        - LLM_BREAKER_RESET_SECONDS: time open before a trial call (default: 30)
+        - LLM_HEDGE_BUDGET_SECONDS: wait for a hedged LLM analysis before using the
+          fallback, 0 to always wait (default: 10)
+        - LLM_HEDGE_BUDGETS: per call site budgets, e.g. "raw_analysis=5,column_mapping=8"
+        """
+        self.max_concurrency = max_concurrency or max(1, env_int('LLM_MAX_CONCURRENCY', 8))
+        self.rate_per_second = (
+            rate_per_second if rate_per_second is not None else env_float('LLM_RATE_LIMIT_PER_SECOND', 5.0)
+        )
+        self.burst = burst or env_int('LLM_RATE_LIMIT_BURST', 10)
+        self.max_retries = max_retries if max_retries is not None else env_int('LLM_MAX_RETRIES', 2)
+        self.backoff_base = env_float('LLM_BACKOFF_BASE_SECONDS', 0.5)
+        self.backoff_max = env_float('LLM_BACKOFF_MAX_SECONDS', 8.0)
+        self.deadline_seconds = deadline_seconds or env_float('LLM_DEADLINE_SECONDS', 45.0)
+        self.call_deadlines = _seconds_by_call_site('LLM_CALL_DEADLINES')
+        self.hedge_budget_seconds = env_float('LLM_HEDGE_BUDGET_SECONDS', 10.0)
+        self.hedge_budgets = _seconds_by_call_site('LLM_HEDGE_BUDGETS')
+
+        self.breaker = CircuitBreaker(
+            env_int('LLM_BREAKER_FAILURES', 5),
+            env_float('LLM_BREAKER_RESET_SECONDS', 30.0)
+        )
+        self.bucket = TokenBucket(self.rate_per_second, self.burst)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # LLM calls that outlived their hedge budget, referenced until they finish
+        self._late_calls: Set[asyncio.Task] = set()
+
+    def deadline_for(self, call_site: str) -> float:
+        """Deadline in seconds for a call site"""
+        return self.call_deadlines.get(call_site, self.deadline_seconds)
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Bound to the loop that waits on it - rebuilt when used from another loop
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(
+        self,
+        call: Callable[[float], Awaitable[T]],
+        call_site: str = "default",
+        deadline_seconds: Optional[float] = None
+    ) -> T:
+        """
+        Run call(timeout) under the limits, retrying transient failures until the
+        deadline. timeout is the time left for that attempt. Raises CircuitOpen,
+        DeadlineExceeded or the last error.
+        """
+        try:
+            self.breaker.admit()
+        except CircuitOpen:
+            LLM_SCHEDULED_CALLS.labels(call_site=call_site, outcome="rejected").inc()
+            raise
+
+        deadline = time.monotonic() + (deadline_seconds or self.deadline_for(call_site))
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = await self._attempt(call, deadline)
+                except Exception as e:
+                    retry_delay = self._retry_delay(e, attempt, deadline)
+                    if retry_delay is None:
+                        raise
+                    attempt += 1
+                    logger.warning(
+                        f"LLM call ({call_site}) failed: {str(e) or type(e).__name__}; "
+                        f"retry {attempt}/{self.max_retries} in {retry_delay:.2f}s"
+                    )
+                    LLM_SCHEDULED_CALLS.labels(call_site=call_site, outcome="retry").inc()
+                    await asyncio.sleep(retry_delay)
+                    continue
+                self.breaker.record_success()
+                LLM_SCHEDULED_CALLS.labels(call_site=call_site, outcome="success").inc()
+                return result
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            outcome = "deadline" if isinstance(e, DeadlineExceeded) else "failure"
+            LLM_SCHEDULED_CALLS.labels(call_site=call_site, outcome=outcome).inc()
+            if isinstance(e, DeadlineExceeded) or is_retryable(e):
+                # The API is slow or failing - count towards opening the breaker
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+            raise
+
+    async def _attempt(self, call: Callable[[float], Awaitable[T]], deadline: float) -> T:
+        semaphore = self.semaphore
+        waiting_since = time.monotonic()
+        LLM_CALLS_WAITING.inc()
+        try:
+            await self.bucket.acquire(deadline)
+            remaining = deadline - time.monotonic()
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=max(remaining, 0))
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Waited for a free LLM call slot until the deadline")
+        finally:
+            LLM_CALLS_WAITING.dec()
+            LLM_LIMITER_WAIT.observe(time.monotonic() - waiting_since)
+
+        LLM_CALLS_IN_FLIGHT.inc()
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("LLM call deadline passed before the call started")
+            try:
+                return await asyncio.wait_for(call(remaining), timeout=remaining)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("LLM call did not finish within its deadline")
+        finally:
+            LLM_CALLS_IN_FLIGHT.dec()
+            semaphore.release()
+
+    def hedge_budget_for(self, call_site: str) -> float:
+        """Hedge budget in seconds for a call site (0 or less: no budget)"""
+        return self.hedge_budgets.get(call_site, self.hedge_budget_seconds)
+
+    async def hedged(
+        self,
+        call_site: str,
+        llm_call: Awaitable[T],
+        fallback: Callable[[], Union[T, Awaitable[T]]],
+        accept: Optional[Callable[[T], bool]] = None
+    ) -> T:
+        """
+        Result of llm_call if it succeeds within the call site's hedge budget and
+        accept(result) holds, else the result of fallback(), which is computed while
+        the LLM call is in flight. An LLM call still running at the budget is left to
+        finish in the background (filling the response cache), not cancelled.
+        """
+        budget = self.hedge_budget_for(call_site)
+        started = time.monotonic()
+        task = asyncio.ensure_future(llm_call)
+
+        try:
+            fallback_result = fallback()
+            if inspect.isawaitable(fallback_result):
+                fallback_result = await fallback_result
+        except Exception as e:
+            # Without a fallback there is nothing to hedge with - wait for the LLM
+            logger.warning(f"Fallback for LLM {call_site} failed: {str(e)}")
+            return await task
+
+        remaining = budget - (time.monotonic() - started) if budget > 0 else None
+        done, _ = await asyncio.wait({task}, timeout=max(remaining, 0) if remaining is not None else None)
+        if not done:
+            logger.info(f"LLM {call_site} over its {budget:.1f}s budget, using the fallback result")
+            LLM_HEDGED_CALLS.labels(call_site=call_site, outcome="budget_exceeded").inc()
+            self._late_calls.add(task)
+            task.add_done_callback(lambda late: self._late_call_done(late, call_site, started))
+            record_fallback(call_site)
+            return fallback_result
+
+        error = task.exception()
+        if error is None and (accept is None or accept(task.result())):
+            LLM_HEDGED_CALLS.labels(call_site=call_site, outcome="llm").inc()
+            return task.result()
+        if error is not None:
+            logger.warning(f"LLM {call_site} failed, using the fallback result: {str(error) or type(error).__name__}")
+        LLM_HEDGED_CALLS.labels(call_site=call_site, outcome="llm_unusable").inc()
+        record_fallback(call_site)
+        return fallback_result
+
+    def _late_call_done(self, task: asyncio.Task, call_site: str, started: float):
+        self._late_calls.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            logger.info(f"Late LLM {call_site} call failed: {str(error) or type(error).__name__}")
+            return
+        LLM_HEDGED_CALLS.labels(call_site=call_site, outcome="late_answer").inc()
+        logger.info(f"Late LLM {call_site} answer after {time.monotonic() - started:.1f}s, cached for next time")
+
+    def _retry_delay(self, error: Exception, attempt: int, deadline: float) -> Optional[float]:
+        """Backoff before the next attempt, or None to give up"""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        # Exponential backoff with full jitter; Retry-After from the API wins when longer
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if isinstance(error, LLMCallError) and error.retry_after:
+            delay = max(delay, error.retry_after)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+
+def _seconds_by_call_site(name: str) -> Dict[str, float]:
+    """Parse a "call_site=seconds,..." environment variable"""
+    seconds_by_site: Dict[str, float] = {}
+    for call_site, seconds in env_mapping(name).items():
+        try:
+            seconds_by_site[call_site] = float(seconds)
+        except ValueError:
+            logger.warning(f"Invalid {name} value for LLM call site {call_site}: '{seconds}'")
+    return seconds_by_site
+
+
+# One scheduler per process, shared by every GPT5ColumnAnalyzer call site
+_shared_scheduler: Optional[LLMScheduler] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Process-wide LLMScheduler, built on first use"""
+    global _shared_scheduler
+    if _shared_scheduler is None:
+        _shared_scheduler = LLMScheduler()
+    return _shared_scheduler
@@ -0,0 +1,239 @@
+"""
+LLM Stand-in Module
+
+Local stand-in for the chat completions API, for offline and reproducible
+benchmarks and load tests. Responses are replayed from a JSONL recordings
+file keyed by the same prompt hash as the LLM response cache (model, system
+prompt, token limit, normalized prompt). In record mode, misses are
+forwarded to the real API and successful answers are appended to the file.
+Latency and error injection are seeded, so runs are repeatable.
+
+Use it in-process with LLM_STAND_IN=true (GPT5ColumnAnalyzer then talks to
+it through an ASGI transport, no sockets), or as a server for other
+processes:
+
+    python -m app.llm_stand_in --port 8090
+    LLM_BASE_URL=http://127.0.0.1:8090/v1 ...
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from .llm_cache import llm_cache_key
+from .llm_client import DEFAULT_BASE_URL, LLMHttpClient
+from .utils.env import env_float, env_int
+from .utils.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+REPLAY = "replay"
+RECORD = "record"
+
+# What a replay miss answers: an error status, or an empty JSON object
+MISS_ERROR = "error"
+MISS_EMPTY = "empty"
+
+# Base URL of the in-process stand-in (never resolved, requests go to the ASGI app)
+IN_PROCESS_BASE_URL = "http://llm-stand-in/v1"
+
+
+class LLMStandIn:
+    """Replays recorded completions, with injected latency and errors"""
+
+    def __init__(
+        self,
+        recordings_path: Optional[str] = None,
+        mode: Optional[str] = None,
+        upstream: Optional[LLMHttpClient] = None
+    ):
+        """
+        Configuration (environment):
+        - LLM_STAND_IN_RECORDINGS: JSONL recordings file (default: <SERVICE_DATA_DIR>/llm_recordings.jsonl)
+        - LLM_STAND_IN_MODE: replay, or record to forward misses upstream and keep the answers (default: replay)
+        - LLM_STAND_IN_UPSTREAM_URL: API used in record mode (default: https://api.openai.com/v1)
+        - LLM_STAND_IN_ON_MISS: error (404) or empty ("{}" as the answer) for unrecorded prompts (default: error)
+        - LLM_STAND_IN_LATENCY_MS / LLM_STAND_IN_LATENCY_JITTER_MS: delay per answer (default: 0 / 0)
+        - LLM_STAND_IN_ERROR_RATE: share of calls answered with an error status (default: 0)
+        - LLM_STAND_IN_ERROR_STATUS: statuses injected, e.g. "429,503" (default: 503)
+        - LLM_STAND_IN_SEED: seed for latency and errors (default: 0)
+        """
+        self.recordings_path = (
+            recordings_path or os.getenv('LLM_STAND_IN_RECORDINGS') or data_path('llm_recordings.jsonl')
+        )
+        self.mode = (mode or os.getenv('LLM_STAND_IN_MODE', REPLAY)).strip().lower()
+        if self.mode not in (REPLAY, RECORD):
+            raise ValueError(f"Unknown LLM stand-in mode: {self.mode} (expected {REPLAY} or {RECORD})")
+        self.upstream = upstream
+        if self.mode == RECORD and self.upstream is None:
+            self.upstream = LLMHttpClient(base_url=os.getenv('LLM_STAND_IN_UPSTREAM_URL') or DEFAULT_BASE_URL)
+        self.on_miss = os.getenv('LLM_STAND_IN_ON_MISS', MISS_ERROR).strip().lower()
+        self.latency_ms = env_float('LLM_STAND_IN_LATENCY_MS', 0.0)
+        self.latency_jitter_ms = env_float('LLM_STAND_IN_LATENCY_JITTER_MS', 0.0)
+        self.error_rate = env_float('LLM_STAND_IN_ERROR_RATE', 0.0)
+        self.error_statuses = _statuses(os.getenv('LLM_STAND_IN_ERROR_STATUS', '503'))
+        self.random = random.Random(env_int('LLM_STAND_IN_SEED', 0))
+
+        self._lock = threading.Lock()
+        # prompt hash -> completion text
+        self.recordings: Dict[str, str] = self._load()
+        self.stats = {"replayed": 0, "recorded": 0, "missed": 0, "injected_errors": 0}
+
+    def _load(self) -> Dict[str, str]:
+        recordings = {}
+        if not os.path.exists(self.recordings_path):
+            return recordings
+        with open(self.recordings_path, encoding="utf-8") as handle:
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    recordings[entry["key"]] = entry["response"]
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Skipping recording {self.recordings_path}:{line_number}: {str(e)}")
+        logger.info(f"LLM stand-in loaded {len(recordings)} recordings from {self.recordings_path}")
+        return recordings
+
+    def record(self, key: str, model: str, response: str):
+        """Keep a completion for replay, in memory and appended to the recordings file"""
+        entry = {"key": key, "model": model, "response": response, "recorded_at": time.time()}
+        with self._lock:
+            self.recordings[key] = response
+            directory = os.path.dirname(self.recordings_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.recordings_path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    async def complete(self, payload: Dict[str, Any], headers: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        """Status and JSON body answering one chat completions request"""
+        delay = self.latency_ms + self.random.uniform(-self.latency_jitter_ms, self.latency_jitter_ms)
+        inject_error = self.random.random() < self.error_rate
+        status = self.random.choice(self.error_statuses)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if inject_error:
+            self.stats["injected_errors"] += 1
+            return status, _error(f"Injected stand-in error {status}")
+
+        model = payload.get("model", "")
+        key = request_key(payload)
+        response = self.recordings.get(key)
+        if response is not None:
+            self.stats["replayed"] += 1
+            return 200, completion_body(model, response, key)
+
+        if self.mode == RECORD:
+            return await self._forward(payload, headers, key)
+
+        self.stats["missed"] += 1
+        logger.warning(f"LLM stand-in has no recording for {key[:12]}")
+        if self.on_miss == MISS_EMPTY:
+            return 200, completion_body(model, "{}", key)
+        return 404, _error(f"No recording for prompt {key}")
+
+    async def _forward(self, payload: Dict[str, Any], headers: Dict[str, str], key: str) -> Tuple[int, Dict[str, Any]]:
+        forwarded = {"Authorization": headers["authorization"]} if "authorization" in headers else None
+        try:
+            response = await self.upstream.post_json("/chat/completions", payload, headers=forwarded)
+        except httpx.HTTPError as e:
+            return 502, _error(f"Upstream call failed: {str(e) or type(e).__name__}")
+        body = response.json()
+        if response.status_code == 200:
+            self.record(key, payload.get("model", ""), body["choices"][0]["message"]["content"])
+            self.stats["recorded"] += 1
+        return response.status_code, body
+
+
+def _statuses(value: str) -> List[int]:
+    statuses = [int(status) for status in value.replace(";", ",").split(",") if status.strip().isdigit()]
+    return statuses or [503]
+
+
+def _error(message: str) -> Dict[str, Any]:
+    return {"error": {"message": message, "type": "llm_stand_in"}}
+
+
+def request_key(payload: Dict[str, Any]) -> str:
+    """Prompt hash of a chat completions request, as used by the LLM response cache"""
+    system_prompt, prompt = "", ""
+    for message in payload.get("messages", []):
+        if message.get("role") == "system":
+            system_prompt = message.get("content", "")
+        elif message.get("role") == "user":
+            prompt = message.get("content", "")
+    max_tokens = payload.get("max_completion_tokens", payload.get("max_tokens", 0))
+    return llm_cache_key(payload.get("model", ""), prompt, max_tokens, system_prompt)
+
+
+def completion_body(model: str, content: str, key: str) -> Dict[str, Any]:
+    """Chat completions response carrying content"""
+    return {
+        "id": f"chatcmpl-standin-{key[:16]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def create_app(stand_in: Optional[LLMStandIn] = None) -> FastAPI:
+    """FastAPI app serving the stand-in under /v1"""
+    stand_in = stand_in or LLMStandIn()
+    stand_in_app = FastAPI(title="LLM stand-in", docs_url=None, redoc_url=None)
+    stand_in_app.state.stand_in = stand_in
+
+    @stand_in_app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        status, body = await stand_in.complete(await request.json(), dict(request.headers))
+        headers = {"Retry-After": "0"} if status == 429 else None
+        return JSONResponse(body, status_code=status, headers=headers)
+
+    @stand_in_app.get("/v1/stand-in/stats")
+    async def stats():
+        return {**stand_in.stats, "recordings": len(stand_in.recordings), "mode": stand_in.mode}
+
+    return stand_in_app
+
+
+# One in-process stand-in client per process, used when LLM_STAND_IN is set
+_stand_in_client: Optional[LLMHttpClient] = None
+
+
+def get_stand_in_client() -> LLMHttpClient:
+    """Process-wide LLMHttpClient answering from an in-process stand-in, built on first use"""
+    global _stand_in_client
+    if _stand_in_client is None:
+        _stand_in_client = LLMHttpClient(
+            base_url=IN_PROCESS_BASE_URL,
+            http2=False,
+            transport=httpx.ASGITransport(app=create_app())
+        )
+        logger.info("LLM calls are answered by the in-process stand-in")
+    return _stand_in_client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,19 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Match
 import asyncio
 import logging
+from contextlib import asynccontextmanager
 from typing import Optional, Dict, Any, List
 import os
+from datetime import date
 from dotenv import load_dotenv
 
-from .models import ProcessingRequest, ProcessingResponse, FileCharacteristics
-from .docling_processor import DoclingProcessor
+from .models import ProcessingRequest, ProcessingResponse, FileCharacteristics, BatchProcessingResponse, ColumnMappingOverride
 from .pandas_analyzer import PandasAnalyzer
 from .utils.file_detector import FileDetector
 from .utils.normalizer import DataNormalizer
@@ -16,6 +21,17 @@ from .utils.validator import DataValidator
 from .raw_file_analyzer import RawFileAnalyzer
 from .raw_data_storage import RawDataStorage
 from .raw_data_normalizer import RawDataNormalizer
+from .worker_pool import ProcessingPool
+from .ingest import spool_upload, spool_archive, is_zip_archive
+from .pipeline import ProcessingPipeline
+from .jobs import JobRunner, JobStore, render_job
+from .batch import BatchProcessor
+from .metrics import CONTENT_TYPE_LATEST, REQUESTS_IN_FLIGHT, render_metrics
+from .result_cache import ResultCache, result_cache_key
+from .columnar import MEDIA_TYPES as COLUMNAR_MEDIA_TYPES, serialize_table
+from .llm_client import close_llm_client
+from .layout_cache import get_layout_cache
+from .mapping_memory import SOURCE_OVERRIDE, get_mapping_memory
 
 # Load environment variables
 load_dotenv()
@@ -24,10 +40,27 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Worker processes for the CPU-bound stages (Docling, pandas parsing)
+processing_pool = ProcessingPool()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the processing pool and job runner with the app; stop them and close LLM connections on shutdown"""
+    processing_pool.start()
+    # Models load in the background; /ready reports when they are warm
+    warm_up_task = asyncio.create_task(processing_pool.warm_up_workers())
+    await job_runner.start()
+    yield
+    await job_runner.stop()
+    warm_up_task.cancel()
+    processing_pool.shutdown()
+    await close_llm_client()
+
 app = FastAPI(
     title="Docling + pandas Processing Service",
     description="Advanced document processing service for trial balance data using Docling and pandas",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS for Supabase Edge Functions
@@ -39,23 +72,74 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def track_requests_in_flight(request, call_next):
+    """Count requests being handled, per route template (not per raw URL)"""
+    path = next(
+        (route.path for route in app.routes if route.matches(request.scope)[0] == Match.FULL),
+        "unmatched"
+    )
+    if path == "/metrics":
+        return await call_next(request)
+    REQUESTS_IN_FLIGHT.labels(path=path).inc()
+    try:
+        return await call_next(request)
+    finally:
+        REQUESTS_IN_FLIGHT.labels(path=path).dec()
+
 # Initialize processors
-docling_processor = DoclingProcessor()
 pandas_analyzer = PandasAnalyzer()
 file_detector = FileDetector()
 normalizer = DataNormalizer()
 validator = DataValidator()
-raw_file_analyzer = RawFileAnalyzer()
+raw_file_analyzer = RawFileAnalyzer(processing_pool)
 
 # Initialize new two-phase processors
 raw_data_storage = RawDataStorage(file_detector, raw_file_analyzer)
 raw_data_normalizer = RawDataNormalizer(pandas_analyzer, validator, normalizer)
 
+# Full /process-file pipeline, shared by the synchronous endpoint and background jobs
+pipeline = ProcessingPipeline(processing_pool, file_detector, raw_file_analyzer, pandas_analyzer, validator)
+job_runner = JobRunner(JobStore(), pipeline)
+batch_processor = BatchProcessor(pipeline)
+
+# Serialized /process-file results by upload hash + parameters
+result_cache = ResultCache()
+
+# Module import time, including FastAPI, pandas and the processors (not Docling)
+startup_timings = {"import_seconds": round(time.perf_counter() - _import_started, 3)}
+logger.info(f"Service modules imported in {startup_timings['import_seconds']}s")
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (liveness - the process is up)"""
     return {"status": "healthy", "service": "docling-pandas-processor"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint - 200 only once the Docling converter is warm"""
+    if processing_pool.ready:
+        status = "ready"
+    elif processing_pool.warm_up_error:
+        status = "warm_up_failed"
+    else:
+        status = "warming_up"
+    return JSONResponse(
+        status_code=200 if processing_pool.ready else 503,
+        content={
+            "status": status,
+            "import_seconds": startup_timings["import_seconds"],
+            "warm_up_seconds": processing_pool.warm_up_seconds,
+            "error": processing_pool.warm_up_error
+        }
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics (stage latencies, LLM latency, queue depth, in-flight requests)"""
+    await job_runner.refresh_queue_depth()
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/process-raw-file")
 async def process_raw_file(
     file: UploadFile = File(...),
@@ -66,18 +150,16 @@ async def process_raw_file(
     NEW: Phase 1 - Parse file and store raw data with complete transparency
     Returns file UUID for later normalization
     """
+    upload = None
     try:
         logger.info(f"Phase 1: Processing raw file: {file.filename}")
         
-        # Read file content
-        file_content = await file.read()
+        # Spool the upload once; workers read the spooled file by path
+        upload = await spool_upload(file)
         
         # Process and store raw data
-        file_uuid, processing_summary = raw_data_storage.process_and_store_raw_file(
-            file_content=file_content,
-            filename=file.filename,
-            entity_uuid=entity_uuid,
-            user_uuid=user_uuid
+        file_uuid, processing_summary = await processing_pool.run(
+            "raw_storage", upload.path, file.filename, entity_uuid, user_uuid
         )
         
         return {
@@ -91,6 +173,9 @@ async def process_raw_file(
     except Exception as e:
         logger.error(f"Error in raw file processing: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if upload:
+            upload.cleanup()
 
 @app.post("/normalize-raw-file")
 async def normalize_raw_file(
@@ -187,99 +272,289 @@ async def process_file(
     file: UploadFile = File(...),
     entity_uuid: str = Form(...),
     persist_to_database: bool = Form(False),
-    source_system_hint: Optional[str] = Form(None)
+    source_system_hint: Optional[str] = Form(None),
+    stream: Optional[str] = Query(
+        None,
+        description="'ndjson' streams rows as they are normalized, then a trailer record. Rows with a description "
+                    "come first, then those whose description is inferred (trailer row_order: described_first); "
+                    "source_row_number keeps the file position"
+    ),
+    output_format: str = Query("json", alias="format", description="json | arrow (IPC stream) | parquet")
 ):
     """
     Main file processing endpoint
     Handles XLSX/CSV/PDF files with Docling and pandas
     """
+    upload = None
+    upload_in_use = False
     try:
         logger.info(f"Processing file: {file.filename}, size: {file.size}")
         
-        # Step 1: File Type Detection
-        file_content = await file.read()
-        file_type = await file_detector.detect_file_type(file_content, file.filename)
-        logger.info(f"Detected file type: {file_type}")
+        if stream not in (None, "ndjson"):
+            raise HTTPException(status_code=400, detail=f"Unsupported stream mode: {stream}")
+        if output_format not in ("json", *COLUMNAR_MEDIA_TYPES):
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {output_format}")
+        if stream and output_format != "json":
+            raise HTTPException(status_code=400, detail="stream=ndjson cannot be combined with format")
         
-        # Step 1.5: GPT-5 Raw File Analysis (NEW)
-        raw_analysis = None
-        processing_hints = {}
+        upload = await spool_upload(file)
         
-        if file_type in ["xlsx", "csv"]:
+        if stream == "ndjson":
+            # Parse up front so detection/parse errors still get a proper status code;
+            # the spooled file is not needed once parsing is done
+            parsed = await pipeline.parse(upload.path, file.filename)
+            return StreamingResponse(
+                pipeline.stream_ndjson(parsed, entity_uuid, file.filename),
+                media_type="application/x-ndjson"
+            )
+        
+        # Identical uploads reuse the cached result or wait on the one already running
+        async def compute_result() -> bytes:
+            # Runs as the cache's own task, which outlives this request if the client
+            # disconnects; the spooled upload is removed once it is done with it
+            nonlocal upload_in_use
+            upload_in_use = True
             try:
-                from .models import FileType
-                raw_analysis = await raw_file_analyzer.analyze_raw_file_structure(
-                    file_content, FileType(file_type), file.filename
+                if output_format in COLUMNAR_MEDIA_TYPES:
+                    # Rows go straight into an Arrow table; the summary rides along as schema metadata
+                    table = await pipeline.process_table(upload.path, file.filename, entity_uuid, source_system_hint)
+                    return await asyncio.to_thread(serialize_table, table, output_format)
+                response = await pipeline.process(upload.path, file.filename, entity_uuid, source_system_hint)
+                return response.model_dump_json().encode()
+            finally:
+                upload.cleanup()
+        
+        # Column mapping changes of the entity and layout invalidations make cached results stale
+        generation = await asyncio.to_thread(_result_generation, entity_uuid)
+        body, cache_outcome = await result_cache.get_or_compute(
+            result_cache_key(upload.sha256, entity_uuid, source_system_hint, output_format, generation),
+            compute_result
+        )
+        return Response(
+            content=body,
+            media_type=COLUMNAR_MEDIA_TYPES.get(output_format, "application/json"),
+            headers={"X-Result-Cache": cache_outcome}
+        )
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error processing file: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if upload and not upload_in_use:
+            upload.cleanup()
+
+def _result_generation(entity_uuid: str) -> str:
+    """
+    Generation of the stored state /process-file results depend on, for the result cache key.
+    Includes today's date because rows default their period and as-of date to the current day.
+    """
+    return (
+        f"{get_mapping_memory().generation(entity_uuid)}.{get_layout_cache().generation()}"
+        f".{date.today().isoformat()}"
+    )
+
+@app.post("/process-batch", response_model=BatchProcessingResponse)
+async def process_batch(
+    files: List[UploadFile] = File(...),
+    entity_uuid: str = Form(...),
+    persist_to_database: bool = Form(False),
+    source_system_hint: Optional[str] = Form(None)
+):
+    """
+    Process many files in one request
+    Accepts a ZIP archive and/or a multipart list of files; files run in parallel
+    through the /process-file pipeline and get individual status and timings
+    """
+    uploads = []
+    try:
+        logger.info(f"Processing batch of {len(files)} uploads")
+        
+        for file in files:
+            upload = await spool_upload(file)
+            uploads.append(upload)
+            
+            # Expand archives into one spooled file per member
+            if await asyncio.to_thread(is_zip_archive, upload.path):
+                members = await asyncio.to_thread(
+                    spool_archive,
+                    upload.path,
+                    None,
+                    batch_processor.max_files,
+                    batch_processor.max_uncompressed_bytes
                 )
-                processing_hints = raw_analysis.processing_hints
-                logger.info(f"GPT-5 raw analysis completed with confidence: {raw_analysis.analysis_confidence}")
-            except Exception as e:
-                logger.warning(f"Raw file analysis failed: {str(e)}, proceeding without hints")
+                uploads.remove(upload)
+                upload.cleanup()
+                uploads.extend(members)
         
-        # Step 2: Parse based on file type
-        if file_type == "pdf":
-            # Use Docling for PDF processing
-            parsed_data = await docling_processor.process_pdf(file_content)
-        elif file_type in ["xlsx", "csv"]:
-            # Use pandas for tabular data with GPT-5 hints
-            parsed_data = await pandas_analyzer.process_tabular_data(
-                file_content, file_type, file.filename, processing_hints
-            )
-        else:
+        if not uploads:
+            raise HTTPException(status_code=400, detail="Batch contains no files")
+        if len(uploads) > batch_processor.max_files:
             raise HTTPException(
                 status_code=400,
-                detail=f"Unsupported file type: {file_type}"
+                detail=f"Batch contains {len(uploads)} files, limit is {batch_processor.max_files}"
             )
         
-        logger.info(f"Parsed {len(parsed_data)} rows from file")
-        
-        # Step 3: Data Normalization with pandas
-        normalized_data = await pandas_analyzer.normalize_data(
-            parsed_data, entity_uuid, file.filename
-        )
-        
-        # Step 4: Classification and Characteristics Detection
-        characteristics = await pandas_analyzer.detect_file_characteristics(
-            normalized_data, file.filename, file_type
-        )
+        return await batch_processor.process(uploads, entity_uuid, source_system_hint)
         
-        # Step 5: Data Validation
-        validation_results = await validator.validate_trial_balance_data(normalized_data)
-        
-        # Step 6: Enhanced Quality Analysis
-        quality_report = await pandas_analyzer.generate_quality_report(normalized_data)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error processing batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for upload in uploads:
+            upload.cleanup()
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    entity_uuid: str = Form(...),
+    persist_to_database: bool = Form(False),
+    source_system_hint: Optional[str] = Form(None)
+):
+    """
+    Queue a file for asynchronous processing
+    Same parameters as /process-file; poll GET /jobs/{job_uuid} for the result or
+    follow GET /jobs/{job_uuid}/events for live progress
+    """
+    upload = None
+    try:
+        logger.info(f"Queueing job for file: {file.filename}")
         
-        logger.info(f"Successfully processed {len(normalized_data)} normalized records")
+        upload = await spool_upload(file)
+        job_uuid = await job_runner.submit(upload, {
+            "entity_uuid": entity_uuid,
+            "persist_to_database": persist_to_database,
+            "source_system_hint": source_system_hint
+        })
+        upload = None  # Owned by the job runner now
         
-        return ProcessingResponse(
-            success=True,
-            data=normalized_data,
-            row_count=len(normalized_data),
-            characteristics=characteristics,
-            validation_results=validation_results,
-            quality_report=quality_report,
-            raw_analysis=raw_analysis,
-            message=f"Successfully processed {len(normalized_data)} records using Docling + pandas with GPT-5 analysis"
-        )
+        return {
+            "job_uuid": job_uuid,
+            "status": "queued",
+            "status_url": f"/jobs/{job_uuid}",
+            "events_url": f"/jobs/{job_uuid}/events"
+        }
         
     except Exception as e:
-        logger.error(f"Error processing file: {str(e)}")
+        logger.error(f"Error queueing job: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if upload:
+            upload.cleanup()
+
+@app.get("/jobs/{job_uuid}")
+async def get_job(job_uuid: str):
+    """
+    Job status, plus the ProcessingResponse once the job has succeeded
+    """
+    job = await job_runner.get(job_uuid)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_uuid} not found or expired")
+    return Response(content=render_job(job), media_type="application/json")
+
+@app.get("/jobs/{job_uuid}/events")
+async def job_events(job_uuid: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events stream of a job's progress: status changes, pipeline phases,
+    PDF pages converted and rows parsed/normalized so far, ending with the final status
+    """
+    job = await job_runner.get(job_uuid)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_uuid} not found or expired")
+    after_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    return StreamingResponse(
+        job_runner.events(job_uuid, after_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/jobs/{job_uuid}")
+async def cancel_job(job_uuid: str):
+    """
+    Cancel a queued or running job; finished jobs are returned unchanged
+    """
+    job = await job_runner.cancel(job_uuid)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_uuid} not found or expired")
+    return Response(content=render_job(job), media_type="application/json")
+
+@app.get("/layouts/{fingerprint}")
+async def get_layout(fingerprint: str):
+    """
+    Stored raw analysis and column mapping of a known file layout, with its decayed confidence
+    (the fingerprint is returned in raw_analysis.processing_hints.layout_fingerprint)
+    """
+    layout = await asyncio.to_thread(get_layout_cache().get, fingerprint)
+    if layout is None:
+        raise HTTPException(status_code=404, detail=f"Layout {fingerprint} not known")
+    return layout
+
+@app.delete("/layouts/{fingerprint}")
+async def invalidate_layout(fingerprint: str):
+    """
+    Forget a known layout, so the next upload with it is analyzed by GPT-5 again
+    """
+    if not await asyncio.to_thread(get_layout_cache().invalidate, fingerprint, "deleted via API"):
+        raise HTTPException(status_code=404, detail=f"Layout {fingerprint} not known")
+    return {"success": True, "fingerprint": fingerprint}
+
+@app.get("/entities/{entity_uuid}/column-mappings")
+async def get_column_mappings(entity_uuid: str):
+    """
+    Column mappings remembered for an entity, most recently used first
+    """
+    entries = await asyncio.to_thread(get_mapping_memory().entries, entity_uuid)
+    return {"entity_uuid": entity_uuid, "column_mappings": entries}
+
+@app.put("/entities/{entity_uuid}/column-mappings")
+async def override_column_mapping(entity_uuid: str, override: ColumnMappingOverride):
+    """
+    Set the column mapping of an entity for a set of column headers; it is used for the
+    entity's uploads with these headers and never replaced by GPT-5 mappings
+    """
+    unknown = set(override.column_mapping.values()) - set(override.column_headers)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Mapped columns not in column_headers: {sorted(unknown)}")
+    signature = await asyncio.to_thread(
+        get_mapping_memory().remember,
+        entity_uuid, override.column_headers, override.column_mapping, SOURCE_OVERRIDE
+    )
+    if signature is None:
+        raise HTTPException(status_code=503, detail="Column mapping memory is disabled or unavailable")
+    return {"success": True, "entity_uuid": entity_uuid, "header_signature": signature}
+
+@app.delete("/entities/{entity_uuid}/column-mappings")
+async def forget_column_mappings(entity_uuid: str, header_signature: Optional[str] = Query(None)):
+    """
+    Forget the column mappings of an entity, or only the one for header_signature
+    """
+    removed = await asyncio.to_thread(get_mapping_memory().forget, entity_uuid, header_signature)
+    if header_signature and not removed:
+        raise HTTPException(status_code=404, detail=f"No column mapping {header_signature} for entity {entity_uuid}")
+    return {"success": True, "entity_uuid": entity_uuid, "removed": removed}
 
 @app.post("/analyze-file", response_model=Dict[str, Any])
 async def analyze_file(file: UploadFile = File(...)):
     """
     Analyze file structure and characteristics without full processing
     """
+    upload = None
     try:
-        file_content = await file.read()
-        file_type = await file_detector.detect_file_type(file_content, file.filename)
+        upload = await spool_upload(file)
+        file_type = await file_detector.detect_file_type(upload.path, file.filename)
         
         if file_type == "pdf":
-            analysis = await docling_processor.analyze_pdf_structure(file_content)
+            analysis = await processing_pool.run("pdf_analysis", upload.path)
         else:
-            analysis = await pandas_analyzer.analyze_tabular_structure(
-                file_content, file_type, file.filename
+            analysis = await processing_pool.run(
+                "tabular_analysis", upload.path, file_type, file.filename
             )
         
         return {
@@ -291,6 +566,9 @@ async def analyze_file(file: UploadFile = File(...)):
     except Exception as e:
         logger.error(f"Error analyzing file: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if upload:
+            upload.cleanup()
 
 @app.post("/validate-data")
 async def validate_data(data: List[Dict[str, Any]]):
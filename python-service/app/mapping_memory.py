@@ -0,0 +1,296 @@
+"""
+Mapping Memory Module
+
+Remembers confirmed column mappings per entity. An entity (client company)
+exports its trial balance from the same system every month, so once a mapping
+for its column headers has been confirmed - accepted from GPT-5 with high
+confidence, supplied as custom_mapping to /normalize-raw-file, or set through
+the API - later uploads of the entity with the same headers resolve their
+columns with one indexed lookup instead of a GPT-5 call.
+
+Entries are keyed by entity_uuid and a header signature: the normalized
+(trimmed, lowercased, whitespace collapsed) column headers, sorted, so
+reordered columns still match. Mappings supplied by users are never replaced
+by GPT-5 answers, and a GPT-5 mapping is only kept once a file was parsed with
+it. Entries unused for MAPPING_MEMORY_TTL_DAYS (MAPPING_MEMORY_LLM_TTL_DAYS
+for GPT-5 mappings) are evicted, and beyond MAPPING_MEMORY_MAX_ENTRIES the
+least recently used go first.
+
+Every user change to an entity's mappings bumps the entity's generation, which
+is part of the /process-file result cache key, so re-uploads are processed
+again with the new mapping.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from .metrics import MAPPING_MEMORY_REQUESTS
+from .utils.env import env_bool, env_float, env_int
+from .utils.storage import connect_sqlite, data_path
+
+logger = logging.getLogger(__name__)
+
+# Where a mapping came from; user sources outrank GPT-5
+SOURCE_LLM = "llm"
+SOURCE_CUSTOM = "custom"
+SOURCE_OVERRIDE = "override"
+SOURCES = (SOURCE_LLM, SOURCE_CUSTOM, SOURCE_OVERRIDE)
+USER_SOURCES = (SOURCE_CUSTOM, SOURCE_OVERRIDE)
+
+# Entries used recently enough for their source's TTL (parameters: LLM cutoff, user cutoff)
+_LIVE = f"last_used_at >= CASE source WHEN '{SOURCE_LLM}' THEN ? ELSE ? END"
+
+# Lookup outcomes, exported as mapping_memory_requests_total
+HIT = "hit"
+MISS = "miss"
+EXPIRED = "expired"
+
+
+def normalize_header(header: Any) -> str:
+    return " ".join(str(header).split()).lower()
+
+
+def data_headers(column_names: Sequence[Any]) -> List[str]:
+    """Column headers of parsed data, without internal columns (_source_row, ...)"""
+    return [str(name) for name in column_names if not str(name).startswith("_")]
+
+
+def header_signature(column_names: Sequence[Any]) -> str:
+    """Signature of a set of column headers, independent of order, case and whitespace"""
+    headers = sorted({normalize_header(name) for name in data_headers(column_names)})
+    return hashlib.sha256("\n".join(headers).encode()).hexdigest()
+
+
+class MappingMemory:
+    """Confirmed column mappings by entity and header signature, with TTL and LRU eviction"""
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        enabled: Optional[bool] = None,
+        ttl_days: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        llm_ttl_days: Optional[float] = None
+    ):
+        """
+        Configuration (environment):
+        - MAPPING_MEMORY_ENABLED: reuse confirmed column mappings per entity (default: true)
+        - MAPPING_MEMORY_DB_PATH: SQLite file (default: <SERVICE_DATA_DIR>/mapping_memory.sqlite3)
+        - MAPPING_MEMORY_TTL_DAYS: user mappings unused for this many days are evicted (default: 365)
+        - MAPPING_MEMORY_LLM_TTL_DAYS: GPT-5 mappings unused for this many days are evicted (default: 30)
+        - MAPPING_MEMORY_MAX_ENTRIES: entries kept, least recently used pruned first (default: 50000)
+        """
+        self.enabled = env_bool('MAPPING_MEMORY_ENABLED', True) if enabled is None else enabled
+        self.db_path = db_path or os.getenv('MAPPING_MEMORY_DB_PATH') or data_path('mapping_memory.sqlite3')
+        self.ttl_seconds = 86400 * (
+            ttl_days if ttl_days is not None else env_float('MAPPING_MEMORY_TTL_DAYS', 365.0)
+        )
+        self.llm_ttl_seconds = 86400 * (
+            llm_ttl_days if llm_ttl_days is not None else env_float('MAPPING_MEMORY_LLM_TTL_DAYS', 30.0)
+        )
+        self.max_entries = max_entries or env_int('MAPPING_MEMORY_MAX_ENTRIES', 50000)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = connect_sqlite(self.db_path)
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS column_mappings (
+                    entity_uuid TEXT NOT NULL,
+                    header_signature TEXT NOT NULL,
+                    column_headers TEXT NOT NULL,
+                    column_mapping TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    confirmed_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (entity_uuid, header_signature)
+                );
+                CREATE INDEX IF NOT EXISTS idx_column_mappings_last_used ON column_mappings (last_used_at);
+                CREATE TABLE IF NOT EXISTS mapping_generations (
+                    entity_uuid TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL
+                );
+            """)
+        return self._connection
+
+    def lookup(
+        self,
+        entity_uuid: str,
+        column_names: Sequence[Any],
+        sources: Sequence[str] = SOURCES
+    ) -> Optional[Dict[str, str]]:
+        """Confirmed mapping of the entity for these column headers from one of sources, or None"""
+        if not self.enabled or not entity_uuid:
+            return None
+        signature = header_signature(column_names)
+        now = time.time()
+        placeholders = ", ".join("?" for _ in sources)
+        with self._lock:
+            row = self.connection.execute(
+                "UPDATE column_mappings SET last_used_at = ?, hits = hits + 1 "
+                f"WHERE entity_uuid = ? AND header_signature = ? AND {_LIVE} "
+                f"AND source IN ({placeholders}) RETURNING column_mapping, source, hits",
+                (now, entity_uuid, signature, *self._cutoffs(now), *sources)
+            ).fetchone()
+            expired = 0
+            if row is None:
+                expired = self.connection.execute(
+                    f"DELETE FROM column_mappings WHERE entity_uuid = ? AND header_signature = ? AND NOT {_LIVE}",
+                    (entity_uuid, signature, *self._cutoffs(now))
+                ).rowcount
+        if row is None:
+            MAPPING_MEMORY_REQUESTS.labels(outcome=EXPIRED if expired else MISS).inc()
+            return None
+        MAPPING_MEMORY_REQUESTS.labels(outcome=HIT).inc()
+        logger.info(
+            f"Using {row['source']} column mapping of entity {entity_uuid} "
+            f"(used {row['hits']}x, headers {signature[:12]})"
+        )
+        return json.loads(row["column_mapping"])
+
+    def remember(
+        self,
+        entity_uuid: str,
+        column_names: Sequence[Any],
+        mapping: Dict[str, str],
+        source: str = SOURCE_LLM
+    ) -> Optional[str]:
+        """
+        Keep a confirmed mapping; returns its header signature, or None when it was not
+        stored. A GPT-5 mapping does not replace one supplied by a user.
+        """
+        if source not in SOURCES:
+            raise ValueError(f"Unknown mapping source: {source}")
+        if not self.enabled or not entity_uuid or not mapping:
+            return None
+        signature = header_signature(column_names)
+        now = time.time()
+        try:
+            with self._lock:
+                stored = self.connection.execute(
+                    "INSERT INTO column_mappings (entity_uuid, header_signature, column_headers, "
+                    "column_mapping, source, confirmed_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (entity_uuid, header_signature) DO UPDATE SET "
+                    "column_headers = excluded.column_headers, column_mapping = excluded.column_mapping, "
+                    "source = excluded.source, confirmed_at = excluded.confirmed_at, "
+                    "last_used_at = excluded.last_used_at "
+                    "WHERE excluded.source != ? OR column_mappings.source = ?",
+                    (
+                        entity_uuid, signature, json.dumps(data_headers(column_names)), json.dumps(mapping),
+                        source, now, now, SOURCE_LLM, SOURCE_LLM
+                    )
+                ).rowcount
+                if stored and source != SOURCE_LLM:
+                    self._bump_generation(entity_uuid)
+                self._evict(now)
+        except Exception as e:
+            logger.warning(f"Could not store column mapping of entity {entity_uuid}: {str(e)}")
+            return None
+        return signature if stored else None
+
+    async def lookup_async(self, entity_uuid: str, column_names: Sequence[Any]) -> Optional[Dict[str, str]]:
+        return await asyncio.to_thread(self.lookup, entity_uuid, column_names)
+
+    async def remember_async(
+        self,
+        entity_uuid: str,
+        column_names: Sequence[Any],
+        mapping: Dict[str, str],
+        source: str = SOURCE_LLM
+    ) -> Optional[str]:
+        return await asyncio.to_thread(self.remember, entity_uuid, column_names, mapping, source)
+
+    def entries(self, entity_uuid: str) -> List[Dict[str, Any]]:
+        """Live entries of an entity (for inspection), most recently used first"""
+        with self._lock:
+            rows = self.connection.execute(
+                f"SELECT * FROM column_mappings WHERE entity_uuid = ? AND {_LIVE} ORDER BY last_used_at DESC",
+                (entity_uuid, *self._cutoffs(time.time()))
+            ).fetchall()
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry["column_headers"] = json.loads(entry["column_headers"])
+            entry["column_mapping"] = json.loads(entry["column_mapping"])
+            entry["expires_at"] = entry["last_used_at"] + (
+                self.llm_ttl_seconds if entry["source"] == SOURCE_LLM else self.ttl_seconds
+            )
+            entries.append(entry)
+        return entries
+
+    def forget(self, entity_uuid: str, signature: Optional[str] = None) -> int:
+        """Drop one entry of an entity, or all of them; returns the number removed"""
+        with self._lock:
+            if signature is None:
+                removed = self.connection.execute(
+                    "DELETE FROM column_mappings WHERE entity_uuid = ?", (entity_uuid,)
+                ).rowcount
+            else:
+                removed = self.connection.execute(
+                    "DELETE FROM column_mappings WHERE entity_uuid = ? AND header_signature = ?",
+                    (entity_uuid, signature)
+                ).rowcount
+            if removed:
+                self._bump_generation(entity_uuid)
+        return removed
+
+    def generation(self, entity_uuid: str) -> int:
+        """Counter of user changes to the entity's mappings"""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT generation FROM mapping_generations WHERE entity_uuid = ?", (entity_uuid,)
+            ).fetchone()
+        return row["generation"] if row else 0
+
+    def _bump_generation(self, entity_uuid: str):
+        """(lock held)"""
+        self.connection.execute(
+            "INSERT INTO mapping_generations (entity_uuid, generation) VALUES (?, 1) "
+            "ON CONFLICT (entity_uuid) DO UPDATE SET generation = generation + 1",
+            (entity_uuid,)
+        )
+
+    def _cutoffs(self, now: float) -> tuple:
+        """Oldest last use of a live GPT-5 and user entry"""
+        return now - self.llm_ttl_seconds, now - self.ttl_seconds
+
+    def _evict(self, now: float):
+        """Drop expired entries and the least recently used beyond max_entries (lock held)"""
+        expired = self.connection.execute(
+            f"DELETE FROM column_mappings WHERE NOT {_LIVE}", self._cutoffs(now)
+        ).rowcount
+        if expired:
+            logger.info(f"Evicted {expired} column mappings unused for longer than their TTL")
+        excess = self.connection.execute("SELECT COUNT(*) FROM column_mappings").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM column_mappings WHERE rowid IN "
+                "(SELECT rowid FROM column_mappings ORDER BY last_used_at LIMIT ?)",
+                (excess,)
+            )
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+# One memory per process, shared by PandasAnalyzer, RawDataNormalizer and the API
+_shared_memory: Optional[MappingMemory] = None
+
+
+def get_mapping_memory() -> MappingMemory:
+    """Process-wide MappingMemory, built on first use"""
+    global _shared_memory
+    if _shared_memory is None:
+        _shared_memory = MappingMemory()
+    return _shared_memory
@@ -0,0 +1,190 @@
+"""
+Metrics Module
+
+Prometheus metrics for the processing service: per-stage pipeline latency,
+LLM call latency, job queue depth and in-flight requests. Exposed in the
+Prometheus text format by GET /metrics.
+
+With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory so /metrics aggregates all worker processes.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Pipeline stages, in the order /process-file runs them
+PIPELINE_STAGES = (
+    "detection",
+    "ingest",
+    "raw_analysis",
+    "parsing",
+    "normalization",
+    "characteristics",
+    "validation",
+    "quality_report",
+)
+
+# Stage latencies range from milliseconds (detection) to minutes (OCR on large PDFs)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+# Estimated prompt tokens, to relate prompt size to LLM latency and cost
+PROMPT_TOKEN_BUCKETS = (100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000)
+
+STAGE_DURATION = Histogram(
+    "processing_stage_duration_seconds",
+    "Time spent in each /process-file pipeline stage",
+    ["stage", "file_type"],
+    buckets=STAGE_BUCKETS,
+)
+PIPELINE_DURATION = Histogram(
+    "processing_pipeline_duration_seconds",
+    "End-to-end pipeline time per processed file",
+    ["file_type", "outcome"],
+    buckets=STAGE_BUCKETS,
+)
+PROCESSED_ROWS = Counter(
+    "processing_rows_total",
+    "Normalized rows produced by the pipeline",
+    ["file_type"],
+)
+LLM_REQUEST_DURATION = Histogram(
+    "llm_request_duration_seconds",
+    "Latency of LLM chat-completion calls",
+    ["outcome"],
+    buckets=LLM_BUCKETS,
+)
+JOB_QUEUE_DEPTH = Gauge(
+    "processing_job_queue_depth",
+    "Async jobs queued and not yet picked up by a worker",
+    multiprocess_mode="livemax",
+)
+POOL_QUEUE_DEPTH = Gauge(
+    "processing_pool_queue_depth",
+    "Stage tasks waiting for a free worker in the processing pool",
+    multiprocess_mode="livesum",
+)
+POOL_TASKS_IN_FLIGHT = Gauge(
+    "processing_pool_tasks_in_flight",
+    "Stage tasks submitted to the processing pool and not yet finished",
+    ["stage"],
+    multiprocess_mode="livesum",
+)
+RESULT_CACHE_REQUESTS = Counter(
+    "result_cache_requests_total",
+    "/process-file result cache lookups by outcome (hit, miss, coalesced)",
+    ["outcome"],
+)
+LLM_CACHE_REQUESTS = Counter(
+    "llm_cache_requests_total",
+    "LLM response cache lookups by outcome (hit, miss, coalesced)",
+    ["outcome"],
+)
+LLM_SCHEDULED_CALLS = Counter(
+    "llm_scheduled_calls_total",
+    "LLM calls by call site and outcome (success, retry, failure, deadline, rejected by the open breaker)",
+    ["call_site", "outcome"],
+)
+LLM_BREAKER_STATE = Gauge(
+    "llm_breaker_state",
+    "LLM circuit breaker state (0 closed, 1 half-open, 2 open)",
+    multiprocess_mode="livemax",
+)
+LLM_CALLS_IN_FLIGHT = Gauge(
+    "llm_calls_in_flight",
+    "LLM calls holding a concurrency slot",
+    multiprocess_mode="livesum",
+)
+LLM_CALLS_WAITING = Gauge(
+    "llm_calls_waiting",
+    "LLM calls waiting for the rate limiter or a concurrency slot",
+    multiprocess_mode="livesum",
+)
+LLM_LIMITER_WAIT = Histogram(
+    "llm_limiter_wait_seconds",
+    "Time LLM calls spent waiting for the rate limiter and a concurrency slot",
+    buckets=STAGE_BUCKETS,
+)
+LLM_HEDGED_CALLS = Counter(
+    "llm_hedged_calls_total",
+    "Hedged LLM analyses by call site and outcome (llm, budget_exceeded, llm_unusable, late_answer)",
+    ["call_site", "outcome"],
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens",
+    "Estimated tokens per LLM prompt (system prompt included), by call site",
+    ["call_site"],
+    buckets=PROMPT_TOKEN_BUCKETS,
+)
+LLM_PROMPTS_TRIMMED = Counter(
+    "llm_prompts_trimmed_total",
+    "Prompts whose data section was shortened to fit the token budget, by call site",
+    ["call_site"],
+)
+LAYOUT_CACHE_REQUESTS = Counter(
+    "layout_cache_requests_total",
+    "Known-layout lookups by outcome (hit, miss, stale after confidence decay, invalidated)",
+    ["outcome"],
+)
+MAPPING_MEMORY_REQUESTS = Counter(
+    "mapping_memory_requests_total",
+    "Per-entity column mapping lookups by outcome (hit, miss, expired)",
+    ["outcome"],
+)
+RESULT_CACHE_BYTES = Gauge(
+    "result_cache_bytes",
+    "Bytes of serialized results held in the in-memory result cache",
+    multiprocess_mode="livesum",
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled",
+    ["path"],
+    multiprocess_mode="livesum",
+)
+
+
+@contextmanager
+def time_stage(stage: str, timings: Dict[str, float], file_type: Optional[str] = None) -> Iterator[None]:
+    """Time a pipeline stage into its histogram and into the per-response timings dict"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings[stage] = round(timings.get(stage, 0.0) + elapsed, 4)
+        STAGE_DURATION.labels(stage=stage, file_type=file_type or "unknown").observe(elapsed)
+
+
+@contextmanager
+def time_llm_call() -> Iterator[None]:
+    """Time one LLM API call, labelled by outcome"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        LLM_REQUEST_DURATION.labels(outcome=outcome).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> bytes:
+    """Current metrics in the Prometheus text exposition format"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
@@ -96,6 +96,10 @@ class RawAnalysisResult(BaseModel):
     processing_hints: Dict[str, Any] = Field(default_factory=dict)
     analysis_confidence: float = Field(..., ge=0.0, le=1.0)
 
+class ColumnMappingOverride(BaseModel):
+    column_headers: List[str] = Field(..., min_length=1, description="Column headers the mapping applies to, in any order")
+    column_mapping: Dict[str, str] = Field(..., min_length=1, description="Field -> column header, as used by normalization")
+
 class ProcessingResponse(BaseModel):
     success: bool
     data: List[ProcessedTrialBalanceRow] = []
@@ -106,4 +110,28 @@ class ProcessingResponse(BaseModel):
     raw_analysis: Optional[RawAnalysisResult] = None
     message: str = ""
     processing_time_seconds: Optional[float] = None
-    error: Optional[str] = None
\ No newline at end of file
+    stage_timings: Dict[str, float] = Field(default_factory=dict, description="Seconds per pipeline stage")
+    error: Optional[str] = None
+
+# Batch Processing Models
+class BatchFileResult(BaseModel):
+    filename: str
+    status: str = Field(..., description="succeeded|failed")
+    file_size: int = 0
+    file_sha256: Optional[str] = None
+    row_count: int = 0
+    queued_seconds: float = 0.0
+    processing_time_seconds: float = 0.0
+    result: Optional[ProcessingResponse] = None
+    error: Optional[str] = None
+
+class BatchProcessingResponse(BaseModel):
+    success: bool
+    file_count: int = 0
+    succeeded_count: int = 0
+    failed_count: int = 0
+    total_row_count: int = 0
+    concurrency: int = 1
+    processing_time_seconds: float = 0.0
+    files: List[BatchFileResult] = []
+    message: str = ""
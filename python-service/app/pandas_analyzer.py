@@ -1,16 +1,87 @@
 import pandas as pd
 import numpy as np
 import logging
-from typing import List, Dict, Any, Optional, Tuple
-import io
+from typing import AsyncIterator, List, Dict, Any, Mapping, Optional, Tuple, Union
 import hashlib
 from datetime import datetime, date
 import re
 from .models import FileCharacteristics, ContentType, ReportingFrequency, ValidationResult, QualityReport, ProcessedTrialBalanceRow
-from .gpt5_column_analyzer import GPT5ColumnAnalyzer, ColumnAnalysis
+from .gpt5_column_analyzer import COLUMN_MAPPING, ColumnAnalysis, get_shared_analyzer
+from .ingest import FileSource
+from .chart_of_accounts import detect_chart, get_chart_index
+from .ingest_context import CSV_FRAME, IngestContext
+from .layout_cache import get_layout_cache
+from .mapping_memory import get_mapping_memory
+from .prompt_compiler import PROFILE_SAMPLE_ROWS
+from .sheet_triage import rank_sheet_names
+from .utils.validator import is_missing, iter_records
 
 logger = logging.getLogger(__name__)
 
+# Where a column mapping came from (see _identify_columns)
+MAPPING_REMEMBERED = "remembered"
+MAPPING_LAYOUT = "layout"
+MAPPING_LLM = "llm"
+MAPPING_PATTERNS = "patterns"
+
+# Share of rows a GPT-5 mapping must parse before it is remembered for the entity
+MIN_CONFIRMED_ROW_SHARE = 0.5
+
+
+def build_quality_report(total_records: int, completeness_scores: Dict[str, float], unique_accounts: int) -> QualityReport:
+    """Quality report from record count, non-null share per field and distinct accounts"""
+    completeness_score = float(np.mean(list(completeness_scores.values())))
+    
+    # Calculate consistency (simplified)
+    consistency_score = 0.9  # Placeholder - would implement actual consistency checks
+    
+    # Calculate accuracy (simplified)
+    accuracy_score = 0.85  # Placeholder - would implement actual accuracy checks
+    
+    overall_score = (completeness_score + consistency_score + accuracy_score) / 3
+    
+    recommendations = []
+    if completeness_score < 0.8:
+        recommendations.append("Some records have missing data - consider data cleaning")
+    if total_records < 10:
+        recommendations.append("Small dataset - results may not be representative")
+    
+    return QualityReport(
+        completeness_score=completeness_score,
+        consistency_score=consistency_score,
+        accuracy_score=accuracy_score,
+        overall_score=overall_score,
+        metrics={
+            "total_records": total_records,
+            "unique_accounts": unique_accounts,
+            "completeness_by_field": completeness_scores
+        },
+        recommendations=recommendations
+    )
+
+
+class QualityAccumulator:
+    """Counts the quality report is built from, gathered one record at a time"""
+
+    def __init__(self):
+        self.total_records = 0
+        # Non-null values per field, fields in the order first seen
+        self.field_counts: Dict[str, int] = {}
+        self.accounts = set()
+
+    def add(self, record: Mapping[str, Any]):
+        self.total_records += 1
+        for name, value in record.items():
+            self.field_counts[name] = self.field_counts.get(name, 0) + (not is_missing(value))
+        account_number = record.get('account_number')
+        if not is_missing(account_number):
+            self.accounts.add(account_number)
+
+    def report(self) -> QualityReport:
+        completeness_scores = {name: count / self.total_records for name, count in self.field_counts.items()}
+        return build_quality_report(self.total_records, completeness_scores, len(self.accounts))
+
+
 class PandasAnalyzer:
     def __init__(self):
         """Initialize pandas analyzer with GPT-5 enhanced German accounting support"""
@@ -21,12 +92,18 @@ class PandasAnalyzer:
         
         # Initialize GPT-5 analyzer for intelligent column mapping
         try:
-            self.gpt5_analyzer = GPT5ColumnAnalyzer()
+            self.gpt5_analyzer = get_shared_analyzer()
             logger.info("GPT-5 Column Analyzer initialized successfully")
         except Exception as e:
             logger.warning(f"GPT-5 initialization failed: {str(e)}, using fallback mode")
             self.gpt5_analyzer = None
         
+        # Column mappings of known layouts (see RawFileAnalyzer)
+        self.layout_cache = get_layout_cache()
+        
+        # Confirmed column mappings per entity
+        self.mapping_memory = get_mapping_memory()
+        
         # Enhanced German keyword patterns from sample data
         self.enhanced_german_patterns = {
             'account_description': [
@@ -47,13 +124,29 @@ class PandasAnalyzer:
 
     async def process_tabular_data(
         self, 
-        file_content: bytes, 
+        file_content: FileSource, 
         file_type: str, 
         filename: str,
         gpt5_hints: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """Process XLSX/CSV files using pandas with enhanced German accounting support and GPT-5 hints"""
+        return self.parse_tabular_file(file_content, file_type, filename, gpt5_hints)
+
+    def parse_tabular_file(
+        self, 
+        file_content: Union[FileSource, IngestContext], 
+        file_type: str, 
+        filename: str,
+        gpt5_hints: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Synchronous tabular parsing - CPU bound, run through the ProcessingPool from async code.
+        Accepts the request's IngestContext so the file is not parsed again.
+        """
         try:
+            context = self._ingest_context(file_content, file_type, filename)
+            sheet_name = None
+            
             # Use GPT-5 hints if available
             if gpt5_hints:
                 logger.info(f"Processing with GPT-5 hints: {gpt5_hints}")
@@ -72,14 +165,13 @@ class PandasAnalyzer:
                 logger.info("Processing without GPT-5 hints - using fallback detection")
                 header_row = 0
                 data_start_row = 1
-                sheet_name = None
                 
             logger.info(f"Processing {file_type} file: {filename}")
             
             if file_type == "xlsx":
-                df = await self._read_excel_with_options(file_content, filename, sheet_name, header_row)
+                df = self._read_excel_with_options(context, filename, sheet_name, header_row)
             elif file_type == "csv":
-                df = await self._read_csv_with_options(file_content, filename, header_row)
+                df = self._read_csv_with_options(context, filename, header_row)
             else:
                 raise ValueError(f"Unsupported file type for pandas processing: {file_type}")
             
@@ -108,40 +200,35 @@ class PandasAnalyzer:
             logger.error(f"Error processing tabular data: {str(e)}")
             raise Exception(f"Tabular data processing failed: {str(e)}")
 
-    async def _read_excel_with_options(
+    def _ingest_context(self, file_content: Union[FileSource, IngestContext], file_type: str, filename: str) -> IngestContext:
+        """Reuse the request's IngestContext, or parse the source once into a new one"""
+        if isinstance(file_content, IngestContext):
+            return file_content.ensure_loaded()
+        return IngestContext.load(file_content, file_type, filename)
+
+    def _read_excel_with_options(
         self, 
-        file_content: bytes, 
+        context: IngestContext, 
         filename: str, 
         sheet_name: Optional[str] = None,
         header_row: Optional[int] = None
     ) -> pd.DataFrame:
         """Read Excel file with enhanced options for German accounting data"""
         try:
-            # Try reading with different options to find the best approach
-            excel_file = pd.ExcelFile(io.BytesIO(file_content))
-            
             # Use GPT-5 recommended sheet or fallback to best sheet selection
-            if sheet_name and sheet_name in excel_file.sheet_names:
+            if sheet_name and sheet_name in context.sheet_names:
                 selected_sheet = sheet_name
                 logger.info(f"Using GPT-5 recommended sheet: {selected_sheet}")
             else:
-                selected_sheet = self._select_best_sheet(excel_file.sheet_names)
+                selected_sheet = context.best_sheet or self._select_best_sheet(context.sheet_names)
                 logger.info(f"Selected sheet using fallback: {selected_sheet}")
             
             # Use GPT-5 header hint or detect automatically
             if header_row is not None:
                 logger.info(f"Using GPT-5 detected header row: {header_row}")
-            else:
-                header_row = None  # Let pandas detect or clean_and_find_header handle it
-            
-            # Read with pandas optimizations
-            df = pd.read_excel(
-                io.BytesIO(file_content),
-                sheet_name=sheet_name,
-                dtype_backend="pyarrow",  # Use Arrow backend for better performance
-                header=None,  # We'll detect header row ourselves
-                engine='openpyxl'
-            )
+            
+            # Raw sheet (header=None, Arrow backed) from the ingest context
+            df = context.sheet_frame(selected_sheet)
             
             # Clean and find header row
             df = self._clean_and_find_header(df)
@@ -152,41 +239,21 @@ class PandasAnalyzer:
             logger.error(f"Error reading Excel file: {str(e)}")
             raise
 
-    async def _read_csv_with_options(
+    def _read_csv_with_options(
         self, 
-        file_content: bytes, 
+        context: IngestContext, 
         filename: str,
         header_row: Optional[int] = None
     ) -> pd.DataFrame:
         """Read CSV file with enhanced encoding and delimiter detection"""
         try:
-            # Detect encoding
-            import charset_normalizer
-            encoding_result = charset_normalizer.from_bytes(file_content)
-            encoding = encoding_result.best().encoding if encoding_result.best() else 'utf-8'
-            logger.info(f"Detected CSV encoding: {encoding}")
-            
             if header_row is not None:
                 logger.info(f"Using GPT-5 detected header row: {header_row}")
             else:
                 logger.info("Using automatic header detection")
             
-            # Convert to string
-            csv_content = file_content.decode(encoding)
-            
-            # Detect delimiter
-            delimiter = self._detect_csv_delimiter(csv_content)
-            logger.info(f"Detected CSV delimiter: '{delimiter}'")
-            
-            # Read with pandas
-            df = pd.read_csv(
-                io.StringIO(csv_content),
-                delimiter=delimiter,
-                dtype_backend="pyarrow",
-                header=None,  # We'll detect header row ourselves
-                encoding=encoding,
-                skip_blank_lines=True
-            )
+            # Decoded once by the ingest context with the detected encoding and delimiter
+            df = context.sheet_frame(CSV_FRAME)
             
             # Clean and find header row
             df = self._clean_and_find_header(df)
@@ -198,20 +265,8 @@ class PandasAnalyzer:
             raise
 
     def _select_best_sheet(self, sheet_names: List[str]) -> str:
-        """Select the most likely sheet containing trial balance data"""
-        # Priority keywords for German accounting
-        priority_keywords = [
-            'summen', 'saldi', 'trial', 'balance', 'tb', 'guv', 'bwa', 
-            'bilanz', 'konto', 'saldo', 'soll', 'haben'
-        ]
-        
-        for keyword in priority_keywords:
-            for sheet in sheet_names:
-                if keyword.lower() in sheet.lower():
-                    return sheet
-        
-        # Return first sheet if no match
-        return sheet_names[0]
+        """Select the most likely sheet containing trial balance data by name (see sheet_triage)"""
+        return rank_sheet_names(sheet_names)[0].name
 
     def _clean_and_find_header(self, df: pd.DataFrame) -> pd.DataFrame:
         """Clean DataFrame and detect header row"""
@@ -301,33 +356,46 @@ class PandasAnalyzer:
         # Return cleaned original name
         return str(col_name).strip().replace(' ', '_')
 
-    def _detect_csv_delimiter(self, csv_content: str) -> str:
-        """Detect CSV delimiter from content"""
-        # Common delimiters in order of preference
-        delimiters = [';', ',', '\t', '|']
-        
-        # Sample first few lines for detection
-        sample_lines = csv_content.split('\n')[:5]
-        sample = '\n'.join(sample_lines)
-        
-        delimiter_scores = {}
-        for delim in delimiters:
-            # Count occurrences and consistency across lines
-            line_counts = [line.count(delim) for line in sample_lines if line.strip()]
-            if line_counts:
-                avg_count = sum(line_counts) / len(line_counts)
-                consistency = 1 - (np.std(line_counts) / (avg_count + 1))  # Avoid division by zero
-                delimiter_scores[delim] = avg_count * consistency
-        
-        # Return delimiter with highest score
-        if delimiter_scores:
-            best_delimiter = max(delimiter_scores, key=delimiter_scores.get)
-            return best_delimiter
-        
-        return ','  # Default fallback
-
     async def normalize_data(self, parsed_data: List[Dict[str, Any]], entity_uuid: str, filename: str) -> List[ProcessedTrialBalanceRow]:
         """Normalize parsed data using pandas for advanced data cleaning and validation"""
+        normalized_rows = [row async for row in self.iter_normalized_rows(parsed_data, entity_uuid, filename)]
+        logger.info(f"Successfully normalized {len(normalized_rows)} rows")
+        return normalized_rows
+
+    async def iter_normalized_rows(
+        self,
+        parsed_data: List[Dict[str, Any]],
+        entity_uuid: str,
+        filename: str,
+        layout_fingerprint: Optional[str] = None,
+        described_first: bool = False
+    ) -> AsyncIterator[ProcessedTrialBalanceRow]:
+        """Yield normalized rows one at a time, as soon as each is built"""
+        async for record in self.iter_normalized_records(
+            parsed_data, entity_uuid, filename, layout_fingerprint, described_first
+        ):
+            try:
+                normalized_row = ProcessedTrialBalanceRow(**record)
+            except Exception as e:
+                logger.warning(f"Failed to normalize row {record.get('source_row_number')}: {str(e)}")
+                continue
+            yield normalized_row
+
+    async def iter_normalized_records(
+        self,
+        parsed_data: List[Dict[str, Any]],
+        entity_uuid: str,
+        filename: str,
+        layout_fingerprint: Optional[str] = None,
+        described_first: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield normalized rows as plain field dicts (ProcessedTrialBalanceRow fields),
+        for consumers that build columnar output without per-row model objects.
+        layout_fingerprint (from the raw analysis) reuses a known layout's column mapping.
+        described_first yields rows that have a description before awaiting GPT-5
+        inference for the others, instead of in file order (source_row_number keeps it).
+        """
         try:
             logger.info(f"Starting data normalization for {len(parsed_data)} rows")
             
@@ -335,23 +403,69 @@ class PandasAnalyzer:
             df = pd.DataFrame(parsed_data)
             
             if df.empty:
-                return []
+                return
             
             # Identify key columns using GPT-5 enhanced analysis
-            column_mapping = await self._identify_columns(df.columns.tolist(), parsed_data[:3])
-            logger.info(f"Enhanced column mapping: {column_mapping}")
-            
-            normalized_rows = []
+            column_mapping, mapping_source = await self._identify_columns(
+                df.columns.tolist(), parsed_data[:PROFILE_SAMPLE_ROWS], layout_fingerprint, entity_uuid
+            )
+            logger.info(f"Enhanced column mapping ({mapping_source}): {column_mapping}")
             
+            # First pass: account numbers and descriptions found in the row itself
+            extracted = []
             for idx, row in df.iterrows():
                 try:
-                    # Extract and clean core fields
                     account_number = self._extract_account_number(row, column_mapping)
-                    account_description = await self._extract_account_description(row, column_mapping, account_number)
-                    amount = self._extract_amount(row, column_mapping)
-                    
                     if not account_number:
                         continue
+                    extracted.append((idx, row, account_number, self._extract_account_description(row, column_mapping)))
+                except Exception as e:
+                    logger.warning(f"Failed to normalize row {idx}: {str(e)}")
+            
+            # A GPT-5 mapping this file parsed with is confirmed for the entity
+            if mapping_source == MAPPING_LLM and entity_uuid and extracted and (
+                len(extracted) >= MIN_CONFIRMED_ROW_SHARE * len(df)
+            ):
+                await self.mapping_memory.remember_async(entity_uuid, df.columns.tolist(), column_mapping)
+            
+            # Standard chart of accounts: descriptions of known accounts, account types by range
+            account_numbers = [account_number for _, _, account_number, _ in extracted]
+            chart = detect_chart(account_numbers, [description for _, _, _, description in extracted])
+            chart_entries = get_chart_index(chart).lookup(account_numbers)
+            chart_descriptions = chart_entries['description'].tolist()
+            account_types = chart_entries['account_type'].tolist()
+            account_categories = chart_entries['category'].tolist()
+            
+            # Rows still lacking a description after the chart lookup
+            undescribed = [
+                position
+                for position, ((_, _, _, description), chart_description) in enumerate(zip(extracted, chart_descriptions))
+                if not description and not chart_description
+            ]
+            if described_first:
+                missing = set(undescribed)
+                order = [position for position in range(len(extracted)) if position not in missing] + undescribed
+                infer_at = len(extracted) - len(undescribed)
+            else:
+                order = range(len(extracted))
+                infer_at = 0
+            
+            # Second pass: build the records
+            inferred_descriptions = {}
+            for step, position in enumerate(order):
+                if step == infer_at:
+                    # One batched inference for every account still lacking a description
+                    inferred_descriptions = await self._infer_missing_descriptions(
+                        [extracted[missing_position][2] for missing_position in undescribed]
+                    )
+                idx, row, account_number, account_description = extracted[position]
+                try:
+                    # Extract and clean core fields
+                    if not account_description:
+                        account_description = chart_descriptions[position] or self._fallback_description(
+                            row, account_number, inferred_descriptions
+                        )
+                    amount = self._extract_amount(row, column_mapping)
                     
                     # Generate source hash for deduplication
                     source_hash = hashlib.sha256(
@@ -359,10 +473,12 @@ class PandasAnalyzer:
                     ).hexdigest()[:16]
                     
                     # Create normalized record
-                    normalized_row = ProcessedTrialBalanceRow(
+                    period_start_date, period_end_date = self._generate_period_dates()
+                    normalized_record = dict(
                         entity_uuid=entity_uuid,
                         account_number=account_number,
                         account_description=account_description,
+                        account_type=account_types[position] or "pl",
                         amount=amount or 0.0,
                         currency_code="EUR",  # Default, will be detected later
                         source_system="Unknown",  # Will be classified later
@@ -370,8 +486,8 @@ class PandasAnalyzer:
                         source_row_number=row.get('_source_row', idx + 1),
                         source_hash=source_hash,
                         period_key_yyyymm=self._extract_period_key(),
-                        period_start_date=self._generate_period_dates()[0],
-                        period_end_date=self._generate_period_dates()[1],
+                        period_start_date=period_start_date,
+                        period_end_date=period_end_date,
                         as_of_date=datetime.now().date().isoformat(),
                         parser_version="docling-pandas-1.0",
                         extraction_confidence=self._calculate_extraction_confidence(row, column_mapping),
@@ -379,47 +495,85 @@ class PandasAnalyzer:
                             'extraction_method': row.get('_extraction_method', 'pandas'),
                             'source_page': row.get('_source_page'),
                             'source_table': row.get('_source_table'),
-                            'columns_found': list(column_mapping.keys())
+                            'columns_found': list(column_mapping.keys()),
+                            'chart_of_accounts': chart,
+                            'account_category': account_categories[position]
                         }
                     )
                     
-                    normalized_rows.append(normalized_row)
-                    
                 except Exception as e:
                     logger.warning(f"Failed to normalize row {idx}: {str(e)}")
                     continue
-            
-            logger.info(f"Successfully normalized {len(normalized_rows)} rows")
-            return normalized_rows
+                
+                yield normalized_record
             
         except Exception as e:
             logger.error(f"Error in data normalization: {str(e)}")
             raise
 
-    async def _identify_columns(self, column_names: List[str], sample_data: List[Dict[str, Any]] = None) -> Dict[str, str]:
-        """GPT-5 enhanced column identification with German accounting expertise"""
-        
-        # Try GPT-5 enhanced analysis first
+    async def _identify_columns(
+        self,
+        column_names: List[str],
+        sample_data: List[Dict[str, Any]] = None,
+        layout_fingerprint: Optional[str] = None,
+        entity_uuid: Optional[str] = None
+    ) -> Tuple[Dict[str, str], str]:
+        """
+        GPT-5 enhanced column identification with German accounting expertise.
+        Returns the mapping and where it came from (MAPPING_* source).
+        """
+        
+        # Mapping confirmed for this entity's headers before
+        if entity_uuid:
+            remembered = await self.mapping_memory.lookup_async(entity_uuid, column_names)
+            if remembered is not None:
+                return remembered, MAPPING_REMEMBERED
+        
+        # Known layout with the same headers: reuse its GPT-5 mapping
+        if layout_fingerprint:
+            known_mapping = await self.layout_cache.column_mapping(layout_fingerprint, column_names)
+            if known_mapping is not None:
+                logger.info(f"Using stored column mapping of layout {layout_fingerprint[:12]}")
+                return known_mapping, MAPPING_LAYOUT
+        
+        # GPT-5 enhanced analysis, hedged by pattern matching within the latency budget
         if self.gpt5_analyzer and sample_data:
-            try:
-                logger.info("Using GPT-5 for intelligent column mapping")
-                analysis = await self.gpt5_analyzer.analyze_columns(
-                    column_names, 
-                    sample_data[:3],  # Send first 3 rows as sample
-                    document_type="German accounting document"
-                )
-                
-                if analysis.confidence > 0.7:
-                    logger.info(f"GPT-5 mapping successful with {analysis.confidence:.2f} confidence")
-                    return analysis.mapping
-                else:
-                    logger.info(f"GPT-5 confidence too low ({analysis.confidence:.2f}), using enhanced fallback")
-                    
-            except Exception as e:
-                logger.warning(f"GPT-5 column analysis failed: {str(e)}, using enhanced fallback")
+            mapping, source = await self.gpt5_analyzer.scheduler.hedged(
+                COLUMN_MAPPING,
+                self._gpt5_column_mapping(column_names, sample_data, layout_fingerprint),
+                lambda: (self._enhanced_pattern_matching(column_names), MAPPING_PATTERNS),
+                accept=lambda result: result[0] is not None
+            )
+            return mapping, source
         
         # Enhanced fallback with German patterns from sample data
-        return self._enhanced_pattern_matching(column_names)
+        return self._enhanced_pattern_matching(column_names), MAPPING_PATTERNS
+    
+    async def _gpt5_column_mapping(
+        self,
+        column_names: List[str],
+        sample_data: List[Dict[str, Any]],
+        layout_fingerprint: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, str]], str]:
+        """
+        GPT-5 column mapping (None when its confidence is too low to beat pattern
+        matching) and MAPPING_LLM. Good mappings are kept for the layout, also when
+        they arrive late; the entity only keeps those a file was parsed with.
+        """
+        logger.info("Using GPT-5 for intelligent column mapping")
+        analysis = await self.gpt5_analyzer.analyze_columns(
+            column_names, 
+            sample_data,  # Profiled per column, so more rows do not grow the prompt
+            document_type="German accounting document"
+        )
+        
+        if analysis.confidence > 0.7:
+            logger.info(f"GPT-5 mapping successful with {analysis.confidence:.2f} confidence")
+            if layout_fingerprint:
+                await self.layout_cache.store_column_mapping(layout_fingerprint, column_names, analysis.mapping)
+            return analysis.mapping, MAPPING_LLM
+        logger.info(f"GPT-5 confidence too low ({analysis.confidence:.2f}), using enhanced fallback")
+        return None, MAPPING_LLM
     
     def _enhanced_pattern_matching(self, column_names: List[str]) -> Dict[str, str]:
         """Enhanced pattern matching with German accounting expertise"""
@@ -474,8 +628,8 @@ class PandasAnalyzer:
         cleaned = re.sub(r'[^0-9A-Za-z]', '', value)
         return cleaned if cleaned else None
 
-    async def _extract_account_description(self, row: pd.Series, column_mapping: Dict[str, str], account_number: Optional[str] = None) -> Optional[str]:
-        """Extract and clean account description with GPT-5 enhancement"""
+    def _extract_account_description(self, row: pd.Series, column_mapping: Dict[str, str]) -> Optional[str]:
+        """Extract and clean account description from the mapped or a description-like column"""
         desc_col = column_mapping.get('description')
         
         # Primary extraction from mapped column
@@ -494,19 +648,25 @@ class PandasAnalyzer:
                     logger.info(f"Found description '{value}' in unmapped column '{col}'")
                     return value[:255]
         
-        # Tertiary: GPT-5 inference from account number
-        if self.gpt5_analyzer and account_number:
-            try:
-                inferences = await self.gpt5_analyzer.infer_missing_descriptions(
-                    [account_number], 
-                    context="German trial balance"
-                )
-                if account_number in inferences:
-                    inferred_desc = inferences[account_number]
-                    logger.info(f"GPT-5 inferred description for {account_number}: {inferred_desc}")
-                    return inferred_desc[:255]
-            except Exception as e:
-                logger.warning(f"GPT-5 description inference failed: {str(e)}")
+        return None
+
+    async def _infer_missing_descriptions(self, account_numbers: List[str]) -> Dict[str, str]:
+        """GPT-5 descriptions for accounts without one (deduplicated and chunked by the analyzer)"""
+        if not self.gpt5_analyzer or not account_numbers:
+            return {}
+        try:
+            return await self.gpt5_analyzer.infer_missing_descriptions(
+                account_numbers, 
+                context="German trial balance"
+            )
+        except Exception as e:
+            logger.warning(f"GPT-5 description inference failed: {str(e)}")
+            return {}
+
+    def _fallback_description(self, row: pd.Series, account_number: str, inferred_descriptions: Dict[str, str]) -> Optional[str]:
+        """Description for a row without a description column: GPT-5 inference, else any meaningful text"""
+        if account_number in inferred_descriptions:
+            return inferred_descriptions[account_number][:255]
         
         # Fallback: Use any meaningful text in the row
         for col in row.index:
@@ -679,7 +839,7 @@ class PandasAnalyzer:
 
     async def generate_quality_report(self, normalized_data: List[ProcessedTrialBalanceRow]) -> QualityReport:
         """Generate comprehensive data quality report using pandas"""
-        if not normalized_data:
+        if len(normalized_data) == 0:
             return QualityReport(
                 completeness_score=0.0,
                 consistency_score=0.0,
@@ -689,59 +849,35 @@ class PandasAnalyzer:
                 recommendations=["No data to analyze"]
             )
         
-        # Convert to DataFrame for analysis
-        df = pd.DataFrame([row.dict() for row in normalized_data])
-        
-        # Calculate completeness
-        completeness_scores = {}
-        for col in df.columns:
-            non_null_count = df[col].notna().sum()
-            completeness_scores[col] = non_null_count / len(df)
-        
-        completeness_score = np.mean(list(completeness_scores.values()))
-        
-        # Calculate consistency (simplified)
-        consistency_score = 0.9  # Placeholder - would implement actual consistency checks
-        
-        # Calculate accuracy (simplified)
-        accuracy_score = 0.85  # Placeholder - would implement actual accuracy checks
-        
-        overall_score = (completeness_score + consistency_score + accuracy_score) / 3
-        
-        recommendations = []
-        if completeness_score < 0.8:
-            recommendations.append("Some records have missing data - consider data cleaning")
-        if len(df) < 10:
-            recommendations.append("Small dataset - results may not be representative")
-        
-        return QualityReport(
-            completeness_score=completeness_score,
-            consistency_score=consistency_score,
-            accuracy_score=accuracy_score,
-            overall_score=overall_score,
-            metrics={
-                "total_records": len(df),
-                "unique_accounts": df['account_number'].nunique(),
-                "completeness_by_field": completeness_scores
-            },
-            recommendations=recommendations
-        )
+        # Completeness per field, counted record by record like a streamed result
+        accumulator = QualityAccumulator()
+        for record in iter_records(normalized_data):
+            accumulator.add(record)
+        return accumulator.report()
 
-    async def analyze_tabular_structure(self, file_content: bytes, file_type: str, filename: str) -> Dict[str, Any]:
+    async def analyze_tabular_structure(self, file_content: FileSource, file_type: str, filename: str) -> Dict[str, Any]:
         """Analyze tabular file structure without full processing"""
+        return self.describe_tabular_structure(file_content, file_type, filename)
+
+    def describe_tabular_structure(self, file_content: Union[FileSource, IngestContext], file_type: str, filename: str) -> Dict[str, Any]:
+        """Synchronous counterpart of analyze_tabular_structure"""
         try:
+            context = self._ingest_context(file_content, file_type, filename)
             if file_type == "xlsx":
-                df = await self._read_excel_with_options(file_content, filename)
+                df = self._read_excel_with_options(context, filename)
             else:
-                df = await self._read_csv_with_options(file_content, filename)
+                df = self._read_csv_with_options(context, filename)
             
+            cell_count = max(len(df) * len(df.columns), 1)
             return {
                 'row_count': len(df),
                 'column_count': len(df.columns),
                 'columns': df.columns.tolist(),
-                'data_types': df.dtypes.to_dict(),
-                'missing_data_percent': df.isnull().sum() / len(df) * 100,
-                'data_quality_score': 1.0 - (df.isnull().sum().sum() / (len(df) * len(df.columns))),
+                'data_types': {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+                'missing_data_percent': {
+                    str(col): float(missing) / max(len(df), 1) * 100 for col, missing in df.isnull().sum().items()
+                },
+                'data_quality_score': 1.0 - float(df.isnull().sum().sum()) / cell_count,
                 'header_detection_confidence': 0.9  # Placeholder
             }
             
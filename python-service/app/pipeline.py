@@ -0,0 +1,323 @@
+"""
+Processing Pipeline Module
+
+The /process-file pipeline as a reusable unit: detection, GPT-5 raw analysis,
+parsing, normalization, characteristics, validation and quality report.
+Used by the synchronous endpoint and by background jobs alike.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+
+from .columnar import collect_table, with_summary
+from .ingest import FileSource
+from .metrics import PIPELINE_DURATION, PROCESSED_ROWS, STAGE_DURATION, time_stage
+from .progress import PHASE, ROWS
+from .models import FileType, ProcessedTrialBalanceRow, ProcessingResponse, RawAnalysisResult
+from .pandas_analyzer import PandasAnalyzer
+from .raw_file_analyzer import RawFileAnalyzer
+from .running_summary import RunningSummary
+from .utils.file_detector import DetectionResult, FileDetector
+from .utils.validator import DataValidator
+from .worker_pool import ProcessingPool
+
+logger = logging.getLogger(__name__)
+
+# Normalized rows per chunk written to a streaming response
+STREAM_BATCH_ROWS = 200
+
+# Row order of an NDJSON stream, reported in its trailer: rows that already have a
+# description in file order, then those whose description GPT-5 had to infer
+STREAM_ROW_ORDER = "described_first"
+
+# Normalized rows between progress events of a job
+PROGRESS_ROWS = 500
+
+
+@dataclass
+class ParsedFile:
+    """Output of detection and parsing, input to normalization"""
+    file_type: str
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    raw_analysis: Optional[RawAnalysisResult] = None
+    detection: Optional[DetectionResult] = None
+    # Seconds per pipeline stage so far, and when the pipeline started (perf_counter)
+    stage_timings: Dict[str, float] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def layout_fingerprint(self) -> Optional[str]:
+        """Layout fingerprint from the raw analysis, keying stored column mappings"""
+        if self.raw_analysis is None:
+            return None
+        return self.raw_analysis.processing_hints.get("layout_fingerprint")
+
+
+class ProcessingPipeline:
+    """Runs the full trial balance pipeline for one file"""
+
+    def __init__(
+        self,
+        processing_pool: ProcessingPool,
+        file_detector: FileDetector,
+        raw_file_analyzer: RawFileAnalyzer,
+        pandas_analyzer: PandasAnalyzer,
+        validator: DataValidator
+    ):
+        self.processing_pool = processing_pool
+        self.file_detector = file_detector
+        self.raw_file_analyzer = raw_file_analyzer
+        self.pandas_analyzer = pandas_analyzer
+        self.validator = validator
+
+    async def process(
+        self,
+        source: FileSource,
+        filename: str,
+        entity_uuid: str,
+        source_system_hint: Optional[str] = None,
+        progress_token: Optional[str] = None
+    ) -> ProcessingResponse:
+        """
+        Process a file (spooled path or bytes) into a ProcessingResponse.
+        Phase transitions and row counts are published under progress_token (a job UUID) if given.
+        """
+        started = time.perf_counter()
+        file_type = "unknown"
+        try:
+            parsed = await self.parse(source, filename, progress_token)
+            file_type = parsed.file_type
+
+            # Step 3: Data Normalization with pandas
+            self._publish(progress_token, PHASE, phase="normalization")
+            with time_stage("normalization", parsed.stage_timings, file_type):
+                normalized_data = []
+                rows = self.pandas_analyzer.iter_normalized_rows(
+                    parsed.rows, entity_uuid, filename, parsed.layout_fingerprint
+                )
+                async for row in rows:
+                    normalized_data.append(row)
+                    if len(normalized_data) % PROGRESS_ROWS == 0:
+                        self._publish_rows(progress_token, parsed, len(normalized_data))
+                self._publish_rows(progress_token, parsed, len(normalized_data))
+                logger.info(f"Successfully normalized {len(normalized_data)} rows")
+
+            response = await self.summarize(parsed, normalized_data, filename, progress_token)
+        except Exception:
+            PIPELINE_DURATION.labels(file_type=file_type, outcome="error").observe(time.perf_counter() - started)
+            raise
+
+        response.data = normalized_data
+        return response
+
+    async def process_table(
+        self,
+        source: FileSource,
+        filename: str,
+        entity_uuid: str,
+        source_system_hint: Optional[str] = None
+    ) -> pa.Table:
+        """
+        Process a file into a pyarrow Table of normalized rows, built column by column.
+        The ProcessingResponse summary is attached as schema metadata.
+        """
+        started = time.perf_counter()
+        file_type = "unknown"
+        try:
+            parsed = await self.parse(source, filename)
+            file_type = parsed.file_type
+
+            # Step 3: Data Normalization straight into columns
+            with time_stage("normalization", parsed.stage_timings, file_type):
+                table = await collect_table(
+                    self.pandas_analyzer.iter_normalized_records(
+                        parsed.rows, entity_uuid, filename, parsed.layout_fingerprint
+                    )
+                )
+
+            # Summaries run on a DataFrame view of the table instead of row objects
+            summary = await self.summarize(parsed, table.to_pandas(), filename)
+        except Exception:
+            PIPELINE_DURATION.labels(file_type=file_type, outcome="error").observe(time.perf_counter() - started)
+            raise
+
+        return with_summary(table, summary)
+
+    async def parse(self, source: FileSource, filename: str, progress_token: Optional[str] = None) -> ParsedFile:
+        """Steps 1-2: detect the file type, analyze the raw structure and parse rows"""
+        parsed = ParsedFile(file_type="unknown")
+        timings = parsed.stage_timings
+
+        # Step 1: File Type Detection
+        self._publish(progress_token, PHASE, phase="detection")
+        with time_stage("detection", timings):
+            parsed.detection = await self.file_detector.detect(source, filename)
+        file_type = parsed.detection.file_type
+        parsed.file_type = file_type
+        logger.info(f"Detected file type: {file_type}")
+
+        # Step 1.2: Tabular files are parsed once into an IngestContext that the
+        # raw analysis and the parser both read from
+        content = source
+        if file_type in ["xlsx", "csv"]:
+            self._publish(progress_token, PHASE, phase="ingest")
+            with time_stage("ingest", timings, file_type):
+                content = await self.processing_pool.run(
+                    "tabular_ingest", source, file_type, filename, parsed.detection, progress_token=progress_token
+                )
+
+        # Step 1.5: GPT-5 Raw File Analysis
+        processing_hints = {}
+
+        if file_type in ["xlsx", "csv"]:
+            self._publish(progress_token, PHASE, phase="raw_analysis")
+            try:
+                with time_stage("raw_analysis", timings, file_type):
+                    parsed.raw_analysis = await self.raw_file_analyzer.analyze_raw_file_structure(
+                        content, FileType(file_type), filename
+                    )
+                processing_hints = parsed.raw_analysis.processing_hints
+                logger.info(f"GPT-5 raw analysis completed with confidence: {parsed.raw_analysis.analysis_confidence}")
+            except Exception as e:
+                logger.warning(f"Raw file analysis failed: {str(e)}, proceeding without hints")
+
+        # Step 2: Parse based on file type
+        self._publish(progress_token, PHASE, phase="parsing", file_type=file_type)
+        with time_stage("parsing", timings, file_type):
+            if file_type == "pdf":
+                # Use Docling for PDF processing; pages are reported from the worker
+                parsed.rows = await self.processing_pool.run("pdf_parse", source, progress_token=progress_token)
+            elif file_type in ["xlsx", "csv"]:
+                # Use pandas for tabular data with GPT-5 hints
+                parsed.rows = await self.processing_pool.run(
+                    "tabular_parse", content, file_type, filename, processing_hints, progress_token=progress_token
+                )
+            else:
+                raise ValueError(f"Unsupported file type: {file_type}")
+
+        logger.info(f"Parsed {len(parsed.rows)} rows from file")
+        if not parsed.rows and processing_hints.get("layout_cache"):
+            # The stored analysis of this layout did not work for this file
+            await asyncio.to_thread(
+                self.raw_file_analyzer.layout_cache.invalidate, parsed.layout_fingerprint, "no rows parsed"
+            )
+        self._publish_rows(progress_token, parsed, 0)
+        return parsed
+
+    def _publish(self, progress_token: Optional[str], event: str, **data: Any):
+        if progress_token:
+            self.processing_pool.progress.publish(progress_token, event, data)
+
+    def _publish_rows(self, progress_token: Optional[str], parsed: ParsedFile, normalized: int):
+        self._publish(progress_token, ROWS, rows_parsed=len(parsed.rows), rows_normalized=normalized)
+
+    async def summarize(
+        self,
+        parsed: ParsedFile,
+        normalized_data: Union[List[ProcessedTrialBalanceRow], pd.DataFrame, RunningSummary],
+        filename: str,
+        progress_token: Optional[str] = None
+    ) -> ProcessingResponse:
+        """
+        Steps 4-6: characteristics, validation and quality report (without the row data),
+        of the rows themselves or of a RunningSummary kept while they were streamed
+        """
+        running = isinstance(normalized_data, RunningSummary) and len(normalized_data) > 0
+        timings = parsed.stage_timings
+
+        # Step 4: Classification and Characteristics Detection
+        self._publish(progress_token, PHASE, phase="summarizing")
+        with time_stage("characteristics", timings, parsed.file_type):
+            characteristics = await self.pandas_analyzer.detect_file_characteristics(
+                normalized_data, filename, parsed.file_type
+            )
+
+        # Step 5: Data Validation
+        with time_stage("validation", timings, parsed.file_type):
+            if running:
+                validation_results = normalized_data.validation_result()
+            else:
+                validation_results = await self.validator.validate_trial_balance_data(normalized_data)
+
+        # Step 6: Enhanced Quality Analysis
+        with time_stage("quality_report", timings, parsed.file_type):
+            if running:
+                quality_report = normalized_data.quality_report()
+            else:
+                quality_report = await self.pandas_analyzer.generate_quality_report(normalized_data)
+
+        elapsed = time.perf_counter() - parsed.started
+        PIPELINE_DURATION.labels(file_type=parsed.file_type, outcome="success").observe(elapsed)
+        PROCESSED_ROWS.labels(file_type=parsed.file_type).inc(len(normalized_data))
+        logger.info(f"Successfully processed {len(normalized_data)} normalized records in {elapsed:.2f}s")
+
+        return ProcessingResponse(
+            success=True,
+            row_count=len(normalized_data),
+            characteristics=characteristics,
+            validation_results=validation_results,
+            quality_report=quality_report,
+            raw_analysis=parsed.raw_analysis,
+            message=f"Successfully processed {len(normalized_data)} records using Docling + pandas with GPT-5 analysis",
+            processing_time_seconds=round(elapsed, 4),
+            stage_timings=dict(timings)
+        )
+
+    async def stream_ndjson(self, parsed: ParsedFile, entity_uuid: str, filename: str) -> AsyncIterator[str]:
+        """
+        Normalize parsed rows and emit them as NDJSON while they are produced.
+        Each row is one ProcessedTrialBalanceRow object per line; the last line is a
+        trailer record ({"type": "trailer", ...}) with the ProcessingResponse minus
+        its data, or ({"type": "error", ...}) if normalization failed midway.
+        Rows with a description are streamed before those awaiting GPT-5 inference
+        (STREAM_ROW_ORDER, unlike the file order of format=json and arrow), so row
+        numbers in the trailer's validation findings count stream lines and
+        source_row_number gives a row's file position. The trailer is built from
+        running aggregates rather than the rows.
+        """
+        summary = RunningSummary(self.validator)
+        batch = []
+        normalization_seconds = 0.0
+        try:
+            rows = self.pandas_analyzer.iter_normalized_rows(
+                parsed.rows, entity_uuid, filename, parsed.layout_fingerprint, described_first=True
+            )
+            while True:
+                # Only time row production - time spent waiting on the client is not normalization
+                row_started = time.perf_counter()
+                try:
+                    row = await rows.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    normalization_seconds += time.perf_counter() - row_started
+                summary.add(row)
+                batch.append(row.model_dump_json())
+                if len(batch) >= STREAM_BATCH_ROWS:
+                    yield "\n".join(batch) + "\n"
+                    batch = []
+            if batch:
+                yield "\n".join(batch) + "\n"
+                batch = []
+
+            parsed.stage_timings["normalization"] = round(normalization_seconds, 4)
+            STAGE_DURATION.labels(stage="normalization", file_type=parsed.file_type).observe(normalization_seconds)
+
+            trailer = await self.summarize(parsed, summary, filename)
+            yield json.dumps({
+                "type": "trailer",
+                "row_order": STREAM_ROW_ORDER,
+                **trailer.model_dump(mode="json", exclude={"data"})
+            }) + "\n"
+        except Exception as e:
+            logger.error(f"Error streaming normalized rows: {str(e)}")
+            if batch:
+                yield "\n".join(batch) + "\n"
+            yield json.dumps({"type": "error", "success": False, "row_count": len(summary), "error": str(e)}) + "\n"
@@ -0,0 +1,269 @@
+"""
+Progress Module
+
+Live progress of background jobs for GET /jobs/{job_uuid}/events (Server-Sent
+Events). Pipeline code in the API process publishes phase transitions and row
+counts directly; stage functions running in pool workers (e.g. the Docling
+page loop) report through a multiprocessing queue that a reader thread drains
+into the same per-job channels.
+
+Reporting from workers never blocks: events are throttled, put with
+put_nowait and dropped when the queue is full. Cancellation is cooperative -
+the API drops a flag file per job that workers check at page boundaries.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+from .utils.env import env_float, env_int
+from .utils.storage import data_dir
+
+logger = logging.getLogger(__name__)
+
+# Event types sent on a job's stream
+STATUS = "status"
+PHASE = "phase"
+PAGE = "page"
+ROWS = "rows"
+
+# Seconds between cancel flag checks in a worker
+CANCEL_CHECK_SECONDS = 0.5
+
+
+class JobCancelled(Exception):
+    """Raised inside a stage when the job it belongs to was cancelled"""
+
+
+# Worker side - set up once per process by install(), bound per stage call by bound()
+
+_queue = None
+_cancel_dir: Optional[str] = None
+_min_interval = 0.2
+_local = threading.local()
+
+
+def install(progress_queue, cancel_dir: str, min_interval: float):
+    """Give this process the queue it reports into (pool initializer, or the API process for threads)"""
+    global _queue, _cancel_dir, _min_interval
+    _queue = progress_queue
+    _cancel_dir = cancel_dir
+    _min_interval = min_interval
+
+
+class _Reporter:
+    def __init__(self, token: str):
+        self.token = token
+        self.last_sent: Dict[str, float] = {}
+        self.last_cancel_check = 0.0
+
+    def emit(self, event: str, force: bool, data: Dict[str, Any]):
+        now = time.monotonic()
+        if not force and now - self.last_sent.get(event, 0.0) < _min_interval:
+            return
+        self.last_sent[event] = now
+        try:
+            _queue.put_nowait((self.token, event, data))
+        except queue.Full:
+            pass  # Progress is best effort - never stall the stage for it
+
+    def cancelled(self) -> bool:
+        now = time.monotonic()
+        if now - self.last_cancel_check < CANCEL_CHECK_SECONDS:
+            return False
+        self.last_cancel_check = now
+        return os.path.exists(_cancel_flag_path(_cancel_dir, self.token))
+
+
+@contextmanager
+def bound(token: Optional[str]) -> Iterator[None]:
+    """Attribute progress reported by the current thread to a job while a stage runs"""
+    previous = getattr(_local, 'reporter', None)
+    _local.reporter = _Reporter(token) if token and _queue is not None else None
+    try:
+        yield
+    finally:
+        _local.reporter = previous
+
+
+def report(event: str, force: bool = False, **data: Any):
+    """Report progress of the current stage; throttled per event type unless forced, no-op outside jobs"""
+    reporter = getattr(_local, 'reporter', None)
+    if reporter is not None:
+        reporter.emit(event, force, data)
+
+
+def raise_if_cancelled():
+    """Stop the current stage if its job has been cancelled"""
+    reporter = getattr(_local, 'reporter', None)
+    if reporter is not None and reporter.cancelled():
+        raise JobCancelled(f"Job {reporter.token} was cancelled")
+
+
+def _cancel_flag_path(cancel_dir: str, token: str) -> str:
+    return os.path.join(cancel_dir, f"{token}.cancel")
+
+
+def format_sse(event_id: int, event: str, data: Dict[str, Any]) -> str:
+    """One Server-Sent Events message"""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# API side
+
+class _Channel:
+    """Recent events of one job and the subscribers waiting for more"""
+
+    def __init__(self, history: int):
+        self.events: Deque[Tuple[int, str, Dict[str, Any]]] = deque(maxlen=history)
+        self.next_id = 1
+        self.active = False
+        self.closed = False
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+
+    def append(self, event: str, data: Dict[str, Any]):
+        self.events.append((self.next_id, event, data))
+        self.next_id += 1
+        # Wake current waiters; later waiters get a fresh event
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class ProgressHub:
+    """Per-job event channels fed by the API process and by pool workers"""
+
+    def __init__(self, mp_context, cancel_dir: Optional[str] = None):
+        """
+        Configuration (environment):
+        - PROGRESS_MIN_INTERVAL_SECONDS: minimum gap between worker events of one type (default: 0.2)
+        - PROGRESS_HISTORY: events kept per job for late subscribers (default: 500)
+        - PROGRESS_QUEUE_SIZE: worker events buffered before new ones are dropped (default: 10000)
+        """
+        self.min_interval = env_float('PROGRESS_MIN_INTERVAL_SECONDS', 0.2)
+        self.history = env_int('PROGRESS_HISTORY', 500)
+        self.queue = mp_context.Queue(maxsize=env_int('PROGRESS_QUEUE_SIZE', 10000))
+        self.cancel_dir = cancel_dir or data_dir('job_cancel')
+        self._channels: Dict[str, _Channel] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+        install(self.queue, self.cancel_dir, self.min_interval)
+
+    @property
+    def worker_config(self) -> Tuple[Any, str, float]:
+        """install() arguments for worker processes"""
+        return self.queue, self.cancel_dir, self.min_interval
+
+    def _bind_loop(self):
+        # The app (and each TestClient) may run on a new loop; worker events go to the current one
+        self._loop = asyncio.get_running_loop()
+        if self._reader is None:
+            self._reader = threading.Thread(target=self._read_worker_events, name="progress-reader", daemon=True)
+            self._reader.start()
+
+    def _read_worker_events(self):
+        while True:
+            try:
+                item = self.queue.get()
+            except (EOFError, OSError):
+                break  # Queue closed at interpreter exit
+            if item is None:
+                break
+            token, event, data = item
+            try:
+                self._loop.call_soon_threadsafe(self.publish, token, event, data)
+            except RuntimeError:
+                pass  # Loop closed - nobody is listening anymore
+
+    def _channel(self, token: str) -> _Channel:
+        channel = self._channels.get(token)
+        if channel is None:
+            channel = self._channels[token] = _Channel(self.history)
+        return channel
+
+    def open(self, token: str):
+        """Start collecting events for a running job"""
+        self._bind_loop()
+        channel = self._channel(token)
+        channel.active = True
+        channel.closed = False
+
+    def publish(self, token: str, event: str, data: Optional[Dict[str, Any]] = None):
+        channel = self._channels.get(token)
+        if channel is not None and not channel.closed:
+            channel.append(event, data or {})
+
+    def close(self, token: str, event: str, data: Dict[str, Any]):
+        """Publish a job's final event and stop collecting; clears any cancel flag"""
+        channel = self._channels.get(token)
+        if channel is not None:
+            channel.append(event, data)
+            channel.closed = True
+            channel.active = False
+            self._release(token, channel)
+        try:
+            os.unlink(_cancel_flag_path(self.cancel_dir, token))
+        except FileNotFoundError:
+            pass
+
+    def cancel(self, token: str):
+        """Ask workers running stages for this job to stop"""
+        with open(_cancel_flag_path(self.cancel_dir, token), 'w'):
+            pass
+
+    @contextmanager
+    def subscription(self, token: str) -> Iterator[_Channel]:
+        """Keep a job's channel (and its history) alive while a client listens to it"""
+        self._bind_loop()
+        channel = self._channel(token)
+        channel.subscribers += 1
+        try:
+            yield channel
+        finally:
+            channel.subscribers -= 1
+            self._release(token, channel)
+
+    async def iter_events(
+        self,
+        channel: _Channel,
+        after_id: int = 0,
+        timeout: float = 15.0
+    ) -> AsyncIterator[Optional[Tuple[int, str, Dict[str, Any]]]]:
+        """
+        Yield (id, event, data) for events after after_id as they are published, and
+        None whenever nothing happened for timeout seconds. Ends once the channel is closed.
+        """
+        last_id = after_id
+        while True:
+            changed = channel.changed
+            # Read before yielding: a close while suspended in a yield appends the final event
+            closed = channel.closed
+            pending = [item for item in channel.events if item[0] > last_id]
+            for item in pending:
+                last_id = item[0]
+                yield item
+            if closed:
+                return
+            if pending:
+                continue
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                yield None
+
+    def _release(self, token: str, channel: _Channel):
+        if not channel.active and channel.subscribers == 0 and self._channels.get(token) is channel:
+            del self._channels[token]
+
+    def shutdown(self):
+        if self._reader is not None:
+            self.queue.put(None)
+            self._reader.join(timeout=5)
+            self._reader = None
@@ -0,0 +1,260 @@
+"""
+Prompt Compiler Module
+
+Compact data sections for LLM structure and column analysis prompts. Instead
+of raw row dumps, every column is described by one line computed with
+vectorized pandas string operations: filled cells, numeric share, share in
+German number format (1.234,56), distinct values, length range and two or
+three representative values. Rows that look like header rows are listed
+separately for raw sheets.
+
+Lines carry a priority. A prompt is compiled against a hard token budget:
+when the data does not fit, examples are dropped first, then the lowest
+priority lines.
+"""
+
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from .metrics import LLM_PROMPTS_TRIMMED
+from .utils.env import env_int
+from .xlsx_stream import column_letter
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token for mixed German/English text; deliberately conservative
+CHARS_PER_TOKEN = 3.5
+
+# Leading rows of a raw sheet checked for header rows
+HEADER_SCAN_ROWS = 15
+MAX_HEADER_CANDIDATES = 3
+
+# Representative values per column, truncated to MAX_VALUE_CHARS
+MAX_EXAMPLES = 3
+MAX_VALUE_CHARS = 24
+
+# Sample rows profiled for column mapping (the prompt size does not grow with them)
+PROFILE_SAMPLE_ROWS = 50
+
+# Priorities of prompt lines, lower is kept first
+PRIORITY_TITLE = 0
+PRIORITY_HEADER = 1
+PRIORITY_COLUMNS = 2
+
+_NUMBER = r"[+-]?(?:\d{1,3}(?:[.,' ]\d{3})+|\d+)(?:[.,]\d+)?(?:\s?[SH])?"
+_GERMAN_NUMBER = r"[+-]?(?:\d{1,3}(?:\.\d{3})+|\d+),\d+(?:\s?[SH])?"
+
+# Placeholder for the data section in prompt templates
+DATA_SLOT = "<<DATA>>"
+
+PROFILE_LEGEND = (
+    "n=filled cells, num=numeric share, de=share in German number format (1.234,56), "
+    "uniq=distinct values, len=min-max/mean length, ex=examples"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Token estimate for a prompt text, without a tokenizer"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _truncate(value: str) -> str:
+    value = " ".join(value.split())
+    return value if len(value) <= MAX_VALUE_CHARS else value[:MAX_VALUE_CHARS - 1] + "…"
+
+
+@dataclass
+class ColumnProfile:
+    """Summary statistics of one column's non-empty cells"""
+    name: str
+    filled: int = 0
+    numeric_ratio: float = 0.0
+    german_number_ratio: float = 0.0
+    distinct: int = 0
+    min_length: int = 0
+    max_length: int = 0
+    mean_length: float = 0.0
+    examples: List[str] = field(default_factory=list)
+
+    def render(self, examples: bool = True) -> str:
+        line = f"{self.name}: n={self.filled}"
+        if self.filled:
+            line += (
+                f" num={self.numeric_ratio:.2f} de={self.german_number_ratio:.2f} uniq={self.distinct}"
+                f" len={self.min_length}-{self.max_length}/{self.mean_length:.0f}"
+            )
+        if examples and self.examples:
+            line += " ex=" + " | ".join(self.examples)
+        return line
+
+
+def _cells(values: pd.Series) -> pd.Series:
+    """Non-empty cells of a column as stripped strings"""
+    cells = values[values.notna()].astype(str).str.strip()
+    return cells[(cells != "") & (cells.str.lower() != "nan")]
+
+
+def profile_column(name: str, values: pd.Series) -> ColumnProfile:
+    """Profile of one column"""
+    cells = _cells(values)
+    if cells.empty:
+        return ColumnProfile(name=name)
+    lengths = cells.str.len()
+    distinct = cells.drop_duplicates()
+    # First, middle and last distinct value, in order of appearance
+    positions = sorted({0, len(distinct) // 2, len(distinct) - 1})[:MAX_EXAMPLES]
+    return ColumnProfile(
+        name=name,
+        filled=len(cells),
+        numeric_ratio=round(float(cells.str.fullmatch(_NUMBER).mean()), 2),
+        german_number_ratio=round(float(cells.str.fullmatch(_GERMAN_NUMBER).mean()), 2),
+        distinct=len(distinct),
+        min_length=int(lengths.min()),
+        max_length=int(lengths.max()),
+        mean_length=float(lengths.mean()),
+        examples=[_truncate(distinct.iloc[position]) for position in positions],
+    )
+
+
+def profile_columns(frame: pd.DataFrame, names: Optional[Sequence[str]] = None) -> List[ColumnProfile]:
+    """Profiles of every column of a frame, named by names or the frame's columns"""
+    names = list(names) if names is not None else [str(column) for column in frame.columns]
+    return [profile_column(names[position], frame.iloc[:, position]) for position in range(frame.shape[1])]
+
+
+def header_candidates(frame: pd.DataFrame) -> List[Tuple[int, List[str]]]:
+    """
+    Rows among the first HEADER_SCAN_ROWS that look like header rows (at least two
+    filled cells, mostly short text), as (0-based row position, cells), best first
+    """
+    head = frame.head(HEADER_SCAN_ROWS).astype(object)
+    cells = head.apply(lambda column: column.where(column.notna(), "").astype(str).str.strip())
+    filled = cells != ""
+    short = cells.apply(lambda column: column.str.len() <= 40)
+    numeric = cells.apply(lambda column: column.str.fullmatch(_NUMBER))
+    text_counts = (filled & short & ~numeric).sum(axis=1).to_numpy()
+    filled_counts = filled.sum(axis=1).to_numpy()
+
+    rows = [
+        position for position in range(len(head))
+        if text_counts[position] >= 2 and text_counts[position] >= 0.6 * filled_counts[position]
+    ]
+    rows.sort(key=lambda position: (-text_counts[position], position))
+    candidates = []
+    for position in rows[:MAX_HEADER_CANDIDATES]:
+        row = [_truncate(value) for value in cells.iloc[position]]
+        while row and not row[-1]:
+            row.pop()
+        candidates.append((position, row))
+    return candidates
+
+
+@dataclass
+class PromptLine:
+    priority: int
+    text: str
+    # Shorter form used when the budget is tight (e.g. without examples)
+    lean: Optional[str] = None
+
+
+def raw_sheet_lines(title: str, frame: pd.DataFrame, rank: int = 0, row_base: int = 1) -> List[PromptLine]:
+    """
+    Lines describing a raw sheet (header=None frame): size, header candidates and
+    column profiles of the rows below the best header candidate, named by column
+    letter and header cell. rank orders the sheet's columns after better sheets';
+    row numbers start at row_base.
+    """
+    lines = [PromptLine(PRIORITY_TITLE, f"## {title} ({frame.shape[0]} preview rows x {frame.shape[1]} columns)")]
+    candidates = header_candidates(frame)
+    for position, cells in candidates:
+        lines.append(PromptLine(PRIORITY_HEADER, f"header? row {position + row_base}: " + " | ".join(cells)))
+
+    data_start, header_cells = (candidates[0][0] + 1, candidates[0][1]) if candidates else (0, [])
+    names = []
+    for position in range(frame.shape[1]):
+        name = column_letter(position)
+        if position < len(header_cells) and header_cells[position]:
+            name += f' "{header_cells[position]}"'
+        names.append(name)
+    if candidates:
+        lines.append(PromptLine(PRIORITY_HEADER, f"columns (rows {data_start + row_base}+):"))
+    for profile in profile_columns(frame.iloc[data_start:], names):
+        if profile.filled:
+            lines.append(PromptLine(PRIORITY_COLUMNS + rank, profile.render(), profile.render(examples=False)))
+    return lines
+
+
+def sample_column_lines(headers: Sequence[str], sample_data: List[Dict[str, Any]]) -> List[PromptLine]:
+    """Lines profiling named columns over sample rows (dicts keyed by header)"""
+    frame = pd.DataFrame(sample_data, columns=list(headers))
+    return [
+        PromptLine(PRIORITY_COLUMNS, profile.render(), profile.render(examples=False))
+        for profile in profile_columns(frame, [f'"{header}"' for header in headers])
+    ]
+
+
+@dataclass
+class CompiledPrompt:
+    """A prompt and how its data section was fitted to the budget"""
+    text: str
+    tokens: int
+    omitted_lines: int = 0
+    lean: bool = False
+
+
+class PromptCompiler:
+    """Fills a prompt template's data slot with prioritized lines, under a token budget"""
+
+    def __init__(self, token_budget: Optional[int] = None):
+        """
+        Configuration (environment):
+        - LLM_PROMPT_TOKEN_BUDGET: estimated tokens per structure/column prompt (default: 1500)
+        """
+        self.token_budget = token_budget or env_int('LLM_PROMPT_TOKEN_BUDGET', 1500)
+
+    def compile(self, template: str, lines: List[PromptLine], call_site: str = "default") -> CompiledPrompt:
+        """template with DATA_SLOT replaced by as many lines as fit, highest priority first"""
+        compiled = self._fit(template, DATA_SLOT, lines)
+        if compiled.lean:
+            LLM_PROMPTS_TRIMMED.labels(call_site=call_site).inc()
+            logger.info(
+                f"Prompt for {call_site} trimmed to {compiled.tokens} tokens "
+                f"({compiled.omitted_lines} lines omitted, budget {self.token_budget})"
+            )
+        return compiled
+
+    def _fit(self, template: str, slot: str, lines: List[PromptLine]) -> CompiledPrompt:
+        available = self.token_budget - estimate_tokens(template.replace(slot, ""))
+        full = [line.text for line in lines]
+        if estimate_tokens("\n".join(full)) <= available:
+            return self._render(template, slot, full, 0, False)
+
+        # Lean forms first, then whole lines by priority (kept lines stay in order)
+        lean = [line.lean or line.text for line in lines]
+        if estimate_tokens("\n".join(lean)) <= available:
+            return self._render(template, slot, lean, 0, True)
+
+        # Room for the omission note
+        available -= estimate_tokens("(9999 more lines omitted)\n")
+        keep = set()
+        used = 0
+        for index in sorted(range(len(lines)), key=lambda i: lines[i].priority):
+            cost = estimate_tokens(lean[index] + "\n")
+            if used + cost <= available:
+                keep.add(index)
+                used += cost
+        kept = [lean[index] for index in range(len(lines)) if index in keep]
+        omitted = len(lines) - len(kept)
+        if omitted:
+            kept.append(f"({omitted} more lines omitted)")
+        if available <= 0:
+            logger.warning(f"Prompt template alone exceeds the {self.token_budget} token budget")
+        return self._render(template, slot, kept, omitted, True)
+
+    def _render(self, template: str, slot: str, data: List[str], omitted: int, lean: bool) -> CompiledPrompt:
+        text = template.replace(slot, "\n".join(data))
+        return CompiledPrompt(text=text, tokens=estimate_tokens(text), omitted_lines=omitted, lean=lean)
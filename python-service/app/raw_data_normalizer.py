@@ -11,6 +11,7 @@ from datetime import datetime
 import re
 
 from .models import ProcessedTrialBalanceRow, ValidationResult, QualityReport
+from .mapping_memory import SOURCE_CUSTOM, USER_SOURCES, get_mapping_memory
 from .pandas_analyzer import PandasAnalyzer
 from .utils.validator import DataValidator
 from .utils.normalizer import DataNormalizer
@@ -23,6 +24,7 @@ class RawDataNormalizer:
         self.pandas_analyzer = pandas_analyzer
         self.validator = validator
         self.normalizer = normalizer
+        self.mapping_memory = get_mapping_memory()
         self.logger = logging.getLogger(__name__)
         
     def normalize_raw_file_data(
@@ -57,11 +59,15 @@ class RawDataNormalizer:
                 raw_file_data["file_metadata"].get("filename", "unknown")
             )
             
-            # 5. Normalize the processed data
+            # 5. Custom mapping: remember it for the entity, or reuse the one remembered
+            processed_data = analysis_result.get("processed_data", [])
+            custom_mapping = self._resolve_custom_mapping(entity_uuid, processed_data, custom_mapping)
+            
+            # 6. Normalize the processed data
             normalized_rows = []
             normalization_errors = []
             
-            for row_idx, raw_row_data in enumerate(analysis_result.get("processed_data", [])):
+            for row_idx, raw_row_data in enumerate(processed_data):
                 try:
                     # Apply custom mapping if provided
                     if custom_mapping:
@@ -110,10 +116,10 @@ class RawDataNormalizer:
                         error_message=error_msg
                     )
             
-            # 6. Validate normalized data
+            # 7. Validate normalized data
             validation_result = self.validator.validate_trial_balance_data(normalized_rows)
             
-            # 7. Generate quality report
+            # 8. Generate quality report
             quality_report = self._generate_quality_report(
                 raw_file_data, 
                 normalized_rows, 
@@ -121,7 +127,7 @@ class RawDataNormalizer:
                 validation_result
             )
             
-            # 8. Persist to database if requested and validation passes
+            # 9. Persist to database if requested and validation passes
             persisted_count = 0
             if validation_result.is_valid or force_normalization:
                 persisted_count = self._persist_normalized_data(normalized_rows, entity_uuid)
@@ -233,6 +239,24 @@ class RawDataNormalizer:
         
         return hints
     
+    def _resolve_custom_mapping(
+        self,
+        entity_uuid: str,
+        processed_data: List[Dict[str, Any]],
+        custom_mapping: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        A supplied custom mapping is kept for the entity's column headers; without
+        one, a user mapping remembered for the same headers is used.
+        """
+        if not processed_data:
+            return custom_mapping
+        headers = list(processed_data[0].keys())
+        if custom_mapping:
+            self.mapping_memory.remember(entity_uuid, headers, custom_mapping, SOURCE_CUSTOM)
+            return custom_mapping
+        return self.mapping_memory.lookup(entity_uuid, headers, USER_SOURCES)
+    
     def _apply_custom_mapping(self, raw_row_data: Dict[str, Any], custom_mapping: Dict[str, Any]) -> Dict[str, Any]:
         """Apply user-provided custom field mapping."""
         mapped_data = {}
@@ -6,13 +6,13 @@ raw data in human-readable format with complete transparency.
 """
 
 import logging
-import hashlib
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 import pandas as pd
-from io import BytesIO
 
-from .file_detector import FileDetector
+from .ingest import FileSource, detect_text_encoding, hash_source, pandas_input, read_prefix, source_size
+from .spreadsheet_reader import read_excel_sheets
+from .utils.file_detector import DetectionResult, FileDetector
 from .models import FileType, RawAnalysisResult, ProcessingRequest
 
 
@@ -26,7 +26,7 @@ class RawDataStorage:
         
     def process_and_store_raw_file(
         self, 
-        file_content: bytes, 
+        file_content: FileSource, 
         filename: str,
         entity_uuid: str,
         user_uuid: str
@@ -37,9 +37,10 @@ class RawDataStorage:
         """
         try:
             # Detect file type and basic info
-            file_type = self.file_detector.detect_file_type(filename)
-            file_size = len(file_content)
-            file_hash = hashlib.md5(file_content).hexdigest()
+            detection = self.file_detector.detect_sync(file_content, filename)
+            file_type = FileType(detection.file_type)
+            file_size = source_size(file_content)
+            file_hash = hash_source(file_content, 'md5')
             
             self.logger.info(f"Processing raw file: {filename} ({file_type}, {file_size} bytes)")
             
@@ -47,7 +48,7 @@ class RawDataStorage:
             if file_type == FileType.XLSX:
                 raw_data, parsing_metadata = self._parse_excel_file(file_content, filename)
             elif file_type == FileType.CSV:
-                raw_data, parsing_metadata = self._parse_csv_file(file_content, filename)
+                raw_data, parsing_metadata = self._parse_csv_file(file_content, filename, detection)
             elif file_type == FileType.PDF:
                 raw_data, parsing_metadata = self._parse_pdf_file(file_content, filename)
             else:
@@ -109,16 +110,19 @@ class RawDataStorage:
                 self._update_file_status(file_uuid, 'error', error_details={"error": str(e)})
             raise
     
-    def _parse_excel_file(self, file_content: bytes, filename: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    def _parse_excel_file(
+        self,
+        file_content: FileSource,
+        filename: str,
+        excel_engine: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """Parse Excel file and extract all sheets and data."""
         try:
-            # Read all sheets
-            excel_file = pd.ExcelFile(BytesIO(file_content))
+            # Read all sheets (header=None preserves the original structure)
+            sheet_names, frames = read_excel_sheets(file_content, engine=excel_engine)
             sheets_data = {}
             
-            for sheet_name in excel_file.sheet_names:
-                # Read with headers=None to preserve original structure
-                df = pd.read_excel(excel_file, sheet_name=sheet_name, header=None)
+            for sheet_name, df in frames.items():
                 # Convert to list of lists, handling NaN values
                 sheet_rows = []
                 for _, row in df.iterrows():
@@ -137,8 +141,8 @@ class RawDataStorage:
             }
             
             parsing_metadata = {
-                "sheet_names": excel_file.sheet_names,
-                "total_sheets": len(excel_file.sheet_names),
+                "sheet_names": sheet_names,
+                "total_sheets": len(sheet_names),
                 "total_rows": sum(sheet["row_count"] for sheet in sheets_data.values()),
                 "max_columns_across_sheets": max((sheet["max_columns"] for sheet in sheets_data.values()), default=0),
                 "parsing_timestamp": datetime.utcnow().isoformat()
@@ -150,26 +154,37 @@ class RawDataStorage:
             self.logger.error(f"Excel parsing failed: {str(e)}")
             raise ValueError(f"Failed to parse Excel file: {str(e)}")
     
-    def _parse_csv_file(self, file_content: bytes, filename: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    def _parse_csv_file(
+        self,
+        file_content: FileSource,
+        filename: str,
+        detection: Optional[DetectionResult] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """Parse CSV file and extract all data."""
         try:
-            # Try different encodings
-            for encoding in ['utf-8', 'latin1', 'cp1252']:
-                try:
-                    content_str = file_content.decode(encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
+            if detection is not None and detection.encoding and detection.delimiter:
+                # Guessed from the upload prefix during detection
+                encoding, delimiter = detection.encoding, detection.delimiter
             else:
-                raise ValueError("Could not decode CSV file with any common encoding")
-            
-            # Detect delimiter
-            import csv
-            sniffer = csv.Sniffer()
-            delimiter = sniffer.sniff(content_str[:1024]).delimiter
+                # Try different encodings (decoded incrementally, no full copy in memory)
+                encoding = detect_text_encoding(file_content, ['utf-8', 'latin1', 'cp1252'])
+                if encoding is None:
+                    raise ValueError("Could not decode CSV file with any common encoding")
+                
+                # Detect delimiter
+                import csv
+                sniffer = csv.Sniffer()
+                sample = read_prefix(file_content, 4096).decode(encoding, errors='ignore')
+                delimiter = sniffer.sniff(sample[:1024]).delimiter
             
             # Parse CSV
-            df = pd.read_csv(BytesIO(file_content), delimiter=delimiter, header=None, encoding=encoding)
+            df = pd.read_csv(
+                pandas_input(file_content),
+                delimiter=delimiter,
+                header=None,
+                encoding=encoding,
+                encoding_errors="replace"  # The encoding may be a prefix guess
+            )
             
             # Convert to list of lists
             csv_rows = []
@@ -202,7 +217,7 @@ class RawDataStorage:
             self.logger.error(f"CSV parsing failed: {str(e)}")
             raise ValueError(f"Failed to parse CSV file: {str(e)}")
     
-    def _parse_pdf_file(self, file_content: bytes, filename: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    def _parse_pdf_file(self, file_content: FileSource, filename: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """Parse PDF file - placeholder for now."""
         # This would integrate with DoclingProcessor
         raise NotImplementedError("PDF parsing not yet implemented in raw storage phase")
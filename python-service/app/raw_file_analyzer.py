@@ -1,21 +1,32 @@
 import logging
 import pandas as pd
-import io
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Tuple
-from openpyxl import load_workbook
+from typing import Dict, List, Any, Optional, Tuple, Union
 from .models import RawFileStructure, RawAnalysisResult, FileType
-from .gpt5_column_analyzer import GPT5ColumnAnalyzer
+from .gpt5_column_analyzer import RAW_ANALYSIS, get_shared_analyzer
+from .ingest import FileSource
+from .ingest_context import CSV_FRAME, IngestContext
+from .layout_cache import get_layout_cache, layout_fingerprint
+from .sheet_triage import SheetProfile, rank_sheet_names
 
 logger = logging.getLogger(__name__)
 
+
+def _is_llm_analysis(analysis: RawAnalysisResult) -> bool:
+    """False for the analyzer's own generic fallback, which the local fallback beats"""
+    return not analysis.processing_hints.get("fallback_mode")
+
 class RawFileAnalyzer:
     """GPT-5 powered raw file analysis for intelligent pre-processing"""
     
-    def __init__(self):
+    def __init__(self, processing_pool=None):
         """Initialize raw file analyzer with GPT-5"""
+        # Optional ProcessingPool used to keep preview parsing off the event loop
+        self.processing_pool = processing_pool
+        # Analyses of known layouts, reused without asking GPT-5 again
+        self.layout_cache = get_layout_cache()
         try:
-            self.gpt5_analyzer = GPT5ColumnAnalyzer()
+            self.gpt5_analyzer = get_shared_analyzer()
             logger.info("Raw File Analyzer initialized with GPT-5")
         except Exception as e:
             logger.warning(f"GPT-5 initialization failed: {str(e)}")
@@ -23,7 +34,7 @@ class RawFileAnalyzer:
     
     async def analyze_raw_file_structure(
         self, 
-        file_content: bytes, 
+        file_content: FileSource, 
         file_type: FileType, 
         filename: str
     ) -> RawAnalysisResult:
@@ -38,10 +49,9 @@ class RawFileAnalyzer:
         - German accounting patterns
         """
         try:
-            if file_type == FileType.XLSX:
-                return await self._analyze_excel_structure(file_content, filename)
-            elif file_type == FileType.CSV:
-                return await self._analyze_csv_structure(file_content, filename)
+            if file_type in (FileType.XLSX, FileType.CSV):
+                context = await self._ingest_context(file_content, file_type, filename)
+                return await self._analyze_known_layout(context, filename)
             else:
                 # For PDF files, return basic structure
                 return RawAnalysisResult(
@@ -60,84 +70,79 @@ class RawFileAnalyzer:
                 analysis_confidence=0.0
             )
     
-    async def _analyze_excel_structure(self, file_content: bytes, filename: str) -> RawAnalysisResult:
+    async def _ingest_context(
+        self,
+        file_content: Union[FileSource, IngestContext],
+        file_type: FileType,
+        filename: str
+    ) -> IngestContext:
+        """The request's IngestContext, parsing the source once (in the pool if available)"""
+        if isinstance(file_content, IngestContext):
+            return file_content
+        if self.processing_pool:
+            return await self.processing_pool.run("tabular_ingest", file_content, file_type.value, filename)
+        return IngestContext.load(file_content, file_type.value, filename)
+    
+    async def _analyze_known_layout(self, context: IngestContext, filename: str) -> RawAnalysisResult:
+        """Stored analysis of a known layout, else a fresh analysis (kept when it came from GPT-5)"""
+        fingerprint = layout_fingerprint(context)
+        if context.file_type == "xlsx":
+            content_preview = list(self.collect_excel_previews(context)[1].values())
+        else:
+            content_preview = [self.collect_csv_preview(context)[1]]
+        
+        known = await self.layout_cache.lookup(fingerprint, content_preview)
+        if known is not None:
+            return known
+        
+        if context.file_type == "xlsx":
+            analysis = await self._analyze_excel_structure(context, filename)
+        else:
+            analysis = await self._analyze_csv_structure(context, filename)
+        if self.gpt5_analyzer and _is_llm_analysis(analysis):
+            await self.layout_cache.store(fingerprint, context.file_type, analysis)
+        analysis.processing_hints["layout_fingerprint"] = fingerprint
+        return analysis
+    
+    async def _analyze_excel_structure(self, context: IngestContext, filename: str) -> RawAnalysisResult:
         """Analyze Excel file structure using GPT-5"""
         try:
-            # Load workbook to get sheet names and sample content
-            workbook = load_workbook(io.BytesIO(file_content), read_only=True)
-            sheet_names = workbook.sheetnames
-            
-            # Get preview of each sheet (first 20 rows)
-            sheet_previews = {}
-            for sheet_name in sheet_names[:5]:  # Limit to first 5 sheets
-                try:
-                    df_preview = pd.read_excel(
-                        io.BytesIO(file_content),
-                        sheet_name=sheet_name,
-                        header=None,
-                        nrows=20
-                    )
-                    # Convert to string representation for GPT-5 analysis
-                    preview_text = self._dataframe_to_preview_text(df_preview, sheet_name)
-                    sheet_previews[sheet_name] = preview_text
-                except Exception as e:
-                    logger.warning(f"Could not preview sheet {sheet_name}: {str(e)}")
-                    continue
+            sheet_names, sheet_previews = self.collect_excel_previews(context)
             
-            workbook.close()
-            
-            # Use GPT-5 to analyze sheet structure
+            # Use GPT-5 to analyze sheet structure, hedged by the fallback within the latency budget
             if self.gpt5_analyzer:
-                analysis = await self.gpt5_analyzer.analyze_raw_excel_structure(
-                    sheet_names, sheet_previews, filename
+                return await self.gpt5_analyzer.scheduler.hedged(
+                    RAW_ANALYSIS,
+                    self.gpt5_analyzer.analyze_raw_excel_structure(
+                        sheet_names, sheet_previews, filename,
+                        sheet_frames={name: context.previews[name] for name in sheet_previews}
+                    ),
+                    lambda: self._fallback_excel_analysis(sheet_names, sheet_previews, context.sheet_profiles),
+                    accept=_is_llm_analysis
                 )
-                return analysis
             else:
                 # Fallback analysis without GPT-5
-                return await self._fallback_excel_analysis(sheet_names, sheet_previews)
+                return await self._fallback_excel_analysis(sheet_names, sheet_previews, context.sheet_profiles)
                 
         except Exception as e:
             logger.error(f"Excel structure analysis failed: {str(e)}")
             raise
     
-    async def _analyze_csv_structure(self, file_content: bytes, filename: str) -> RawAnalysisResult:
+    async def _analyze_csv_structure(self, context: IngestContext, filename: str) -> RawAnalysisResult:
         """Analyze CSV file structure using GPT-5"""
         try:
-            # Get first 50 lines for analysis
-            text_content = file_content.decode('utf-8', errors='ignore')
-            lines = text_content.split('\n')[:50]
-            
-            # Try different CSV delimiters
-            delimiter_candidates = [',', ';', '\t', '|']
-            best_delimiter = ','
-            max_columns = 0
+            lines, preview_text, best_delimiter = self.collect_csv_preview(context)
             
-            for delim in delimiter_candidates:
-                try:
-                    df_test = pd.read_csv(io.StringIO('\n'.join(lines[:10])), 
-                                        sep=delim, header=None)
-                    if len(df_test.columns) > max_columns:
-                        max_columns = len(df_test.columns)
-                        best_delimiter = delim
-                except:
-                    continue
-            
-            # Create preview with best delimiter
-            preview_df = pd.read_csv(
-                io.StringIO('\n'.join(lines)),
-                sep=best_delimiter,
-                header=None,
-                nrows=30
-            )
-            
-            preview_text = self._dataframe_to_preview_text(preview_df, "CSV Data")
-            
-            # Use GPT-5 to analyze CSV structure
+            # Use GPT-5 to analyze CSV structure, hedged by the fallback within the latency budget
             if self.gpt5_analyzer:
-                analysis = await self.gpt5_analyzer.analyze_raw_csv_structure(
-                    lines, preview_text, filename, best_delimiter
+                return await self.gpt5_analyzer.scheduler.hedged(
+                    RAW_ANALYSIS,
+                    self.gpt5_analyzer.analyze_raw_csv_structure(
+                        lines, preview_text, filename, best_delimiter, frame=context.previews[CSV_FRAME]
+                    ),
+                    lambda: self._fallback_csv_analysis(lines, best_delimiter),
+                    accept=_is_llm_analysis
                 )
-                return analysis
             else:
                 # Fallback analysis without GPT-5
                 return await self._fallback_csv_analysis(lines, best_delimiter)
@@ -146,6 +151,21 @@ class RawFileAnalyzer:
             logger.error(f"CSV structure analysis failed: {str(e)}")
             raise
     
+    def collect_excel_previews(self, context: IngestContext) -> Tuple[List[str], Dict[str, str]]:
+        """Sheet names and a 20 row text preview per previewed sheet, best ranked sheet first"""
+        sheet_previews = {}
+        for sheet_name, frame in list(context.previews.items())[:5]:  # Limit to 5 sheets
+            # Convert to string representation for GPT-5 analysis
+            sheet_previews[sheet_name] = self._dataframe_to_preview_text(frame.head(20), sheet_name)
+        
+        return context.sheet_names, sheet_previews
+    
+    def collect_csv_preview(self, context: IngestContext) -> Tuple[List[str], str, str]:
+        """First lines, a text preview and the delimiter of a CSV file, from the ingest context"""
+        preview_df = context.previews[CSV_FRAME].head(30)
+        preview_text = self._dataframe_to_preview_text(preview_df, CSV_FRAME)
+        return context.head_lines, preview_text, context.delimiter
+    
     def _dataframe_to_preview_text(self, df: pd.DataFrame, sheet_name: str) -> str:
         """Convert DataFrame to text preview for GPT-5 analysis"""
         preview_lines = [f"=== {sheet_name} ==="]
@@ -163,17 +183,16 @@ class RawFileAnalyzer:
         
         return '\n'.join(preview_lines)
     
-    async def _fallback_excel_analysis(self, sheet_names: List[str], sheet_previews: Dict[str, str]) -> RawAnalysisResult:
+    async def _fallback_excel_analysis(
+        self,
+        sheet_names: List[str],
+        sheet_previews: Dict[str, str],
+        sheet_profiles: Optional[List[SheetProfile]] = None
+    ) -> RawAnalysisResult:
         """Fallback Excel analysis without GPT-5"""
-        # Simple heuristics for sheet selection
-        preferred_sheet = sheet_names[0]  # Default to first sheet
-        
-        # Look for sheets with common accounting names
-        accounting_keywords = ['tb', 'trial', 'balance', 'saldo', 'bwa', 'bilanz']
-        for sheet_name in sheet_names:
-            if any(keyword in sheet_name.lower() for keyword in accounting_keywords):
-                preferred_sheet = sheet_name
-                break
+        # Sheet triage ranks by name, used range, hidden state and header keywords
+        sheet_profiles = sheet_profiles or rank_sheet_names(sheet_names)
+        preferred_sheet = sheet_profiles[0].name
         
         return RawAnalysisResult(
             file_structure=RawFileStructure(
@@ -188,7 +207,8 @@ class RawFileAnalyzer:
             content_preview=list(sheet_previews.values())[:3],
             processing_hints={
                 "fallback_mode": True,
-                "recommended_sheet": preferred_sheet
+                "recommended_sheet": preferred_sheet,
+                "sheet_scores": {profile.name: profile.score for profile in sheet_profiles}
             },
             analysis_confidence=0.6
         )
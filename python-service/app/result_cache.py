@@ -0,0 +1,238 @@
+"""
+Result Cache Module
+
+Content-addressed cache for /process-file results. Entries are the serialized
+response body (ProcessingResponse JSON, or Arrow/Parquet bytes), keyed by the
+upload's sha256 plus the parameters that change the output. An in-memory LRU with a byte budget sits in front of an
+optional on-disk store, and concurrent identical requests share one in-flight
+computation instead of each running the pipeline. Entries expire after a
+maximum age, and results built while an LLM call fell back to its heuristic
+answer are returned but not stored, so the next upload gets another chance at
+the LLM result.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+from .llm_scheduler import track_fallbacks
+from .metrics import RESULT_CACHE_BYTES, RESULT_CACHE_REQUESTS
+from .utils.env import env_bool, env_float, env_int
+from .utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Bump when pipeline changes alter the output for the same input
+RESULT_CACHE_VERSION = "2"
+
+# Cache outcomes, also returned to clients in the X-Result-Cache header
+HIT = "hit"
+MISS = "miss"
+COALESCED = "coalesced"
+
+
+def result_cache_key(
+    file_sha256: str,
+    entity_uuid: str,
+    source_system_hint: Optional[str] = None,
+    output_format: str = "json",
+    generation: str = ""
+) -> str:
+    """
+    Cache key for one upload and the parameters that affect its serialized result;
+    generation changes when stored state the result depends on (column mappings) changes
+    """
+    material = "\x1f".join([
+        RESULT_CACHE_VERSION, file_sha256, entity_uuid, source_system_hint or "", output_format, generation
+    ])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class ResultCache:
+    """LRU cache of serialized results with a byte budget and optional disk persistence"""
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: Optional[int] = None,
+        enabled: Optional[bool] = None,
+        max_age_seconds: Optional[float] = None
+    ):
+        """
+        Configuration (environment):
+        - RESULT_CACHE_ENABLED: cache /process-file results (default: true)
+        - RESULT_CACHE_MAX_BYTES: in-memory budget (default: 256 MiB)
+        - RESULT_CACHE_DIR: persist entries to this directory (default: memory only)
+        - RESULT_CACHE_DISK_MAX_BYTES: on-disk budget, oldest entries pruned first (default: 2 GiB)
+        - RESULT_CACHE_MAX_AGE_SECONDS: entries older than this are recomputed (default: 1 hour)
+        """
+        self.enabled = env_bool('RESULT_CACHE_ENABLED', True) if enabled is None else enabled
+        self.max_bytes = max_bytes if max_bytes is not None else env_int('RESULT_CACHE_MAX_BYTES', 256 * 1024 ** 2)
+        self.disk_dir = disk_dir if disk_dir is not None else os.getenv('RESULT_CACHE_DIR') or None
+        self.disk_max_bytes = (
+            disk_max_bytes if disk_max_bytes is not None
+            else env_int('RESULT_CACHE_DISK_MAX_BYTES', 2 * 1024 ** 3)
+        )
+        self.max_age_seconds = (
+            max_age_seconds if max_age_seconds is not None
+            else env_float('RESULT_CACHE_MAX_AGE_SECONDS', 3600.0)
+        )
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        # key -> (value, stored_at wall-clock time)
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._size = 0
+        self._single_flight: SingleFlight[Tuple[bytes, str]] = SingleFlight()
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[bytes]]) -> Tuple[bytes, str]:
+        """
+        Cached value for key, or the result of compute() stored under it.
+        Returns (value, outcome) with outcome one of hit, miss or coalesced.
+        Failures are not cached; every waiter of a failed computation gets the error.
+        """
+        if not self.enabled:
+            return await compute(), MISS
+
+        value = self._get_memory(key)
+        if value is not None:
+            RESULT_CACHE_REQUESTS.labels(outcome=HIT).inc()
+            return value, HIT
+
+        # A client disconnecting (even the first one) does not cancel the shared computation
+        (value, outcome), joined = await self._single_flight.run(key, lambda: self._compute(key, compute))
+        if joined:
+            RESULT_CACHE_REQUESTS.labels(outcome=COALESCED).inc()
+            return value, COALESCED
+        return value, outcome
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[bytes]]) -> Tuple[bytes, str]:
+        value = await self._load_disk(key)
+        outcome = HIT if value is not None else MISS
+        if value is None:
+            with track_fallbacks() as fallbacks:
+                value = await compute()
+            if fallbacks:
+                logger.info(f"Result {key[:12]} used LLM fallbacks ({', '.join(sorted(set(fallbacks)))}), not cached")
+            else:
+                await self.put(key, value)
+        RESULT_CACHE_REQUESTS.labels(outcome=outcome).inc()
+        return value, outcome
+
+    async def put(self, key: str, value: bytes):
+        stored_at = time.time()
+        self._store(key, value, stored_at)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, value, stored_at)
+
+    def _expired(self, stored_at: float) -> bool:
+        return time.time() - stored_at > self.max_age_seconds
+
+    def _get_memory(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        if self._expired(stored_at):
+            del self._entries[key]
+            self._size -= len(value)
+            RESULT_CACHE_BYTES.set(self._size)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def _load_disk(self, key: str) -> Optional[bytes]:
+        """Promote a persisted entry into memory"""
+        if not self.disk_dir:
+            return None
+        entry = await asyncio.to_thread(self._read_disk, key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        self._store(key, value, stored_at)
+        return value
+
+    def _store(self, key: str, value: bytes, stored_at: float):
+        if len(value) > self.max_bytes:
+            logger.info(f"Result of {len(value)} bytes exceeds the cache budget, not kept in memory")
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous[0])
+        self._entries[key] = (value, stored_at)
+        self._size += len(value)
+        while self._size > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+        RESULT_CACHE_BYTES.set(self._size)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Persisted (value, stored_at); the file starts with a stored_at line because mtime tracks last use"""
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as handle:
+                stored_at = float(handle.readline())
+                value = handle.read()
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning(f"Discarding unreadable cached result {key[:12]}")
+            stored_at = 0.0
+        if self._expired(stored_at):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            return None
+        # Touch so disk pruning keeps recently used entries
+        os.utime(path)
+        return value, stored_at
+
+    def _write_disk(self, key: str, value: bytes, stored_at: float):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as handle:
+                handle.write(f"{stored_at!r}\n".encode())
+                handle.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not persist cached result {key[:12]}: {str(e)}")
+            return
+        self._prune_disk()
+
+    def _prune_disk(self):
+        """Delete least recently used files until the disk budget is met"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.disk_max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            if total <= self.disk_max_bytes:
+                break
+        logger.info(f"Pruned result cache directory to {total} bytes")
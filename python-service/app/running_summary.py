@@ -0,0 +1,34 @@
+"""
+Running Summary Module
+
+Validation results and quality report of a row stream, built as rows pass by
+so the NDJSON trailer does not need the streamed rows kept in memory. It feeds
+the same accumulators DataValidator.validate_trial_balance_data and
+PandasAnalyzer.generate_quality_report run over a whole result.
+"""
+
+from .models import ProcessedTrialBalanceRow, QualityReport, ValidationResult
+from .pandas_analyzer import QualityAccumulator
+from .utils.validator import DataValidator
+
+
+class RunningSummary:
+    """Accumulates what the trailer reports about streamed rows, one row at a time"""
+
+    def __init__(self, validator: DataValidator):
+        self.validation = validator.accumulator()
+        self.quality = QualityAccumulator()
+
+    def __len__(self) -> int:
+        return self.quality.total_records
+
+    def add(self, row: ProcessedTrialBalanceRow):
+        record = dict(row)
+        self.validation.add(record)
+        self.quality.add(record)
+
+    def validation_result(self) -> ValidationResult:
+        return self.validation.result()
+
+    def quality_report(self) -> QualityReport:
+        return self.quality.report()
@@ -0,0 +1,212 @@
+"""
+Sheet Triage Module
+
+Ranks the sheets of a workbook by how likely they hold the trial balance,
+using only metadata: sheet name keywords, the used range from the sheet's
+<dimension> element, the hidden state, ZIP member sizes and accounting
+keywords among the strings of the first rows. Each sheet costs a small
+decompressed prefix of its XML scanned with regular expressions; cells are
+never parsed into values. Only the top ranked sheet is parsed in full later.
+"""
+
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from .xlsx_stream import XlsxArchive, column_index
+
+logger = logging.getLogger(__name__)
+
+# Priority keywords for German accounting sheet names
+NAME_KEYWORDS = [
+    'summen', 'saldi', 'salden', 'susa', 'trial', 'balance', 'tb', 'guv', 'bwa',
+    'bilanz', 'konto', 'saldo', 'soll', 'haben'
+]
+
+# Column headings of trial balance exports
+HEADER_KEYWORDS = [
+    'konto', 'account', 'bezeichnung', 'beschriftung', 'description', 'saldo',
+    'soll', 'haben', 'debit', 'credit', 'balance', 'eb-wert', 'vortrag'
+]
+
+# Decompressed bytes of each sheet XML inspected for <dimension> and header cells
+SHEET_PREFIX_BYTES = 32 * 1024
+
+# Leading rows whose strings are checked for header keywords
+HEADER_ROWS = 15
+
+# Shared strings beyond this index are not looked up for triage
+MAX_SHARED_STRING_INDEX = 5000
+
+# Longer strings are values rather than column headings
+MAX_HEADER_LENGTH = 40
+
+_DIMENSION = re.compile(rb'<(?:\w+:)?dimension\s+ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"')
+_ROW_START = re.compile(rb'<(?:\w+:)?row[\s>]')
+_SHARED_STRING_CELL = re.compile(rb'<(?:\w+:)?c\s[^>]*\bt="s"[^>]*>\s*<(?:\w+:)?v>(\d+)<')
+_INLINE_STRING_CELL = re.compile(
+    rb'<(?:\w+:)?c\s[^>]*\bt="inlineStr"[^>]*>\s*<(?:\w+:)?is>\s*<(?:\w+:)?t(?:\s[^>]*)?>([^<]*)<'
+)
+
+# Average uncompressed XML bytes per cell, to estimate the used range without <dimension>
+BYTES_PER_CELL = 40
+
+
+@dataclass
+class SheetProfile:
+    """Metadata of one sheet and its triage score"""
+    name: str
+    state: str = "visible"
+    rows: Optional[int] = None
+    columns: Optional[int] = None
+    compressed_size: int = 0
+    uncompressed_size: int = 0
+    name_keyword: Optional[str] = None
+    header_keywords: List[str] = field(default_factory=list)
+    score: float = 0.0
+
+    @property
+    def estimated_cells(self) -> int:
+        if self.rows is not None and self.columns is not None:
+            return self.rows * self.columns
+        return self.uncompressed_size // BYTES_PER_CELL
+
+
+def name_keyword(sheet_name: str) -> Optional[str]:
+    """First priority keyword contained in a sheet name"""
+    lowered = sheet_name.lower()
+    for keyword in NAME_KEYWORDS:
+        if keyword in lowered:
+            return keyword
+    return None
+
+
+def score_sheet(profile: SheetProfile) -> float:
+    """Higher is more likely the trial balance"""
+    score = 0.0
+    if profile.name_keyword:
+        score += 3.0
+    score += min(len(profile.header_keywords), 4)
+    if profile.state != "visible":
+        score -= 5.0
+    cells = profile.estimated_cells
+    if cells <= 1:
+        # Empty or a single note cell
+        score -= 3.0
+    else:
+        # 100 cells -> +1, 10k cells and more -> +2
+        score += min(2.0, math.log10(cells) / 2)
+    return score
+
+
+def keyword_priority(profile: SheetProfile) -> int:
+    """Position of the sheet's name keyword in NAME_KEYWORDS; sheets without one come last"""
+    if profile.name_keyword is None:
+        return len(NAME_KEYWORDS)
+    return NAME_KEYWORDS.index(profile.name_keyword)
+
+
+def rank(profiles: List[SheetProfile]) -> List[SheetProfile]:
+    """
+    Profiles scored and sorted best first. Ties go to the higher priority name
+    keyword ('summen' before 'konto'), then keep workbook order.
+    """
+    for profile in profiles:
+        profile.score = round(score_sheet(profile), 3)
+    return sorted(profiles, key=lambda profile: (-profile.score, keyword_priority(profile)))
+
+
+def rank_sheet_names(sheet_names: List[str]) -> List[SheetProfile]:
+    """
+    Name-only ranking, for workbooks that cannot be inspected (e.g. legacy .xls).
+    All sheets score alike apart from their name keyword, so the best sheet is the
+    first one with the highest priority keyword, or the first sheet if none has one.
+    """
+    return rank([SheetProfile(name=name, name_keyword=name_keyword(name)) for name in sheet_names])
+
+
+def _read_prefix(archive: XlsxArchive, path: str) -> bytes:
+    with archive.zip.open(path) as handle:
+        return handle.read(SHEET_PREFIX_BYTES)
+
+
+def _dimension(prefix: bytes) -> Tuple[Optional[int], Optional[int]]:
+    """Rows and columns of the used range declared by <dimension ref="A1:J500">"""
+    match = _DIMENSION.search(prefix)
+    if not match:
+        return None, None
+    first_column, first_row, last_column, last_row = match.groups()
+    if last_column is None:
+        # A single cell reference - "A1" is also what writers emit for empty sheets
+        return 1, 1
+    rows = int(last_row) - int(first_row) + 1
+    columns = column_index(last_column.decode()) - column_index(first_column.decode()) + 1
+    return rows, columns
+
+
+def _header_strings(archive: XlsxArchive, prefix: bytes) -> List[str]:
+    """
+    Strings in the first HEADER_ROWS rows: shared strings looked up by index (Excel),
+    inline strings taken from the raw XML (openpyxl and other writers)
+    """
+    starts = [match.start() for match in _ROW_START.finditer(prefix)]
+    if not starts:
+        return []
+    end = starts[HEADER_ROWS] if len(starts) > HEADER_ROWS else len(prefix)
+
+    strings = [
+        match.group(1).decode('utf-8', errors='replace')
+        for match in _INLINE_STRING_CELL.finditer(prefix, starts[0], end)
+    ]
+    indexes = sorted({int(match.group(1)) for match in _SHARED_STRING_CELL.finditer(prefix, starts[0], end)})
+    for index in indexes:
+        if index > MAX_SHARED_STRING_INDEX:
+            break
+        try:
+            strings.append(archive.shared_string(index))
+        except IndexError:
+            break
+    return strings
+
+
+def header_keywords(strings: List[str]) -> List[str]:
+    """Accounting column keywords found in short strings, in order of appearance"""
+    found = []
+    for text in strings:
+        text = text.strip().lower()
+        if not text or len(text) > MAX_HEADER_LENGTH:
+            continue
+        for keyword in HEADER_KEYWORDS:
+            if keyword in text and keyword not in found:
+                found.append(keyword)
+    return found
+
+
+def profile_sheets(archive: XlsxArchive) -> List[SheetProfile]:
+    """Metadata profile of every sheet of an open workbook, in workbook order"""
+    profiles = []
+    for sheet in archive.sheets:
+        profile = SheetProfile(name=sheet.name, state=sheet.state, name_keyword=name_keyword(sheet.name))
+        try:
+            info = archive.zip.getinfo(sheet.path)
+            profile.compressed_size = info.compress_size
+            profile.uncompressed_size = info.file_size
+            prefix = _read_prefix(archive, sheet.path)
+            profile.rows, profile.columns = _dimension(prefix)
+            profile.header_keywords = header_keywords(_header_strings(archive, prefix))
+        except KeyError:
+            # Chart sheets and dialog sheets have no worksheet part
+            logger.debug(f"No worksheet part for sheet {sheet.name}")
+        profiles.append(profile)
+    return profiles
+
+
+def triage_workbook(archive: XlsxArchive) -> List[SheetProfile]:
+    """Sheets of an open workbook ranked best first"""
+    ranked = rank(profile_sheets(archive))
+    logger.info(
+        "Sheet triage: " + ", ".join(f"{profile.name}={profile.score}" for profile in ranked)
+    )
+    return ranked
@@ -0,0 +1,164 @@
+"""
+Spreadsheet Reader Module
+
+Pluggable engines for reading raw (header=None) sheet values into pandas:
+
+- calamine: Rust-backed XLSX reader (python-calamine), values only - the default
+- openpyxl: openpyxl in read-only streaming mode - the fallback when calamine
+  is not installed or cannot read a workbook
+- pyarrow: multithreaded pyarrow CSV parser, for CSV uploads
+
+The engine is chosen per call, defaulting to EXCEL_READER_ENGINE and
+CSV_READER_ENGINE. scripts/benchmark_spreadsheet_readers.py compares speed
+and peak memory of the engines.
+"""
+
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+from .ingest import FileSource, pandas_input
+
+logger = logging.getLogger(__name__)
+
+CALAMINE = "calamine"
+OPENPYXL = "openpyxl"
+PYARROW = "pyarrow"
+# pandas' own C parser
+PANDAS_C = "c"
+
+EXCEL_ENGINES = (CALAMINE, OPENPYXL)
+CSV_ENGINES = (PYARROW, PANDAS_C)
+
+
+def _calamine_available() -> bool:
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+CALAMINE_AVAILABLE = _calamine_available()
+
+
+def resolve_excel_engine(engine: Optional[str] = None) -> str:
+    """Requested engine, else EXCEL_READER_ENGINE (default: calamine when installed)"""
+    engine = engine or os.getenv('EXCEL_READER_ENGINE') or CALAMINE
+    if engine not in EXCEL_ENGINES:
+        raise ValueError(f"Unknown Excel reader engine: {engine} (expected one of {', '.join(EXCEL_ENGINES)})")
+    if engine == CALAMINE and not CALAMINE_AVAILABLE:
+        logger.warning("python-calamine is not installed, reading Excel files with openpyxl")
+        return OPENPYXL
+    return engine
+
+
+def resolve_csv_engine(engine: Optional[str] = None) -> str:
+    """Requested engine, else CSV_READER_ENGINE (default: pyarrow)"""
+    engine = engine or os.getenv('CSV_READER_ENGINE') or PYARROW
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV reader engine: {engine} (expected one of {', '.join(CSV_ENGINES)})")
+    return engine
+
+
+def _parse_sheets(excel_file: pd.ExcelFile, sheet_names: List[str]) -> Dict[str, pd.DataFrame]:
+    frames = {}
+    for sheet_name in sheet_names:
+        try:
+            frames[sheet_name] = excel_file.parse(
+                sheet_name,
+                header=None,  # Header row is detected later
+                dtype_backend="pyarrow"
+            )
+        except Exception as e:
+            logger.warning(f"Could not parse sheet {sheet_name}: {str(e)}")
+    return frames
+
+
+def _read_with_engine(
+    source: FileSource,
+    engine: str,
+    sheet_names: Optional[List[str]],
+    max_sheets: Optional[int]
+) -> Tuple[List[str], Dict[str, pd.DataFrame]]:
+    with pd.ExcelFile(pandas_input(source), engine=engine) as excel_file:
+        all_sheets = [str(name) for name in excel_file.sheet_names]
+        selected = sheet_names if sheet_names is not None else all_sheets[:max_sheets]
+        return all_sheets, _parse_sheets(excel_file, selected)
+
+
+def read_excel_sheets(
+    source: FileSource,
+    sheet_names: Optional[List[str]] = None,
+    max_sheets: Optional[int] = None,
+    engine: Optional[str] = None
+) -> Tuple[List[str], Dict[str, pd.DataFrame]]:
+    """
+    Open a workbook once and parse raw frames for the given sheets (default: the first
+    max_sheets, or all). Returns (all sheet names, frames by sheet name).
+    Falls back to openpyxl if calamine cannot read the workbook.
+    """
+    engine = resolve_excel_engine(engine)
+    try:
+        return _read_with_engine(source, engine, sheet_names, max_sheets)
+    except Exception as e:
+        if engine == OPENPYXL:
+            raise
+        logger.warning(f"{engine} could not read workbook ({str(e)}), falling back to openpyxl")
+        return _read_with_engine(source, OPENPYXL, sheet_names, max_sheets)
+
+
+def _read_csv_with_engine(source: FileSource, delimiter: str, encoding: str, engine: str) -> pd.DataFrame:
+    return pd.read_csv(
+        pandas_input(source),
+        engine=engine,
+        delimiter=delimiter,
+        dtype_backend="pyarrow",
+        header=None,  # Header row is detected later
+        encoding=encoding,
+        encoding_errors="replace",  # Encoding was guessed from a sample
+        skip_blank_lines=True
+    )
+
+
+def _binary_columns(frame: pd.DataFrame) -> List[int]:
+    return [
+        position for position, dtype in enumerate(frame.dtypes)
+        if isinstance(dtype, pd.ArrowDtype) and (
+            pa.types.is_binary(dtype.pyarrow_dtype) or pa.types.is_large_binary(dtype.pyarrow_dtype)
+        )
+    ]
+
+
+def read_csv_frame(
+    source: FileSource,
+    delimiter: str,
+    encoding: str,
+    engine: Optional[str] = None,
+    encoding_guessed: bool = False
+) -> pd.DataFrame:
+    """
+    Raw frame (header=None) of a CSV file. pyarrow rejects ragged rows (e.g. short
+    summary lines in exports), those files are re-read with pandas' C parser.
+    pyarrow also ignores encoding_errors and returns columns holding bytes the
+    encoding cannot decode as binary, so a guessed encoding (not checked against
+    the whole file) is read with the C parser, which replaces such bytes.
+    """
+    engine = resolve_csv_engine(engine)
+    if engine == PYARROW and encoding_guessed:
+        engine = PANDAS_C
+    try:
+        frame = _read_csv_with_engine(source, delimiter, encoding, engine)
+    except Exception as e:
+        if engine == PANDAS_C:
+            raise
+        logger.info(f"{engine} could not parse CSV ({str(e)}), falling back to the C parser")
+        return _read_csv_with_engine(source, delimiter, encoding, PANDAS_C)
+    binary = _binary_columns(frame)
+    if binary:
+        logger.warning(f"Columns {binary} are not valid {encoding}, re-reading the CSV with the C parser")
+        return _read_csv_with_engine(source, delimiter, encoding, PANDAS_C)
+    return frame
@@ -0,0 +1,50 @@
+import os
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    """Read an integer setting from the environment"""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Invalid integer for {name}: '{value}', using default {default}")
+        return default
+
+
+def env_float(name: str, default: Optional[float] = None) -> Optional[float]:
+    """Read a float setting from the environment"""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"Invalid number for {name}: '{value}', using default {default}")
+        return default
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    """Read a boolean setting from the environment (true/false, 1/0, yes/no)"""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_mapping(name: str) -> Dict[str, str]:
+    """Read a comma separated key=value setting, e.g. 'pdf_parse=process,tabular_parse=thread'"""
+    value = os.getenv(name, '')
+    mapping = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        key, _, val = item.partition('=')
+        if key.strip() and val.strip():
+            mapping[key.strip()] = val.strip()
+    return mapping
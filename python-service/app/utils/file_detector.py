@@ -1,12 +1,63 @@
+import asyncio
 import magic
 import logging
-from typing import Optional
+import re
+import threading
+import zipfile
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from ..ingest import FileSource, open_source, read_prefix, source_size
+from ..ingest_context import HEAD_LINES, detect_csv_delimiter
+from .env import env_int
 
 logger = logging.getLogger(__name__)
 
+# Leading bytes of an upload that detection looks at - never the whole file
+DETECTION_PREFIX_BYTES = 64 * 1024
+
+# Container/compression signatures
+COMPRESSION_SIGNATURES = {
+    b'PK\x03\x04': 'zip',
+    b'\x1f\x8b': 'gzip',
+    b'BZh': 'bz2',
+    b'\xfd7zXZ\x00': 'xz',
+}
+
+# libmagic handle shared by all detections; opening one loads the magic database
+_magic = None
+_magic_lock = threading.Lock()
+
+
+def _magic_handle() -> magic.Magic:
+    global _magic
+    if _magic is None:
+        with _magic_lock:
+            if _magic is None:
+                _magic = magic.Magic(mime=True)
+    return _magic
+
+
+@dataclass
+class DetectionResult:
+    """What detection learned about an upload, reused by later stages instead of re-sniffing"""
+    file_type: str
+    encoding: Optional[str] = None      # CSV only, guessed from the prefix; None if it is plain ASCII
+    delimiter: Optional[str] = None     # CSV only
+    compression: Optional[str] = None   # Container format of the bytes, e.g. zip for XLSX
+    sheet_count: Optional[int] = None   # XLSX only
+    # Type suggested by each detection method that ran
+    signals: Dict[str, Optional[str]] = field(default_factory=dict)
+
+
 class FileDetector:
-    def __init__(self):
-        """Initialize file detector with magic library"""
+    def __init__(self, prefix_bytes: Optional[int] = None):
+        """
+        Initialize file detector with magic library
+
+        Configuration (environment):
+        - FILE_DETECTION_PREFIX_BYTES: bytes read from the start of an upload (default: 64 KiB)
+        """
+        self.prefix_bytes = prefix_bytes or env_int('FILE_DETECTION_PREFIX_BYTES', DETECTION_PREFIX_BYTES)
         self.mime_type_mapping = {
             'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': 'xlsx',
             'application/vnd.ms-excel': 'xls',
@@ -15,25 +66,41 @@ class FileDetector:
             'text/plain': 'csv'  # Sometimes CSV files are detected as plain text
         }
 
-    async def detect_file_type(self, file_content: bytes, filename: str) -> str:
+    async def detect_file_type(self, file_content: FileSource, filename: str) -> str:
+        """Detected file type (xlsx, csv or pdf)"""
+        return (await self.detect(file_content, filename)).file_type
+
+    async def detect(self, file_content: FileSource, filename: str) -> DetectionResult:
+        """Detect file type, encoding, delimiter, compression and sheet count from a bounded prefix"""
+        # Reading the prefix and charset detection block, so they run off the event loop
+        return await asyncio.to_thread(self.detect_sync, file_content, filename)
+
+    def detect_sync(self, file_content: FileSource, filename: str) -> DetectionResult:
         """
-        Detect file type using multiple methods:
+        Detect file type using multiple methods, stopping once two agree:
         1. File extension
-        2. Magic bytes (python-magic)
-        3. Content heuristics
+        2. Content heuristics (signatures in the prefix)
+        3. Magic bytes (python-magic), only if 1 and 2 disagree or are inconclusive
         """
         try:
+            prefix = read_prefix(file_content, self.prefix_bytes)
+            
             # Method 1: File extension
             extension_type = self._detect_from_extension(filename)
             
-            # Method 2: Magic bytes
-            magic_type = self._detect_from_magic_bytes(file_content)
-            
-            # Method 3: Content heuristics
-            heuristic_type = await self._detect_from_content_heuristics(file_content)
+            # Method 2: Content heuristics
+            heuristic_type = self._detect_from_content_heuristics(prefix)
+            signals = {"extension": extension_type, "heuristic": heuristic_type}
             
-            # Combine results with priority: magic > extension > heuristics
-            detected_type = magic_type or extension_type or heuristic_type
+            if extension_type and extension_type == heuristic_type:
+                detected_type = extension_type
+            else:
+                # Method 3: Magic bytes
+                magic_type = self._detect_from_magic_bytes(prefix)
+                signals["magic"] = magic_type
+                
+                # Combine results with priority: magic > extension > heuristics
+                detected_type = magic_type or extension_type or heuristic_type
             
             if not detected_type:
                 raise ValueError("Could not determine file type")
@@ -42,8 +109,18 @@ class FileDetector:
             if detected_type not in ['xlsx', 'csv', 'pdf']:
                 raise ValueError(f"Unsupported file type detected: {detected_type}")
             
-            logger.info(f"File type detection: extension={extension_type}, magic={magic_type}, heuristic={heuristic_type}, final={detected_type}")
-            return detected_type
+            result = DetectionResult(
+                file_type=detected_type,
+                compression=self._detect_compression(prefix),
+                signals=signals
+            )
+            if detected_type == 'csv':
+                result.encoding, result.delimiter = self._detect_text_format(prefix)
+            elif detected_type == 'xlsx':
+                result.sheet_count = self._count_sheets(file_content)
+            
+            logger.info(f"File type detection: {signals}, final={detected_type}")
+            return result
             
         except Exception as e:
             logger.error(f"Error detecting file type: {str(e)}")
@@ -65,11 +142,10 @@ class FileDetector:
         
         return extension_mapping.get(extension)
 
-    def _detect_from_magic_bytes(self, file_content: bytes) -> Optional[str]:
-        """Detect file type using python-magic (libmagic)"""
+    def _detect_from_magic_bytes(self, prefix: bytes) -> Optional[str]:
+        """Detect file type using python-magic (libmagic) on the upload prefix"""
         try:
-            # Get MIME type
-            mime_type = magic.from_buffer(file_content, mime=True)
+            mime_type = _magic_handle().from_buffer(prefix)
             detected_type = self.mime_type_mapping.get(mime_type)
             
             logger.debug(f"Magic detected MIME type: {mime_type} -> {detected_type}")
@@ -79,17 +155,21 @@ class FileDetector:
             logger.warning(f"Magic byte detection failed: {str(e)}")
             return None
 
-    async def _detect_from_content_heuristics(self, file_content: bytes) -> Optional[str]:
+    def _detect_from_content_heuristics(self, prefix: bytes) -> Optional[str]:
         """Detect file type using content heuristics"""
         try:
+            # Signatures and CSV indicators only need the first KB
+            file_content = prefix[:1024]
+            
             # Check for PDF signature
             if file_content.startswith(b'%PDF-'):
                 return 'pdf'
             
             # Check for Excel signatures
-            if (file_content.startswith(b'PK\x03\x04') or  # XLSX/ZIP signature
-                file_content.startswith(b'\xd0\xcf\x11\xe0')):  # XLS signature
+            if file_content.startswith(b'PK\x03\x04'):  # XLSX/ZIP signature
                 return 'xlsx'
+            if file_content.startswith(b'\xd0\xcf\x11\xe0'):  # Legacy XLS (OLE) signature
+                return 'xls'
             
             # Try to decode as text for CSV detection
             try:
@@ -115,16 +195,45 @@ class FileDetector:
             logger.warning(f"Content heuristic detection failed: {str(e)}")
             return None
 
-    def validate_file_size(self, file_content: bytes, max_size_mb: int = 20) -> bool:
+    def _detect_compression(self, prefix: bytes) -> Optional[str]:
+        for signature, compression in COMPRESSION_SIGNATURES.items():
+            if prefix.startswith(signature):
+                return compression
+        return None
+
+    def _detect_text_format(self, prefix: bytes):
+        """
+        Encoding and delimiter guessed from the prefix (the tail may cut a line or character).
+        The encoding is None when the prefix is plain ASCII: exports often start with an
+        ASCII header block, which says nothing about the umlauts further down.
+        """
+        import charset_normalizer
+        best = charset_normalizer.from_bytes(prefix).best()
+        encoding = best.encoding if best and best.encoding != 'ascii' else None
+        head_lines = prefix.decode(encoding or 'utf-8', errors='replace').split('\n')[:HEAD_LINES]
+        return encoding, detect_csv_delimiter(head_lines)
+
+    def _count_sheets(self, file_content: FileSource) -> Optional[int]:
+        """Sheets listed in xl/workbook.xml - reads the ZIP directory and one small member"""
+        try:
+            with open_source(file_content) as handle, zipfile.ZipFile(handle) as archive:
+                workbook = archive.read('xl/workbook.xml')
+            return len(re.findall(rb'<(?:\w+:)?sheet\b', workbook))
+        except (zipfile.BadZipFile, KeyError) as e:
+            logger.warning(f"Could not count workbook sheets: {str(e)}")
+            return None
+
+    def validate_file_size(self, file_content: FileSource, max_size_mb: int = 20) -> bool:
         """Validate file size"""
-        size_mb = len(file_content) / (1024 * 1024)
+        size_mb = source_size(file_content) / (1024 * 1024)
         if size_mb > max_size_mb:
             raise ValueError(f"File size ({size_mb:.1f}MB) exceeds maximum allowed size ({max_size_mb}MB)")
         return True
 
-    def validate_file_content(self, file_content: bytes, file_type: str) -> bool:
+    def validate_file_content(self, file_content: FileSource, file_type: str) -> bool:
         """Perform basic content validation"""
-        if not file_content:
+        file_size = source_size(file_content)
+        if not file_size:
             raise ValueError("Empty file content")
         
         # Minimum file size checks
@@ -135,7 +244,7 @@ class FileDetector:
         }
         
         min_size = min_sizes.get(file_type, 10)
-        if len(file_content) < min_size:
-            raise ValueError(f"File too small ({len(file_content)} bytes) for {file_type} format")
+        if file_size < min_size:
+            raise ValueError(f"File too small ({file_size} bytes) for {file_type} format")
         
         return True
\ No newline at end of file
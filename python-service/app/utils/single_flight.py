@@ -0,0 +1,39 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight(Generic[T]):
+    """
+    Concurrent calls for the same key share one run of the computation. The
+    computation runs as its own task and every caller (the first included) awaits
+    it shielded, so a caller being cancelled does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Result of compute() for key as (result, joined); joined is True when the call
+        awaited a computation another caller had already started
+        """
+        task = self._in_flight.get(key)
+        joined = task is not None
+        if task is None:
+            # Registered before the first await so concurrent callers coalesce onto it
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task), joined
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark retrieved so an exception nobody awaited is not logged as unhandled
+        if not task.cancelled():
+            task.exception()
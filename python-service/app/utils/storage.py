@@ -0,0 +1,30 @@
+import os
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def data_path(*parts: str) -> str:
+    """Path below the service data directory (SERVICE_DATA_DIR, default ./data), parent dirs created"""
+    path = os.path.join(os.getenv('SERVICE_DATA_DIR', 'data'), *parts)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    return path
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """Open a SQLite database for local durable state (WAL mode, autocommit, shared across threads)"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    logger.info(f"Opened SQLite store at {path}")
+    return connection
+
+
+def data_dir(*parts: str) -> str:
+    """Directory below the service data directory, created if missing"""
+    path = os.path.join(os.getenv('SERVICE_DATA_DIR', 'data'), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -1,159 +1,255 @@
 import pandas as pd
-import numpy as np
+import math
 import logging
-from typing import List, Dict, Any, Optional
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Union
 from ..models import ValidationResult, ProcessedTrialBalanceRow
 
 logger = logging.getLogger(__name__)
 
-class DataValidator:
-    def __init__(self):
-        """Initialize data validator with trial balance specific rules"""
-        self.validation_rules = {
-            'account_number': {
-                'required': True,
-                'min_length': 2,
-                'max_length': 20,
-                'pattern': r'^[0-9A-Za-z\-_]{2,20}$'
-            },
-            'amount': {
-                'required': False,
-                'min_value': -1e12,
-                'max_value': 1e12
-            },
-            'currency_code': {
-                'required': True,
-                'valid_values': ['EUR', 'USD', 'GBP', 'CHF', 'JPY', 'CAD', 'AUD']
-            }
-        }
-        logger.info("Data validator initialized with trial balance validation rules")
+# Days an as-of date may lie in the future before it is warned about
+MAX_FUTURE_AS_OF_DAYS = 30
 
-    async def validate_trial_balance_data(self, data: List[ProcessedTrialBalanceRow]) -> ValidationResult:
-        """Comprehensive validation of trial balance data"""
+
+def validation_score(error_count: int, warning_count: int) -> int:
+    """Validation score (0-100)"""
+    max_possible_score = 100
+    error_penalty = min(error_count * 10, 50)  # Cap at 50 points
+    warning_penalty = min(warning_count * 2, 30)  # Cap at 30 points
+    return max(0, max_possible_score - error_penalty - warning_penalty)
+
+
+def is_missing(value: Any) -> bool:
+    """None, NaN or pd.NA - what a DataFrame column would count as null"""
+    return value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value))
+
+
+def iter_records(data: Union[Iterable[Any], pd.DataFrame]) -> Iterator[Mapping[str, Any]]:
+    """Field dicts of normalized rows given as models, dicts or a DataFrame"""
+    if isinstance(data, pd.DataFrame):
+        yield from data.to_dict('records')
+        return
+    for row in data:
+        yield dict(row) if isinstance(row, ProcessedTrialBalanceRow) else row
+
+
+def _is_blank(value: Any) -> bool:
+    return is_missing(value) or str(value).strip() == ''
+
+
+def _parse_date(value: Any):
+    if is_missing(value):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return pd.to_datetime(value)
+
+
+class ValidationAccumulator:
+    """
+    Trial balance validation rules applied one record at a time. Keeps per-row
+    findings and running aggregates (counts, sums, distinct keys), never the
+    records, so streamed rows can be validated as they pass by. A rule whose
+    field no record carries is skipped, like a missing column.
+    """
+
+    def __init__(self, validation_rules: Dict[str, Dict[str, Any]]):
+        self.valid_currencies = validation_rules['currency_code']['valid_values']
+        self.row_count = 0
+        self.columns: Set[str] = set()
+
+        # Findings about single rows, each list in row order
+        self.account_errors: List[Dict[str, Any]] = []
+        self.amount_warnings: List[Dict[str, Any]] = []
+        self.currency_warnings: List[Dict[str, Any]] = []
+        self.period_errors: List[Dict[str, Any]] = []
+        self.future_date_warnings: List[Dict[str, Any]] = []
+        self.date_error: Optional[str] = None
+
+        # Aggregates over all rows
+        self.key_counts: Counter = Counter()
+        self.accounts: Set[Any] = set()
+        self.entities: Set[Any] = set()
+        self.entity_currencies: Dict[Any, Set[Any]] = defaultdict(set)
+        self.currencies: Counter = Counter()
+        self.account_types: Counter = Counter()
+        self.missing_descriptions = 0
+        self.accounts_with_descriptions = 0
+        self.non_zero_count = 0
+        self.amount_count = 0
+        self.amount_total = 0.0
+        self.amount_min = math.inf
+        self.amount_max = -math.inf
+        self.non_zero_valued = 0
+        self.non_zero_total = 0.0
+        self.non_zero_abs_total = 0.0
+
+    def add(self, record: Mapping[str, Any]):
+        self.row_count += 1
+        position = self.row_count
+        self.columns.update(record.keys())
+
+        account_number = record.get('account_number')
+        account_missing = is_missing(account_number)
+        if account_missing or not 2 <= len(str(account_number)) <= 20:
+            self.account_errors.append({
+                "type": "invalid_account_number",
+                "row": position,
+                "message": f"Invalid account number: '{account_number}'",
+                "field": "account_number",
+                "value": account_number
+            })
+
+        # Check for extreme values
+        amount = record.get('amount')
+        amount_missing = is_missing(amount)
+        if amount_missing:
+            if not account_missing:
+                self.amount_warnings.append({
+                    "type": "missing_amount",
+                    "row": position,
+                    "message": f"Missing amount for account {account_number}",
+                    "field": "amount",
+                    "value": amount
+                })
+        elif abs(amount) > 1e10:
+            self.amount_warnings.append({
+                "type": "extreme_amount",
+                "row": position,
+                "message": f"Extreme amount value: {amount:,.2f}",
+                "field": "amount",
+                "value": amount
+            })
+
+        currency_code = record.get('currency_code')
+        if currency_code not in self.valid_currencies:
+            self.currency_warnings.append({
+                "type": "invalid_currency",
+                "row": position,
+                "message": f"Unusual currency code: '{currency_code}'",
+                "field": "currency_code",
+                "value": currency_code
+            })
+
+        self._check_dates(record, position)
+
+        description = record.get('account_description')
+        entity_uuid = record.get('entity_uuid')
+        period_key = record.get('period_key_yyyymm')
+        if not account_missing:
+            self.accounts.add(account_number)
+            if not is_missing(entity_uuid) and not is_missing(period_key):
+                self.key_counts[(entity_uuid, account_number, period_key)] += 1
+            if _is_blank(description):
+                self.missing_descriptions += 1
+        if not _is_blank(description):
+            self.accounts_with_descriptions += 1
+        if not is_missing(entity_uuid):
+            self.entities.add(entity_uuid)
+            if not is_missing(currency_code):
+                self.entity_currencies[entity_uuid].add(currency_code)
+        if not is_missing(currency_code):
+            self.currencies[currency_code] += 1
+        if not is_missing(record.get('account_type')):
+            self.account_types[record['account_type']] += 1
+
+        if amount_missing or amount != 0:
+            # A missing amount counts as non-zero, but adds nothing to the sums
+            self.non_zero_count += 1
+        if not amount_missing:
+            self.amount_count += 1
+            self.amount_total += amount
+            self.amount_min = min(self.amount_min, amount)
+            self.amount_max = max(self.amount_max, amount)
+            if amount != 0:
+                self.non_zero_valued += 1
+                self.non_zero_total += amount
+                self.non_zero_abs_total += abs(amount)
+
+    def _check_dates(self, record: Mapping[str, Any], position: int):
+        if self.date_error is not None:
+            return
+        try:
+            period_start = _parse_date(record.get('period_start_date'))
+            period_end = _parse_date(record.get('period_end_date'))
+            as_of = _parse_date(record.get('as_of_date'))
+        except Exception as e:
+            # One unparseable date voids the date checks for all rows
+            self.date_error = str(e)
+            self.period_errors = []
+            self.future_date_warnings = []
+            return
+
+        # Check if period_start <= period_end
+        if period_start is not None and period_end is not None and period_start > period_end:
+            self.period_errors.append({
+                "type": "invalid_period_range",
+                "row": position,
+                "message": f"Period start date {record['period_start_date']} is after end date {record['period_end_date']}",
+                "details": {
+                    "period_start_date": record['period_start_date'],
+                    "period_end_date": record['period_end_date']
+                }
+            })
+
+        # Check if as_of_date is reasonable
+        if as_of is not None and as_of > pd.Timestamp.now() + pd.Timedelta(days=MAX_FUTURE_AS_OF_DAYS):
+            self.future_date_warnings.append({
+                "type": "future_as_of_date",
+                "row": position,
+                "message": f"As-of date {record['as_of_date']} is more than {MAX_FUTURE_AS_OF_DAYS} days in the future",
+                "value": record['as_of_date']
+            })
+
+    def _has(self, *columns: str) -> bool:
+        return all(column in self.columns for column in columns)
+
+    def result(self) -> ValidationResult:
+        """Validation result of the records added so far"""
         errors = []
         warnings = []
-        
-        if not data:
-            return ValidationResult(
-                is_valid=False,
-                error_count=1,
-                warning_count=0,
-                errors=[{"type": "no_data", "message": "No data provided for validation"}],
-                warnings=[],
-                summary={"total_records": 0}
-            )
-        
-        # Convert to DataFrame for pandas operations
-        df = pd.DataFrame([row.dict() if hasattr(row, 'dict') else row for row in data])
-        
+
         # 1. Field-level validations
-        field_errors, field_warnings = self._validate_fields(df)
-        errors.extend(field_errors)
-        warnings.extend(field_warnings)
-        
+        if self._has('account_number'):
+            errors.extend(self.account_errors)
+        if self._has('amount'):
+            warnings.extend(self.amount_warnings)
+        if self._has('currency_code'):
+            warnings.extend(self.currency_warnings)
+
         # 2. Business logic validations
-        business_errors, business_warnings = self._validate_business_rules(df)
-        errors.extend(business_errors)
-        warnings.extend(business_warnings)
-        
+        warnings.extend(self._business_warnings())
+
         # 3. Data consistency validations
-        consistency_errors, consistency_warnings = self._validate_consistency(df)
-        errors.extend(consistency_errors)
-        warnings.extend(consistency_warnings)
-        
+        if self._has('period_start_date', 'period_end_date', 'as_of_date'):
+            if self.date_error is not None:
+                warnings.append({"type": "date_parsing_error", "message": f"Error parsing dates: {self.date_error}"})
+            else:
+                errors.extend(self.period_errors)
+                warnings.extend(self.future_date_warnings)
+        warnings.extend(self._mixed_currency_warnings())
+
         # 4. Trial balance specific validations
-        tb_errors, tb_warnings = self._validate_trial_balance_rules(df)
-        errors.extend(tb_errors)
-        warnings.extend(tb_warnings)
-        
-        # Generate summary
-        summary = self._generate_validation_summary(df, errors, warnings)
-        
+        warnings.extend(self._trial_balance_warnings())
+
         return ValidationResult(
             is_valid=len(errors) == 0,
             error_count=len(errors),
             warning_count=len(warnings),
             errors=errors,
             warnings=warnings,
-            summary=summary
+            summary=self._summary(errors, warnings)
         )
 
-    def _validate_fields(self, df: pd.DataFrame) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
-        """Validate individual field values"""
-        errors = []
+    def _business_warnings(self) -> List[Dict[str, Any]]:
         warnings = []
-        
-        # Validate account numbers
-        if 'account_number' in df.columns:
-            invalid_accounts = df[
-                df['account_number'].isna() | 
-                (df['account_number'].str.len() < 2) |
-                (df['account_number'].str.len() > 20)
-            ]
-            
-            for idx, row in invalid_accounts.iterrows():
-                errors.append({
-                    "type": "invalid_account_number",
-                    "row": int(idx) + 1,
-                    "message": f"Invalid account number: '{row.get('account_number', 'N/A')}'",
-                    "field": "account_number",
-                    "value": row.get('account_number')
-                })
-        
-        # Validate amounts
-        if 'amount' in df.columns:
-            # Check for extreme values
-            extreme_amounts = df[
-                (df['amount'].abs() > 1e10) | 
-                (df['amount'].isna() & df['account_number'].notna())
-            ]
-            
-            for idx, row in extreme_amounts.iterrows():
-                if pd.isna(row['amount']):
-                    warnings.append({
-                        "type": "missing_amount",
-                        "row": int(idx) + 1,
-                        "message": f"Missing amount for account {row.get('account_number', 'N/A')}",
-                        "field": "amount",
-                        "value": row.get('amount')
-                    })
-                else:
-                    warnings.append({
-                        "type": "extreme_amount",
-                        "row": int(idx) + 1,
-                        "message": f"Extreme amount value: {row['amount']:,.2f}",
-                        "field": "amount",
-                        "value": row.get('amount')
-                    })
-        
-        # Validate currency codes
-        if 'currency_code' in df.columns:
-            valid_currencies = self.validation_rules['currency_code']['valid_values']
-            invalid_currencies = df[~df['currency_code'].isin(valid_currencies)]
-            
-            for idx, row in invalid_currencies.iterrows():
-                warnings.append({
-                    "type": "invalid_currency",
-                    "row": int(idx) + 1,
-                    "message": f"Unusual currency code: '{row.get('currency_code', 'N/A')}'",
-                    "field": "currency_code",
-                    "value": row.get('currency_code')
-                })
-        
-        return errors, warnings
 
-    def _validate_business_rules(self, df: pd.DataFrame) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
-        """Validate business logic rules"""
-        errors = []
-        warnings = []
-        
         # Check for duplicate account numbers within same entity and period
-        if all(col in df.columns for col in ['account_number', 'entity_uuid', 'period_key_yyyymm']):
-            duplicates = df.groupby(['entity_uuid', 'account_number', 'period_key_yyyymm']).size()
-            duplicate_groups = duplicates[duplicates > 1]
-            
-            if len(duplicate_groups) > 0:
-                for (entity, account, period), count in duplicate_groups.items():
+        if self._has('account_number', 'entity_uuid', 'period_key_yyyymm'):
+            for (entity, account, period), count in sorted(self.key_counts.items()):
+                if count > 1:
                     warnings.append({
                         "type": "duplicate_account",
                         "message": f"Account {account} appears {count} times for entity {entity} in period {period}",
@@ -161,181 +257,154 @@ class DataValidator:
                             "entity_uuid": entity,
                             "account_number": account,
                             "period_key_yyyymm": period,
-                            "occurrence_count": int(count)
+                            "occurrence_count": count
                         }
                     })
-        
+
         # Check for accounts without descriptions
-        if all(col in df.columns for col in ['account_number', 'account_description']):
-            missing_descriptions = df[
-                df['account_number'].notna() & 
-                (df['account_description'].isna() | (df['account_description'].str.strip() == ''))
-            ]
-            
-            if len(missing_descriptions) > 0:
-                warnings.append({
-                    "type": "missing_descriptions",
-                    "message": f"{len(missing_descriptions)} accounts are missing descriptions",
-                    "count": len(missing_descriptions)
-                })
-        
-        return errors, warnings
+        if self._has('account_number', 'account_description') and self.missing_descriptions:
+            warnings.append({
+                "type": "missing_descriptions",
+                "message": f"{self.missing_descriptions} accounts are missing descriptions",
+                "count": self.missing_descriptions
+            })
+        return warnings
 
-    def _validate_consistency(self, df: pd.DataFrame) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
-        """Validate data consistency"""
-        errors = []
-        warnings = []
-        
-        # Check date consistency
-        if all(col in df.columns for col in ['period_start_date', 'period_end_date', 'as_of_date']):
-            try:
-                df['period_start_pd'] = pd.to_datetime(df['period_start_date'])
-                df['period_end_pd'] = pd.to_datetime(df['period_end_date'])
-                df['as_of_pd'] = pd.to_datetime(df['as_of_date'])
-                
-                # Check if period_start <= period_end
-                invalid_periods = df[df['period_start_pd'] > df['period_end_pd']]
-                for idx, row in invalid_periods.iterrows():
-                    errors.append({
-                        "type": "invalid_period_range",
-                        "row": int(idx) + 1,
-                        "message": f"Period start date {row['period_start_date']} is after end date {row['period_end_date']}",
-                        "details": {
-                            "period_start_date": row['period_start_date'],
-                            "period_end_date": row['period_end_date']
-                        }
-                    })
-                
-                # Check if as_of_date is reasonable
-                future_dates = df[df['as_of_pd'] > pd.Timestamp.now() + pd.Timedelta(days=30)]
-                for idx, row in future_dates.iterrows():
-                    warnings.append({
-                        "type": "future_as_of_date",
-                        "row": int(idx) + 1,
-                        "message": f"As-of date {row['as_of_date']} is more than 30 days in the future",
-                        "value": row['as_of_date']
-                    })
-                    
-            except Exception as e:
-                warnings.append({
-                    "type": "date_parsing_error",
-                    "message": f"Error parsing dates: {str(e)}"
-                })
-        
+    def _mixed_currency_warnings(self) -> List[Dict[str, Any]]:
         # Check currency consistency within entity
-        if all(col in df.columns for col in ['entity_uuid', 'currency_code']):
-            entity_currencies = df.groupby('entity_uuid')['currency_code'].nunique()
-            mixed_currency_entities = entity_currencies[entity_currencies > 1]
-            
-            for entity_uuid, currency_count in mixed_currency_entities.items():
-                warnings.append({
-                    "type": "mixed_currencies",
-                    "message": f"Entity {entity_uuid} has {currency_count} different currencies",
-                    "entity_uuid": entity_uuid,
-                    "currency_count": int(currency_count)
-                })
-        
-        return errors, warnings
+        if not self._has('entity_uuid', 'currency_code'):
+            return []
+        return [
+            {
+                "type": "mixed_currencies",
+                "message": f"Entity {entity_uuid} has {len(currencies)} different currencies",
+                "entity_uuid": entity_uuid,
+                "currency_count": len(currencies)
+            }
+            for entity_uuid, currencies in sorted(self.entity_currencies.items())
+            if len(currencies) > 1
+        ]
 
-    def _validate_trial_balance_rules(self, df: pd.DataFrame) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
-        """Validate trial balance specific rules"""
-        errors = []
+    def _trial_balance_warnings(self) -> List[Dict[str, Any]]:
         warnings = []
-        
+
         # Check for minimum number of accounts
-        if 'account_number' in df.columns:
-            unique_accounts = df['account_number'].nunique()
-            if unique_accounts < 5:
-                warnings.append({
-                    "type": "few_accounts",
-                    "message": f"Only {unique_accounts} unique accounts found - may not be a complete trial balance",
-                    "count": unique_accounts
-                })
-        
-        # Validate account type distribution
-        if 'account_type' in df.columns:
-            account_type_dist = df['account_type'].value_counts()
-            
-            # Check if we have both P&L and BS accounts
-            pl_accounts = account_type_dist.get('pl', 0)
-            bs_accounts = account_type_dist.get('bs', 0)
-            
-            if pl_accounts == 0:
+        if self._has('account_number') and len(self.accounts) < 5:
+            warnings.append({
+                "type": "few_accounts",
+                "message": f"Only {len(self.accounts)} unique accounts found - may not be a complete trial balance",
+                "count": len(self.accounts)
+            })
+
+        # Check if we have both P&L and BS accounts
+        if self._has('account_type'):
+            if not self.account_types['pl']:
                 warnings.append({
                     "type": "no_pl_accounts",
                     "message": "No P&L accounts found - trial balance may be incomplete"
                 })
-            
-            if bs_accounts == 0:
+            if not self.account_types['bs']:
                 warnings.append({
-                    "type": "no_bs_accounts", 
+                    "type": "no_bs_accounts",
                     "message": "No balance sheet accounts found - trial balance may be incomplete"
                 })
-        
+
         # Check for reasonable amount distribution
-        if 'amount' in df.columns:
-            non_zero_amounts = df[df['amount'] != 0]['amount']
-            
-            if len(non_zero_amounts) == 0:
+        if self._has('amount'):
+            if self.non_zero_count == 0:
                 warnings.append({
                     "type": "all_zero_amounts",
                     "message": "All amounts are zero - may indicate data extraction issue"
                 })
-            else:
-                # Check for potential balance
-                total_amount = non_zero_amounts.sum()
-                avg_amount = non_zero_amounts.abs().mean()
-                
+            elif self.non_zero_valued:
                 # If total is much smaller than average, might be balanced
-                if abs(total_amount) < avg_amount * 0.1:
+                average = self.non_zero_abs_total / self.non_zero_valued
+                if abs(self.non_zero_total) < average * 0.1:
                     warnings.append({
                         "type": "potentially_balanced",
-                        "message": f"Total amount ({total_amount:,.2f}) is close to zero - may indicate a balanced trial balance",
-                        "total_amount": float(total_amount)
+                        "message": f"Total amount ({self.non_zero_total:,.2f}) is close to zero - may indicate a balanced trial balance",
+                        "total_amount": float(self.non_zero_total)
                     })
-        
-        return errors, warnings
+        return warnings
 
-    def _generate_validation_summary(self, df: pd.DataFrame, errors: List[Dict], warnings: List[Dict]) -> Dict[str, Any]:
-        """Generate validation summary statistics"""
+    def _summary(self, errors: List[Dict], warnings: List[Dict]) -> Dict[str, Any]:
+        """Validation summary statistics"""
         summary = {
-            "total_records": len(df),
+            "total_records": self.row_count,
             "validation_status": "passed" if len(errors) == 0 else "failed",
             "error_count": len(errors),
             "warning_count": len(warnings)
         }
-        
+
         # Add data statistics
-        if 'account_number' in df.columns:
-            summary["unique_accounts"] = int(df['account_number'].nunique())
-            summary["accounts_with_descriptions"] = int(
-                df[df['account_description'].notna() & (df['account_description'].str.strip() != '')].shape[0]
+        if self._has('account_number'):
+            summary["unique_accounts"] = len(self.accounts)
+            summary["accounts_with_descriptions"] = self.accounts_with_descriptions
+
+        if self._has('amount') and self.amount_count:
+            summary["amount_statistics"] = {
+                "total_amount": self.amount_total,
+                "average_amount": self.amount_total / self.amount_count,
+                "min_amount": self.amount_min,
+                "max_amount": self.amount_max,
+                "non_zero_amounts": self.non_zero_valued
+            }
+
+        if self._has('currency_code'):
+            summary["currencies"] = dict(self.currencies.most_common())
+
+        if self._has('entity_uuid'):
+            summary["entities_count"] = len(self.entities)
+
+        summary["validation_score"] = validation_score(len(errors), len(warnings))
+        return summary
+
+
+class DataValidator:
+    def __init__(self):
+        """Initialize data validator with trial balance specific rules"""
+        self.validation_rules = {
+            'account_number': {
+                'required': True,
+                'min_length': 2,
+                'max_length': 20,
+                'pattern': r'^[0-9A-Za-z\-_]{2,20}$'
+            },
+            'amount': {
+                'required': False,
+                'min_value': -1e12,
+                'max_value': 1e12
+            },
+            'currency_code': {
+                'required': True,
+                'valid_values': ['EUR', 'USD', 'GBP', 'CHF', 'JPY', 'CAD', 'AUD']
+            }
+        }
+        logger.info("Data validator initialized with trial balance validation rules")
+
+    def accumulator(self) -> ValidationAccumulator:
+        """Validation of records fed one at a time, e.g. while they are streamed"""
+        return ValidationAccumulator(self.validation_rules)
+
+    async def validate_trial_balance_data(
+        self,
+        data: Union[List[ProcessedTrialBalanceRow], List[Dict[str, Any]], pd.DataFrame]
+    ) -> ValidationResult:
+        """Comprehensive validation of trial balance data"""
+        if len(data) == 0:
+            return ValidationResult(
+                is_valid=False,
+                error_count=1,
+                warning_count=0,
+                errors=[{"type": "no_data", "message": "No data provided for validation"}],
+                warnings=[],
+                summary={"total_records": 0}
             )
         
-        if 'amount' in df.columns:
-            amounts = df['amount'].dropna()
-            if len(amounts) > 0:
-                summary["amount_statistics"] = {
-                    "total_amount": float(amounts.sum()),
-                    "average_amount": float(amounts.mean()),
-                    "min_amount": float(amounts.min()),
-                    "max_amount": float(amounts.max()),
-                    "non_zero_amounts": int((amounts != 0).sum())
-                }
-        
-        if 'currency_code' in df.columns:
-            summary["currencies"] = df['currency_code'].value_counts().to_dict()
-        
-        if 'entity_uuid' in df.columns:
-            summary["entities_count"] = int(df['entity_uuid'].nunique())
-        
-        # Validation score (0-100)
-        max_possible_score = 100
-        error_penalty = min(len(errors) * 10, 50)  # Cap at 50 points
-        warning_penalty = min(len(warnings) * 2, 30)  # Cap at 30 points
-        summary["validation_score"] = max(0, max_possible_score - error_penalty - warning_penalty)
-        
-        return summary
+        accumulator = self.accumulator()
+        for record in iter_records(data):
+            accumulator.add(record)
+        return accumulator.result()
 
     def validate_file_requirements(self, df: pd.DataFrame, file_type: str) -> Dict[str, Any]:
         """Validate file meets minimum requirements for processing"""
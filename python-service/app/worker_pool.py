@@ -0,0 +1,296 @@
+"""
+Processing Pool Module
+
+Runs the CPU-bound pipeline stages (Docling conversion, tabular ingest and
+pandas parsing) outside the uvicorn event loop. Each worker process builds its own
+DocumentConverter and PandasAnalyzer once and keeps them warm between jobs,
+so the event loop only awaits futures.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from . import progress
+from .ingest import FileSource
+from .metrics import POOL_QUEUE_DEPTH, POOL_TASKS_IN_FLIGHT
+from .utils.env import env_bool, env_int, env_mapping
+
+logger = logging.getLogger(__name__)
+
+# Execution modes a stage can be routed to
+PROCESS = "process"
+THREAD = "thread"
+
+# Processors owned by the current process. In worker processes they are built by
+# the pool initializer, in the API process they are built on first use (thread mode).
+_docling_processor = None
+_pandas_analyzer = None
+_raw_file_analyzer = None
+_raw_data_storage = None
+_docling_warm = False
+
+# Seconds a warm-up task waits for the others to reach their own workers
+WARM_UP_BARRIER_TIMEOUT = 600
+
+
+def _get_docling_processor():
+    global _docling_processor
+    if _docling_processor is None:
+        from .docling_processor import DoclingProcessor
+        _docling_processor = DoclingProcessor()
+    return _docling_processor
+
+
+def _get_pandas_analyzer():
+    global _pandas_analyzer
+    if _pandas_analyzer is None:
+        from .pandas_analyzer import PandasAnalyzer
+        _pandas_analyzer = PandasAnalyzer()
+    return _pandas_analyzer
+
+
+def _get_raw_file_analyzer():
+    global _raw_file_analyzer
+    if _raw_file_analyzer is None:
+        from .raw_file_analyzer import RawFileAnalyzer
+        _raw_file_analyzer = RawFileAnalyzer()
+    return _raw_file_analyzer
+
+
+def _get_raw_data_storage():
+    global _raw_data_storage
+    if _raw_data_storage is None:
+        from .raw_data_storage import RawDataStorage
+        from .utils.file_detector import FileDetector
+        _raw_data_storage = RawDataStorage(FileDetector(), _get_raw_file_analyzer())
+    return _raw_data_storage
+
+
+def _warm_up_processors(barrier=None) -> int:
+    """Build the processors and load the Docling models once per process; returns the pid"""
+    global _docling_warm
+    if barrier is not None:
+        # Hold this worker until every warm-up task has a worker of its own
+        barrier.wait(WARM_UP_BARRIER_TIMEOUT)
+    if not _docling_warm:
+        started = time.perf_counter()
+        _get_pandas_analyzer()
+        _get_docling_processor().warm_up()
+        _docling_warm = True
+        logger.info(f"Processors warm in process {os.getpid()} after {time.perf_counter() - started:.2f}s")
+    return os.getpid()
+
+
+def _init_worker(warm_up: bool, progress_config: tuple):
+    """Process pool initializer - warms the per-process processors, or leaves them to first use"""
+    logging.basicConfig(level=logging.INFO)
+    progress.install(*progress_config)
+    if warm_up:
+        try:
+            _warm_up_processors()
+        except Exception as e:
+            logger.warning(f"Docling warm-up failed in worker {os.getpid()}: {str(e)}")
+    logger.info(f"Processing worker {os.getpid()} ready")
+
+
+# Stage functions - module level so they can be pickled into worker processes
+
+def _run_pdf_parse(file_content: FileSource):
+    return _get_docling_processor().extract_pdf_rows(file_content)
+
+
+def _run_pdf_analysis(file_content: FileSource):
+    return _get_docling_processor().describe_pdf_structure(file_content)
+
+
+def _run_tabular_parse(file_content: FileSource, file_type: str, filename: str, hints: Optional[Dict[str, Any]] = None):
+    return _get_pandas_analyzer().parse_tabular_file(file_content, file_type, filename, hints)
+
+
+def _run_tabular_analysis(file_content: FileSource, file_type: str, filename: str):
+    return _get_pandas_analyzer().describe_tabular_structure(file_content, file_type, filename)
+
+
+def _run_tabular_ingest(file_content: FileSource, file_type: str, filename: str, detection=None):
+    from .ingest_context import IngestContext
+    return IngestContext.load(file_content, file_type, filename, detection=detection)
+
+
+def _run_raw_storage(file_content: FileSource, filename: str, entity_uuid: str, user_uuid: str):
+    return _get_raw_data_storage().process_and_store_raw_file(
+        file_content=file_content,
+        filename=filename,
+        entity_uuid=entity_uuid,
+        user_uuid=user_uuid
+    )
+
+
+STAGES: Dict[str, Callable[..., Any]] = {
+    "pdf_parse": _run_pdf_parse,
+    "pdf_analysis": _run_pdf_analysis,
+    "tabular_parse": _run_tabular_parse,
+    "tabular_analysis": _run_tabular_analysis,
+    "tabular_ingest": _run_tabular_ingest,
+    "raw_storage": _run_raw_storage,
+}
+
+
+def _run_stage(stage: str, progress_token: Optional[str], args: tuple):
+    """Executor entry point: run a stage with its progress bound to the job it belongs to"""
+    with progress.bound(progress_token):
+        return STAGES[stage](*args)
+
+
+class ProcessingPool:
+    """Routes pipeline stages to a process pool (default) or a thread pool"""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        stage_routing: Optional[Dict[str, str]] = None,
+        warm_up: Optional[bool] = None,
+        start_method: Optional[str] = None
+    ):
+        """
+        Configuration (environment):
+        - MAX_WORKERS: number of worker processes (default: CPU count)
+        - PROCESSING_STAGE_ROUTING: per-stage overrides, e.g. "tabular_ingest=thread,pdf_parse=process"
+        - PROCESSING_POOL_WARMUP: load Docling models in the background at startup (default: true);
+          when false, processors are built on first use
+        - PROCESSING_POOL_START_METHOD: multiprocessing start method (default: spawn)
+        """
+        self.max_workers = max_workers or env_int('MAX_WORKERS', os.cpu_count() or 2)
+        self.warm_up = env_bool('PROCESSING_POOL_WARMUP', True) if warm_up is None else warm_up
+        self.start_method = start_method or os.getenv('PROCESSING_POOL_START_METHOD', 'spawn')
+
+        self.stage_routing = {stage: PROCESS for stage in STAGES}
+        self.stage_routing.update(env_mapping('PROCESSING_STAGE_ROUTING'))
+        self.stage_routing.update(stage_routing or {})
+        for stage, mode in self.stage_routing.items():
+            if stage not in STAGES:
+                raise ValueError(f"Unknown processing stage: {stage}")
+            if mode not in (PROCESS, THREAD):
+                raise ValueError(f"Invalid routing '{mode}' for stage {stage} (expected process|thread)")
+
+        # Job progress reported by stages, fed back to /jobs/{job_uuid}/events
+        self.progress = progress.ProgressHub(multiprocessing.get_context(self.start_method))
+
+        self._process_executor: Optional[ProcessPoolExecutor] = None
+        self._thread_executor: Optional[ThreadPoolExecutor] = None
+
+        # Stage tasks submitted and not finished, per executor mode
+        self._in_flight = {PROCESS: 0, THREAD: 0}
+
+        # Readiness, reported by /ready
+        self.ready = False
+        self.warm_up_seconds: Optional[float] = None
+        self.warm_up_error: Optional[str] = None
+        logger.info(f"Processing pool configured: {self.max_workers} workers, routing={self.stage_routing}")
+
+    def start(self):
+        """Create the executors. Called from the app lifespan; run() also starts lazily."""
+        if PROCESS in self.stage_routing.values() and self._process_executor is None:
+            self._process_executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(self.warm_up, self.progress.worker_config)
+            )
+        if THREAD in self.stage_routing.values() and self._thread_executor is None:
+            self._thread_executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="processing"
+            )
+
+    def _executor_for(self, stage: str) -> Executor:
+        self.start()
+        if self.stage_routing[stage] == PROCESS:
+            return self._process_executor
+        return self._thread_executor
+
+    async def run(self, stage: str, *args, progress_token: Optional[str] = None) -> Any:
+        """
+        Run a pipeline stage and await its result without blocking the event loop.
+        Progress the stage reports is attributed to progress_token (a job UUID).
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown processing stage: {stage}")
+
+        executor = self._executor_for(stage)
+        mode = self.stage_routing[stage]
+        loop = asyncio.get_running_loop()
+        self._track(stage, mode, 1)
+        try:
+            return await loop.run_in_executor(executor, _run_stage, stage, progress_token, args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge PDF) - rebuild the pool for the next request
+            logger.error(f"Processing pool broke while running stage {stage}, restarting workers")
+            if self._process_executor is executor:
+                # Reap the surviving workers and fail queued work instead of leaking them
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._process_executor = None
+            raise
+        finally:
+            self._track(stage, mode, -1)
+
+    def _track(self, stage: str, mode: str, delta: int):
+        self._in_flight[mode] += delta
+        POOL_TASKS_IN_FLIGHT.labels(stage=stage).inc(delta)
+        POOL_QUEUE_DEPTH.set(sum(max(0, count - self.max_workers) for count in self._in_flight.values()))
+
+    async def warm_up_workers(self):
+        """
+        Load the Docling models wherever PDF stages run - in every worker process, or
+        once in the API process for thread routing - then mark the pool ready.
+        Meant to run as a background task so startup does not wait for the models.
+        """
+        if not self.warm_up:
+            self.ready = True
+            return
+
+        started = time.perf_counter()
+        executor = self._executor_for("pdf_parse")
+        count = self.max_workers if self.stage_routing["pdf_parse"] == PROCESS else 1
+        loop = asyncio.get_running_loop()
+        # Starting the manager spawns its server process - keep that off the event loop
+        manager = (
+            await asyncio.to_thread(multiprocessing.get_context(self.start_method).Manager)
+            if count > 1 else None
+        )
+        # Every task blocks at the barrier until all have started, so no worker can
+        # take two of them and each of the count workers is spawned and warmed
+        barrier = manager.Barrier(count) if manager else None
+        try:
+            pids = await asyncio.gather(
+                *(loop.run_in_executor(executor, _warm_up_processors, barrier) for _ in range(count))
+            )
+        except Exception as e:
+            if barrier is not None:
+                barrier.abort()
+            self.warm_up_error = str(e)
+            logger.error(f"Processing pool warm-up failed: {str(e)}")
+            return
+        finally:
+            if manager is not None:
+                await asyncio.to_thread(manager.shutdown)
+
+        self.warm_up_seconds = round(time.perf_counter() - started, 3)
+        self.ready = True
+        logger.info(f"Processing pool warm after {self.warm_up_seconds}s ({len(set(pids))} processes)")
+
+    def shutdown(self, wait: bool = True):
+        """Stop all workers"""
+        if self._process_executor is not None:
+            self._process_executor.shutdown(wait=wait, cancel_futures=True)
+            self._process_executor = None
+        if self._thread_executor is not None:
+            self._thread_executor.shutdown(wait=wait, cancel_futures=True)
+            self._thread_executor = None
+        self.progress.shutdown()
+        logger.info("Processing pool shut down")
@@ -0,0 +1,248 @@
+"""
+XLSX Stream Module
+
+Bounded reads of XLSX internals without loading a workbook: the sheet list
+from xl/workbook.xml, and the first N rows of a sheet streamed from its XML
+part. Shared strings are resolved lazily, so only the strings the previewed
+rows reference are decoded. Cost depends on the rows requested, not on the
+size of the file.
+"""
+
+import datetime
+import logging
+import posixpath
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from .ingest import FileSource, open_source
+
+logger = logging.getLogger(__name__)
+
+# Built-in number formats that display dates/times
+BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+
+_DATE_TOKENS = re.compile(r'[dmyhs]', re.IGNORECASE)
+_FORMAT_LITERALS = re.compile(r'"[^"]*"|\[[^\]]*\]|\\.')
+_CELL_REF = re.compile(r'([A-Z]+)(\d+)')
+
+
+def _local(tag: str) -> str:
+    """Tag or attribute name without its namespace (transitional and strict OOXML differ)"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _attribute(element: ET.Element, name: str) -> Optional[str]:
+    for key, value in element.attrib.items():
+        if _local(key) == name:
+            return value
+    return None
+
+
+def column_index(letters: str) -> int:
+    """Zero-based column index of a column reference (A -> 0, AA -> 26)"""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def column_letter(index: int) -> str:
+    """Column reference of a zero-based column index (0 -> A, 26 -> AA)"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+@dataclass
+class SheetEntry:
+    """A sheet listed in the workbook and the ZIP member holding its cells"""
+    name: str
+    path: str
+    state: str = "visible"
+
+
+class XlsxArchive:
+    """An open XLSX package; use as a context manager"""
+
+    def __init__(self, source: FileSource):
+        self._handle = open_source(source)
+        try:
+            self.zip = zipfile.ZipFile(self._handle)
+            self.sheets = self._read_sheets()
+        except Exception:
+            self._handle.close()
+            raise
+        self._shared_strings: List[str] = []
+        self._shared_strings_iter: Optional[Iterator[str]] = None
+        self._date_styles: Optional[Set[int]] = None
+
+    def __enter__(self) -> 'XlsxArchive':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.zip.close()
+        self._handle.close()
+
+    def _read_sheets(self) -> List[SheetEntry]:
+        workbook = ET.fromstring(self.zip.read('xl/workbook.xml'))
+        self.date1904 = any(
+            _local(element.tag) == 'workbookPr' and _attribute(element, 'date1904') in ('1', 'true')
+            for element in workbook
+        )
+        relationships = ET.fromstring(self.zip.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): rel.get('Target') for rel in relationships}
+
+        sheets = []
+        for element in workbook.iter():
+            if _local(element.tag) != 'sheet':
+                continue
+            target = targets.get(_attribute(element, 'id'), '')
+            path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+            sheets.append(SheetEntry(element.get('name'), path, element.get('state') or 'visible'))
+        return sheets
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return [sheet.name for sheet in self.sheets]
+
+    def sheet(self, name: str) -> SheetEntry:
+        for sheet in self.sheets:
+            if sheet.name == name:
+                return sheet
+        raise KeyError(f"Sheet not found: {name}")
+
+    def shared_string(self, index: int) -> str:
+        """Shared string by index, decoding the table only as far as needed"""
+        if self._shared_strings_iter is None:
+            self._shared_strings_iter = self.iter_shared_strings()
+        while len(self._shared_strings) <= index:
+            try:
+                self._shared_strings.append(next(self._shared_strings_iter))
+            except StopIteration:
+                raise IndexError(f"Shared string {index} out of range")
+        return self._shared_strings[index]
+
+    def iter_shared_strings(self) -> Iterator[str]:
+        """Stream xl/sharedStrings.xml one string at a time"""
+        try:
+            handle = self.zip.open('xl/sharedStrings.xml')
+        except KeyError:
+            return
+        with handle:
+            for _, element in ET.iterparse(handle):
+                if _local(element.tag) != 'si':
+                    continue
+                # Plain text, or rich text runs; phonetic hints (rPh) are not part of the value
+                parts = []
+                for child in element:
+                    tag = _local(child.tag)
+                    if tag == 't':
+                        parts.append(child.text or '')
+                    elif tag == 'r':
+                        parts.extend(text.text or '' for text in child if _local(text.tag) == 't')
+                element.clear()
+                yield ''.join(parts)
+
+    def _is_date_style(self, style: int) -> bool:
+        if self._date_styles is None:
+            self._date_styles = self._read_date_styles()
+        return style in self._date_styles
+
+    def _read_date_styles(self) -> Set[int]:
+        """Cell style indexes (cellXfs) whose number format shows a date"""
+        try:
+            styles = ET.fromstring(self.zip.read('xl/styles.xml'))
+        except KeyError:
+            return set()
+        date_formats = set(BUILTIN_DATE_FORMATS)
+        date_styles = set()
+        for element in styles:
+            if _local(element.tag) == 'numFmts':
+                for number_format in element:
+                    code = _FORMAT_LITERALS.sub('', number_format.get('formatCode', ''))
+                    if _DATE_TOKENS.search(code):
+                        date_formats.add(int(number_format.get('numFmtId')))
+            elif _local(element.tag) == 'cellXfs':
+                for index, xf in enumerate(element):
+                    if int(xf.get('numFmtId', 0)) in date_formats:
+                        date_styles.add(index)
+        return date_styles
+
+    def _from_serial(self, serial: float) -> Any:
+        epoch = datetime.datetime(1904, 1, 1) if self.date1904 else datetime.datetime(1899, 12, 30)
+        try:
+            return epoch + datetime.timedelta(days=serial)
+        except OverflowError:
+            return serial
+
+    def _cell_value(self, cell: ET.Element) -> Any:
+        cell_type = cell.get('t', 'n')
+        value = None
+        for child in cell:
+            tag = _local(child.tag)
+            if tag == 'v':
+                value = child.text
+            elif tag == 'is':
+                value = ''.join(text.text or '' for text in child.iter() if _local(text.tag) == 't')
+        if value is None:
+            return None
+        if cell_type == 's':
+            return self.shared_string(int(value))
+        if cell_type == 'b':
+            return value == '1'
+        if cell_type in ('str', 'inlineStr', 'e', 'd'):
+            # t="d" holds an ISO 8601 date as text, not a serial number
+            return value
+        number = float(value)
+        style = cell.get('s')
+        if style is not None and self._is_date_style(int(style)):
+            return self._from_serial(number)
+        return int(number) if number.is_integer() and 'E' not in value.upper() and '.' not in value else number
+
+    def iter_rows(self, sheet_name: str, max_rows: Optional[int] = None) -> Iterator[List[Any]]:
+        """
+        Stream a sheet's rows from the top as value lists. Rows missing from the XML
+        (empty rows) are yielded as empty lists so positions match a full parse.
+        """
+        produced = 0
+        next_row = 1
+        with self.zip.open(self.sheet(sheet_name).path) as handle:
+            for _, element in ET.iterparse(handle):
+                if _local(element.tag) != 'row':
+                    continue
+                row_number = int(element.get('r') or next_row)
+                while next_row < row_number:
+                    if max_rows is not None and produced >= max_rows:
+                        return
+                    yield []
+                    produced += 1
+                    next_row += 1
+                if max_rows is not None and produced >= max_rows:
+                    return
+
+                values: Dict[int, Any] = {}
+                position = 0
+                for cell in element:
+                    if _local(cell.tag) != 'c':
+                        continue
+                    match = _CELL_REF.match(cell.get('r') or '')
+                    position = column_index(match.group(1)) if match else position
+                    values[position] = self._cell_value(cell)
+                    position += 1
+                element.clear()
+
+                row = [None] * (max(values) + 1 if values else 0)
+                for index, value in values.items():
+                    row[index] = value
+                yield row
+                produced += 1
+                next_row = row_number + 1
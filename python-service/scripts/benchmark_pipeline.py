@@ -0,0 +1,125 @@
+"""
+Pipeline benchmark
+
+Runs DATEV-style CSV exports through the full ProcessingPipeline (the code
+behind /process-file) with GPT-5 calls answered by the in-process LLM
+stand-in, and reports per-file wall time, stand-in traffic and the LLM call
+sites that fell back to their heuristics. The first file pays for layout and
+column mapping prompts; later files of the same layout show the warm path.
+
+Record the fixtures once against the real API, then replay them offline:
+    OPENAI_API_KEY=... python scripts/benchmark_pipeline.py --mode record
+    python scripts/benchmark_pipeline.py --latency-ms 800
+
+Usage (from python-service/):
+    python scripts/benchmark_pipeline.py --rows 5000 --files 3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tabulate import tabulate  # noqa: E402
+
+from benchmark_spreadsheet_readers import write_samples  # noqa: E402
+
+DEFAULT_RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "llm_recordings.jsonl")
+
+
+def configure(args, data_dir: str):
+    """Environment for the stand-in and a throwaway data directory; read when app modules build their state"""
+    os.environ["LLM_STAND_IN"] = "true"
+    os.environ["LLM_STAND_IN_MODE"] = args.mode
+    os.environ["LLM_STAND_IN_RECORDINGS"] = args.recordings
+    os.environ["LLM_STAND_IN_ON_MISS"] = args.on_miss
+    os.environ["LLM_STAND_IN_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["LLM_STAND_IN_LATENCY_JITTER_MS"] = str(args.latency_jitter_ms)
+    os.environ["LLM_STAND_IN_ERROR_RATE"] = str(args.error_rate)
+    # Fresh layout, mapping and LLM response caches, so the first file is a cold start
+    os.environ["SERVICE_DATA_DIR"] = data_dir
+
+
+async def run(args, paths):
+    import httpx
+
+    from app import llm_stand_in
+    from app.llm_client import LLMHttpClient
+    from app.llm_scheduler import track_fallbacks
+    from app.pandas_analyzer import PandasAnalyzer
+    from app.pipeline import ProcessingPipeline
+    from app.raw_file_analyzer import RawFileAnalyzer
+    from app.utils.file_detector import FileDetector
+    from app.utils.validator import DataValidator
+    from app.worker_pool import ProcessingPool
+
+    # Same wiring as get_stand_in_client, but keeping the stand-in for its stats
+    stand_in = llm_stand_in.LLMStandIn()
+    llm_stand_in._stand_in_client = LLMHttpClient(
+        base_url=llm_stand_in.IN_PROCESS_BASE_URL,
+        http2=False,
+        transport=httpx.ASGITransport(app=llm_stand_in.create_app(stand_in))
+    )
+
+    pool = ProcessingPool(max_workers=args.workers, warm_up=False)
+    pool.start()
+    pipeline = ProcessingPipeline(pool, FileDetector(), RawFileAnalyzer(pool), PandasAnalyzer(), DataValidator())
+    table = []
+    try:
+        for number, path in enumerate(paths, start=1):
+            before = dict(stand_in.stats)
+            started = time.perf_counter()
+            with track_fallbacks() as fallbacks:
+                response = await pipeline.process(path, os.path.basename(path), "benchmark-entity")
+            elapsed = time.perf_counter() - started
+            calls = {name: stand_in.stats[name] - before[name] for name in stand_in.stats}
+            table.append([
+                number, response.row_count, f"{elapsed:.3f}",
+                calls["replayed"], calls["recorded"], calls["missed"], calls["injected_errors"],
+                ", ".join(sorted(set(fallbacks))) or "-"
+            ])
+    finally:
+        pool.shutdown()
+        await llm_stand_in._stand_in_client.aclose()
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000, help="rows in each generated export")
+    parser.add_argument("--files", type=int, default=3, help="exports of the same layout processed one after another")
+    parser.add_argument("--workers", type=int, default=2, help="processing pool workers")
+    parser.add_argument("--mode", choices=["replay", "record"], default="replay")
+    parser.add_argument("--recordings", default=DEFAULT_RECORDINGS, help="JSONL fixtures the stand-in replays")
+    parser.add_argument(
+        "--on-miss", choices=["error", "empty"], default="error",
+        help="stand-in answer to unrecorded prompts; error exercises the fallbacks"
+    )
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stand-in delay per answer")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stand-in calls answered with 503")
+    args = parser.parse_args()
+    args.recordings = os.path.abspath(args.recordings)
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure(args, os.path.join(directory, "data"))
+        paths = []
+        for number in range(args.files):
+            # A row more per file, so every upload has its own content hash
+            sample_dir = os.path.join(directory, f"file{number}")
+            os.makedirs(sample_dir)
+            paths.append(write_samples(sample_dir, args.rows + number)[1])
+        table = asyncio.run(run(args, paths))
+
+    print(tabulate(
+        table,
+        headers=["file", "rows", "seconds", "replayed", "recorded", "missed", "injected errors", "fallbacks"]
+    ))
+
+
+if __name__ == "__main__":
+    main()
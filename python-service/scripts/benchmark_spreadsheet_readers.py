@@ -0,0 +1,124 @@
+"""
+Spreadsheet reader benchmark
+
+Times each reader engine on a DATEV-style trial balance export (generated, or
+passed with --xlsx/--csv) and reports wall time and peak memory. Every run
+happens in a fresh process so peak RSS is not inflated by earlier runs.
+
+Usage (from python-service/):
+    python scripts/benchmark_spreadsheet_readers.py --rows 50000
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tabulate import tabulate  # noqa: E402
+
+from app.spreadsheet_reader import CALAMINE, CALAMINE_AVAILABLE, OPENPYXL, PANDAS_C, PYARROW  # noqa: E402
+
+HEADER = ["Konto", "Beschriftung", "EB-Wert", "Soll", "Haben", "Saldo", "KZ", "Kostenstelle", "Datum", "Buchungstext"]
+
+
+def _rows(count: int):
+    rng = random.Random(42)
+    for i in range(count):
+        debit = round(rng.uniform(0, 100000), 2)
+        credit = round(rng.uniform(0, 100000), 2)
+        yield [
+            str(1000 + i), f"Sachkonto {i} Überweisung", round(rng.uniform(-5000, 5000), 2),
+            debit, credit, round(debit - credit, 2), rng.choice(["S", "H"]), rng.randint(100, 999),
+            f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", "Saldenvortrag"
+        ]
+
+
+def write_samples(directory: str, rows: int):
+    from openpyxl import Workbook
+
+    xlsx_path = os.path.join(directory, "datev_export.xlsx")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Saldenliste")
+    sheet.append(HEADER)
+    for row in _rows(rows):
+        sheet.append(row)
+    workbook.save(xlsx_path)
+
+    csv_path = os.path.join(directory, "datev_export.csv")
+    with open(csv_path, "w", encoding="cp1252", newline="") as handle:
+        handle.write(";".join(HEADER) + "\n")
+        for row in _rows(rows):
+            handle.write(";".join(str(value).replace(".", ",") if isinstance(value, float) else str(value) for value in row) + "\n")
+    return xlsx_path, csv_path
+
+
+def _max_rss_mib() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(path: str, file_type: str, engine: str, results):
+    from app.spreadsheet_reader import read_csv_frame, read_excel_sheets
+
+    baseline = _max_rss_mib()
+    started = time.perf_counter()
+    if file_type == "xlsx":
+        _, frames = read_excel_sheets(path, engine=engine)
+        rows = sum(len(frame) for frame in frames.values())
+    else:
+        rows = len(read_csv_frame(path, delimiter=";", encoding="cp1252", engine=engine))
+    elapsed = time.perf_counter() - started
+    results.put((elapsed, _max_rss_mib() - baseline, rows))
+
+
+def run_case(path: str, file_type: str, engine: str):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_measure, args=(path, file_type, engine, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000, help="rows in the generated export")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per engine; the fastest is reported")
+    parser.add_argument("--xlsx", help="benchmark this workbook instead of a generated one")
+    parser.add_argument("--csv", help="benchmark this CSV instead of a generated one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        xlsx_path, csv_path = args.xlsx, args.csv
+        if not (xlsx_path and csv_path):
+            generated_xlsx, generated_csv = write_samples(directory, args.rows)
+            xlsx_path = xlsx_path or generated_xlsx
+            csv_path = csv_path or generated_csv
+
+        cases = [("xlsx", xlsx_path, OPENPYXL), ("csv", csv_path, PANDAS_C), ("csv", csv_path, PYARROW)]
+        if CALAMINE_AVAILABLE:
+            cases.insert(1, ("xlsx", xlsx_path, CALAMINE))
+
+        table = []
+        baselines = {}
+        for file_type, path, engine in cases:
+            runs = [run_case(path, file_type, engine) for _ in range(args.repeat)]
+            elapsed = min(run[0] for run in runs)
+            peak = max(run[1] for run in runs)
+            baseline = baselines.setdefault(file_type, elapsed)
+            table.append([
+                file_type, engine, runs[0][2], f"{elapsed:.3f}", f"{baseline / elapsed:.1f}x", f"{peak:.1f}"
+            ])
+
+    print(tabulate(table, headers=["format", "engine", "rows", "seconds", "speedup", "peak MiB"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+import tempfile
+
+import pytest
+
+# Keep local durable state (job queue, caches) out of the working tree during tests
+os.environ.setdefault('SERVICE_DATA_DIR', tempfile.mkdtemp(prefix='python-service-data-'))
+# App-level tests don't need Docling models loaded in the worker processes
+os.environ.setdefault('PROCESSING_POOL_WARMUP', 'false')
+
+
+class CountingGPT5Analyzer:
+    """Stands in for GPT5ColumnAnalyzer with fixed answers, counting the calls it gets"""
+
+    def __init__(self):
+        # Imported here so the environment above is set before any app module loads
+        from app.llm_scheduler import LLMScheduler
+        self.scheduler = LLMScheduler(rate_per_second=0)
+        self.calls = 0
+
+    async def analyze_raw_csv_structure(self, lines, preview_text, filename, delimiter, frame=None):
+        from app.models import RawAnalysisResult, RawFileStructure
+        self.calls += 1
+        return RawAnalysisResult(
+            file_structure=RawFileStructure(header_row=1, data_start_row=2, column_hints={"Konto": "account_number"}, confidence=0.9),
+            processing_hints={"gpt5_analysis": True, "analysis_timestamp": "now"},
+            analysis_confidence=0.9
+        )
+
+    async def analyze_columns(self, headers, sample_data, document_type=None):
+        from app.gpt5_column_analyzer import ColumnAnalysis
+        self.calls += 1
+        return ColumnAnalysis(
+            mapping={"account_number": "Konto", "amount": "Saldo"}, confidence=0.9, alternatives={},
+            description_inference={}, quality_score=0.9, recommendations=[]
+        )
+
+
+@pytest.fixture
+def counting_analyzer():
+    """A CountingGPT5Analyzer for tests that check when GPT-5 is (not) called"""
+    return CountingGPT5Analyzer()
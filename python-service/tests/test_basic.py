@@ -5,12 +5,14 @@ from app.main import app
 
 client = TestClient(app)
 
+
 def test_health_check():
     """Test basic health check endpoint"""
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json()["status"] == "healthy"
 
+
 def test_docling_processor_init():
     """Test Docling processor initialization"""
     from app.docling_processor import DoclingProcessor
@@ -19,6 +21,7 @@ def test_docling_processor_init():
     assert processor is not None
     assert processor.converter is not None
 
+
 def test_pandas_analyzer_init():
     """Test pandas analyzer initialization"""
     from app.pandas_analyzer import PandasAnalyzer
@@ -27,6 +30,7 @@ def test_pandas_analyzer_init():
     assert analyzer is not None
     assert analyzer.decimal_separators == ['.', ',']
 
+
 def test_file_detector_init():
     """Test file detector initialization"""
     from app.utils.file_detector import FileDetector
@@ -35,6 +39,7 @@ def test_file_detector_init():
     assert detector is not None
     assert 'application/pdf' in detector.mime_type_mapping
 
+
 @pytest.mark.asyncio
 async def test_file_type_detection():
     """Test file type detection with sample data"""
@@ -52,6 +57,35 @@ async def test_file_type_detection():
     file_type = await detector.detect_file_type(csv_content, 'test.csv')
     assert file_type == 'csv'
 
+
+@pytest.mark.asyncio
+async def test_detection_result(monkeypatch):
+    """Test detection reads a bounded prefix, skips libmagic when two signals agree and reports format details"""
+    import io
+    import openpyxl
+    from app.utils import file_detector
+    from app.utils.file_detector import FileDetector
+
+    detector = FileDetector(prefix_bytes=4096)
+    # Extension and signature agree - libmagic is never consulted
+    monkeypatch.setattr(file_detector, '_magic_handle', lambda: pytest.fail("libmagic should not run"))
+
+    csv_content = "Konto;Bezeichnung;Saldo\n" + "".join(f"{1000 + i};Kasse Ä;{i},00\n" for i in range(2000))
+    result = await detector.detect(csv_content.encode('cp1252'), 'saldenliste.csv')
+    assert result.file_type == 'csv'
+    assert result.delimiter == ';'
+    assert csv_content.encode('cp1252').decode(result.encoding).startswith("Konto;Bezeichnung;Saldo\n1000;Kasse Ä")
+    assert result.compression is None
+
+    workbook = openpyxl.Workbook()
+    workbook.create_sheet("Second")
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    result = await detector.detect(buffer.getvalue(), 'tb.xlsx')
+    assert (result.file_type, result.compression, result.sheet_count) == ('xlsx', 'zip', 2)
+    assert result.signals == {"extension": "xlsx", "heuristic": "xlsx"}
+
+
 def test_german_amount_parsing():
     """Test German accounting amount format parsing"""
     from app.utils.normalizer import DataNormalizer
@@ -67,6 +101,7 @@ def test_german_amount_parsing():
     # Test standard format: 1234.56
     assert normalizer.normalize_amount("1234.56") == 1234.56
 
+
 def test_account_number_validation():
     """Test account number normalization"""
     from app.utils.normalizer import DataNormalizer
@@ -83,5 +118,463 @@ def test_account_number_validation():
     assert normalizer.normalize_account_number("x") is None
     assert normalizer.normalize_account_number("12345678901234567890123") is None
 
+
+@pytest.mark.asyncio
+async def test_processing_pool_runs_stages_off_loop():
+    """Test the CSV ingest stage through both process and thread routing"""
+    from app.worker_pool import ProcessingPool
+    from app.ingest_context import CSV_FRAME
+    
+    csv_content = b'Konto;Bezeichnung;Saldo\n1000;Kasse;100,00\n1200;Bank;2.500,00'
+    
+    for mode in ("process", "thread"):
+        pool = ProcessingPool(max_workers=1, stage_routing={"tabular_ingest": mode}, warm_up=False)
+        try:
+            context = await pool.run("tabular_ingest", csv_content, "csv", "saldenliste.csv")
+        finally:
+            pool.shutdown()
+        assert context.delimiter == ';'
+        assert context.head_lines[0] == 'Konto;Bezeichnung;Saldo'
+        assert context.sheet_frame(CSV_FRAME).shape == (3, 3)
+
+
+@pytest.mark.asyncio
+async def test_processing_pool_warms_every_worker(monkeypatch):
+    """Test warm-up reaches each of the pool's worker processes"""
+    from app import worker_pool
+
+    # Forked workers inherit the flag and skip loading the Docling models
+    monkeypatch.setattr(worker_pool, "_docling_warm", True)
+    pool = worker_pool.ProcessingPool(max_workers=3, warm_up=True, start_method="fork")
+    try:
+        await pool.warm_up_workers()
+        assert pool.ready and pool.warm_up_error is None
+        assert len(pool._process_executor._processes) == 3
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_processing_pool_replaces_broken_executor(monkeypatch):
+    """Test a worker dying shuts the broken executor down and the next stage gets a fresh pool"""
+    import os
+    from concurrent.futures.process import BrokenProcessPool
+    from app import worker_pool
+
+    # Forked workers inherit the patched stage table
+    monkeypatch.setitem(worker_pool.STAGES, "raw_storage", lambda: os._exit(1))
+    pool = worker_pool.ProcessingPool(max_workers=1, warm_up=False, start_method="fork")
+    try:
+        broken = pool._executor_for("raw_storage")
+        shutdowns = []
+        monkeypatch.setattr(broken, "shutdown", lambda **kwargs: shutdowns.append(kwargs))
+        with pytest.raises(BrokenProcessPool):
+            await pool.run("raw_storage")
+        assert shutdowns == [{"wait": False, "cancel_futures": True}]
+        assert pool._process_executor is None
+
+        context = await pool.run("tabular_ingest", b'Konto;Saldo\n1000;1,00', "csv", "tb.csv")
+        assert context.delimiter == ';'
+    finally:
+        pool.shutdown()
+
+
+def test_processing_pool_rejects_invalid_routing():
+    """Test stage routing validation"""
+    from app.worker_pool import ProcessingPool
+    
+    with pytest.raises(ValueError):
+        ProcessingPool(stage_routing={"pdf_parse": "gpu"})
+    with pytest.raises(ValueError):
+        ProcessingPool(stage_routing={"unknown_stage": "thread"})
+
+
+def test_job_store_lifecycle(tmp_path):
+    """Test jobs are claimed once, recovered only from dead owners and expire after their TTL"""
+    from app.jobs import JobStore, QUEUED, RUNNING, SUCCEEDED, job_owner_id, _owner_gone
+
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    job_uuid = store.enqueue('tb.csv', str(tmp_path / 'tb.csv'), None, {"entity_uuid": "e1"})
+    assert store.get(job_uuid)["status"] == QUEUED
+
+    claimed = store.claim_next('host-a:100:x', lease_seconds=60)
+    assert claimed["job_uuid"] == job_uuid and claimed["status"] == RUNNING
+    assert claimed["owner"] == 'host-a:100:x'
+    assert store.claim_next('host-b:200:y', lease_seconds=60) is None
+
+    # A live sibling's job is left alone; once its lease runs out it is requeued
+    assert store.recover_interrupted('host-b:200:y', max_attempts=2, ttl_seconds=60) == 0
+    store.renew_leases('host-a:100:x', lease_seconds=-1)
+    assert store.recover_interrupted('host-b:200:y', max_attempts=2, ttl_seconds=60) == 1
+    assert store.claim_next('host-b:200:y', lease_seconds=60)["attempts"] == 2
+
+    # An earlier runner of this very process is gone, the current one is not
+    current = job_owner_id()
+    assert _owner_gone(current.rsplit(':', 1)[0] + ':earlier', current)
+    assert not _owner_gone(current, current)
+
+    # Only the current owner finishes a running job, and only once
+    assert not store.mark_succeeded(job_uuid, 'host-a:100:x', '{"success": true}', ttl_seconds=60)
+    assert store.mark_succeeded(job_uuid, 'host-b:200:y', '{"success": true}', ttl_seconds=60)
+    assert store.get(job_uuid)["status"] == SUCCEEDED
+    assert not store.mark_failed(job_uuid, 'host-b:200:y', 'late', ttl_seconds=60)
+
+    # A cancel that lands first is not overwritten by the finishing worker
+    other_uuid = store.enqueue('other.csv', str(tmp_path / 'other.csv'), None, {"entity_uuid": "e1"})
+    store.claim_next('host-b:200:y', lease_seconds=60)
+    assert store.mark_cancelled(other_uuid, ttl_seconds=-1)
+    assert not store.mark_succeeded(other_uuid, 'host-b:200:y', '{"success": true}', ttl_seconds=60)
+    assert store.get(other_uuid) is None
+    assert store.purge_expired() == [str(tmp_path / 'other.csv')]
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_job_cancelled_through_another_process(tmp_path):
+    """Test a job stopped by another API process's cancel flag is recorded as cancelled and its file removed"""
+    from types import SimpleNamespace
+    from app.jobs import CANCELLED, JobRunner, JobStore
+    from app.progress import JobCancelled
+
+    events = []
+    progress = SimpleNamespace(
+        open=lambda token: None,
+        publish=lambda token, event, data: None,
+        close=lambda token, event, data: events.append(data)
+    )
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+
+    class CancelledElsewhere:
+        processing_pool = SimpleNamespace(progress=progress)
+
+        async def process(self, *args, **kwargs):
+            # The other process flags the job and marks it cancelled; the pool worker sees the flag
+            store.mark_cancelled(job_uuid, ttl_seconds=60)
+            raise JobCancelled(f"Job {job_uuid} was cancelled")
+
+    file_path = tmp_path / 'tb.csv'
+    file_path.write_text("Account,Amount\n1000,1.00\n")
+    job_uuid = store.enqueue('tb.csv', str(file_path), None, {"entity_uuid": "e1"})
+    runner = JobRunner(store, CancelledElsewhere())
+    await runner._run_job(store.claim_next(runner.owner, lease_seconds=60))
+
+    assert store.get(job_uuid)["status"] == CANCELLED
+    assert events[-1]["status"] == CANCELLED
+    assert not file_path.exists()
+    store.close()
+
+
+def test_job_api_round_trip():
+    """Test a queued CSV job can be polled until its result is available"""
+    import time
+
+    csv_content = "Account,Description,Amount\n1000,Cash,1500.00\n2000,Accounts Payable,-1500.00\n"
+    with TestClient(app) as job_client:
+        response = job_client.post(
+            "/jobs",
+            files={"file": ("tb.csv", csv_content.encode(), "text/csv")},
+            data={"entity_uuid": "test-entity"}
+        )
+        assert response.status_code == 202
+        status_url = response.json()["status_url"]
+
+        for _ in range(100):
+            job = job_client.get(status_url).json()
+            if job["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(0.2)
+
+        assert job["status"] == "succeeded", job.get("error")
+        assert job["result"]["success"] is True
+        assert job_client.get("/jobs/unknown").status_code == 404
+
+
+def test_process_file_streams_ndjson():
+    """Test ?stream=ndjson emits one row per line followed by a trailer record"""
+    import json
+
+    csv_content = "Account,Description,Amount\n1000,Cash,1500.00\n2000,Accounts Payable,-1500.00\n"
+    response = client.post(
+        "/process-file?stream=ndjson",
+        files={"file": ("tb.csv", csv_content.encode(), "text/csv")},
+        data={"entity_uuid": "test-entity"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    trailer = records[-1]
+    assert trailer["type"] == "trailer"
+    assert trailer["row_count"] == len(records) - 1
+    assert all(record["entity_uuid"] == "test-entity" for record in records[:-1])
+
+
+def test_ndjson_trailer_matches_json_summary():
+    """Test the NDJSON trailer reports the same validation and quality as the JSON response for one file"""
+    import json
+
+    csv_content = (
+        "Konto;Bezeichnung;Saldo\n1000;Kasse;100,00\n1000;Kasse;-100,00\n7;Bank;0,00\n"
+        "1200;Forderungen;20000000000,00\n8400;Erlöse;5,50\n"
+    )
+    upload = {"file": ("parity.csv", csv_content.encode(), "text/csv")}
+    summary = client.post("/process-file", files=upload, data={"entity_uuid": "parity-entity"}).json()
+    records = [
+        json.loads(line) for line in client.post(
+            "/process-file?stream=ndjson", files=upload, data={"entity_uuid": "parity-entity"}
+        ).text.splitlines()
+    ]
+    trailer = records[-1]
+
+    assert trailer["row_order"] == "described_first"
+    assert [record["source_row_number"] for record in records[:-1]] == [row["source_row_number"] for row in summary["data"]]
+    assert trailer["row_count"] == summary["row_count"] == 5
+    assert trailer["validation_results"] == summary["validation_results"]
+    assert trailer["quality_report"] == summary["quality_report"]
+    assert {warning["type"] for warning in trailer["validation_results"]["warnings"]} >= {"duplicate_account", "extreme_amount"}
+
+
+@pytest.mark.asyncio
+async def test_described_rows_stream_before_inference():
+    """Test described_first yields described rows before awaiting description inference"""
+    from app.pandas_analyzer import PandasAnalyzer
+
+    analyzer = PandasAnalyzer()
+    order = []
+
+    async def infer(account_numbers):
+        order.append("inference")
+        return {account_number: "Inferred" for account_number in account_numbers}
+
+    analyzer._infer_missing_descriptions = infer
+    rows = [
+        {"Konto": "9999", "Bezeichnung": "", "Saldo": "1,00"},
+        {"Konto": "1000", "Bezeichnung": "Kasse", "Saldo": "2,00"},
+    ]
+    async for row in analyzer.iter_normalized_rows(rows, "entity-1", "tb.csv", described_first=True):
+        order.append((row.account_number, row.account_description))
+    assert order == [("1000", "Kasse"), "inference", ("9999", "Inferred")]
+
+
+def test_process_batch_reports_each_file():
+    """Test a batch with one good and one unsupported file returns per-file status"""
+    csv_content = "Account,Description,Amount\n1000,Cash,1500.00\n2000,Accounts Payable,-1500.00\n"
+    response = client.post(
+        "/process-batch",
+        files=[
+            ("files", ("tb.csv", csv_content.encode(), "text/csv")),
+            ("files", ("notes.bin", b"\x00\x01\x02", "application/octet-stream")),
+        ],
+        data={"entity_uuid": "test-entity"}
+    )
+    assert response.status_code == 200
+    batch = response.json()
+    assert batch["file_count"] == 2
+    statuses = {result["filename"]: result["status"] for result in batch["files"]}
+    assert statuses == {"tb.csv": "succeeded", "notes.bin": "failed"}
+
+
+def test_ready_probe_reports_startup_timings():
+    """Test /ready reports readiness separately from /health"""
+    with TestClient(app) as ready_client:
+        response = ready_client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+        assert response.json()["import_seconds"] > 0
+
+
+def test_column_analyzer_is_shared(monkeypatch):
+    """Test all processors share one GPT5ColumnAnalyzer"""
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    monkeypatch.setattr('app.gpt5_column_analyzer._shared_analyzer', None)
+    from app.pandas_analyzer import PandasAnalyzer
+    from app.raw_file_analyzer import RawFileAnalyzer
+
+    assert PandasAnalyzer().gpt5_analyzer is RawFileAnalyzer().gpt5_analyzer
+
+
+@pytest.mark.asyncio
+async def test_llm_calls_share_pooled_client(monkeypatch):
+    """Test GPT calls reuse one pooled client pointed at the configured base URL"""
+    import httpx
+    from app.gpt5_column_analyzer import GPT5ColumnAnalyzer
+    from app.llm_client import LLMHttpClient
+
+    requests = []
+
+    def handler(request):
+        requests.append(str(request.url))
+        return httpx.Response(200, json={"choices": [{"message": {"content": '{"ok": true}'}}]})
+
+    llm_client = LLMHttpClient(base_url="http://llm-stand-in:8080/v1/", transport=httpx.MockTransport(handler))
+    monkeypatch.setattr('app.gpt5_column_analyzer.get_llm_client', lambda: llm_client)
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    monkeypatch.setenv('LLM_CACHE_ENABLED', 'false')
+    analyzer = GPT5ColumnAnalyzer()
+
+    for _ in range(3):
+        assert await analyzer._call_gpt5_api("prompt") == '{"ok": true}'
+    assert requests == ["http://llm-stand-in:8080/v1/chat/completions"] * 3
+    assert llm_client.clients_created == 1
+
+    await llm_client.aclose()
+    await analyzer._call_gpt5_api("prompt")
+    assert llm_client.clients_created == 2
+    await llm_client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_description_inference_is_batched(monkeypatch):
+    """Test missing descriptions are inferred once per unique account, in bounded concurrent chunks"""
+    import json
+    from app.gpt5_column_analyzer import GPT5ColumnAnalyzer
+    from app.pandas_analyzer import PandasAnalyzer
+
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    monkeypatch.setenv('LLM_DESCRIPTION_CHUNK_SIZE', '2')
+    gpt5_analyzer = GPT5ColumnAnalyzer()
+    prompts = []
+
+    async def fake_call(prompt, max_tokens=1500, call_site="default"):
+        numbers = json.loads(prompt.split('Account Numbers: ')[1].split('\n')[0])
+        prompts.append(numbers)
+        return json.dumps({number: f"Konto {number}" for number in numbers})
+
+    async def fixed_mapping(column_names, sample_data=None, layout_fingerprint=None, entity_uuid=None):
+        return {'account_number': 'Konto', 'amount': 'Saldo'}, 'patterns'
+
+    monkeypatch.setattr(gpt5_analyzer, '_call_gpt5_api', fake_call)
+    analyzer = PandasAnalyzer()
+    analyzer.gpt5_analyzer = gpt5_analyzer
+    monkeypatch.setattr(analyzer, '_identify_columns', fixed_mapping)
+
+    # Accounts outside the bundled chart of accounts index
+    parsed = [{'Konto': number, 'Saldo': '1,00'} for number in ['1203', '1001', '1203', '4401', '8401']]
+    rows = await analyzer.normalize_data(parsed, 'entity-1', 'tb.csv')
+
+    assert sorted(prompts) == [['1001', '1203'], ['4401', '8401']]
+    assert [row.account_description for row in rows] == ['Konto 1203', 'Konto 1001', 'Konto 1203', 'Konto 4401', 'Konto 8401']
+    assert all(row.extraction_confidence == 0.7 for row in rows)
+
+
+def test_metrics_and_stage_timings():
+    """Test responses carry per-stage timings and /metrics exposes the stage histograms"""
+    csv_content = "Account,Description,Amount\n1000,Cash,1500.00\n2000,Accounts Payable,-1500.00\n"
+    response = client.post(
+        "/process-file",
+        files={"file": ("tb.csv", csv_content.encode(), "text/csv")},
+        data={"entity_uuid": "test-entity"}
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["processing_time_seconds"] > 0
+    assert {"detection", "parsing", "normalization", "validation", "quality_report"} <= set(result["stage_timings"])
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert 'processing_stage_duration_seconds_count{file_type="csv",stage="parsing"}' in metrics.text
+    assert "processing_job_queue_depth" in metrics.text
+    assert 'http_requests_in_flight{path="/process-file"}' in metrics.text
+
+
+def test_process_file_columnar_formats():
+    """Test format=arrow and format=parquet return the row table with the summary attached"""
+    import io
+    import json
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from app.columnar import SUMMARY_METADATA_KEY, TRIAL_BALANCE_SCHEMA
+
+    csv_content = "Account,Description,Amount\n1000,Cash,1500.00\n2000,Accounts Payable,-1500.00\n"
+    tables = {}
+    for output_format in ("arrow", "parquet"):
+        response = client.post(
+            f"/process-file?format={output_format}",
+            files={"file": ("tb.csv", csv_content.encode(), "text/csv")},
+            data={"entity_uuid": "test-entity"}
+        )
+        assert response.status_code == 200
+        if output_format == "arrow":
+            tables[output_format] = pa.ipc.open_stream(response.content).read_all()
+        else:
+            tables[output_format] = pq.read_table(io.BytesIO(response.content))
+
+    for table in tables.values():
+        assert table.schema.equals(TRIAL_BALANCE_SCHEMA, check_metadata=False)
+        summary = json.loads(table.schema.metadata[SUMMARY_METADATA_KEY])
+        assert summary["row_count"] == table.num_rows
+        assert set(table.column("entity_uuid").to_pylist()) == {"test-entity"}
+
+
+@pytest.mark.asyncio
+async def test_columnar_output_validates_records():
+    """Test records that fail row validation are skipped in columnar output, and valid ones coerced"""
+    from app.columnar import collect_table
+
+    valid = {
+        "entity_uuid": "test-entity", "account_number": "1000", "period_key_yyyymm": "202401",
+        "period_start_date": "2024-01-01", "period_end_date": "2024-01-31", "as_of_date": "2024-01-31",
+        "amount": "1500.5", "source_system": "csv", "source_file_name": "tb.csv", "source_row_number": 2,
+        "source_hash": "abc"
+    }
+
+    async def records():
+        yield valid
+        yield {**valid, "source_row_number": 3, "amount": "not a number"}
+        yield {**valid, "source_row_number": 4, "extraction_confidence": 1.5}
+
+    table = await collect_table(records())
+    assert table.num_rows == 1
+    assert table.column("amount").to_pylist() == [1500.5]
+    assert table.column("period_key_yyyymm").to_pylist() == [202401]
+
+
+def test_job_events_stream_progress():
+    """Test /jobs/{job_uuid}/events streams phases and row counts, then the final status"""
+    import json
+
+    csv_content = "Account,Description,Amount\n1000,Cash,1500.00\n2000,Accounts Payable,-1500.00\n"
+    with TestClient(app) as job_client:
+        job = job_client.post(
+            "/jobs",
+            files={"file": ("tb.csv", csv_content.encode(), "text/csv")},
+            data={"entity_uuid": "test-entity"}
+        ).json()
+
+        response = job_client.get(job["events_url"])
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = []
+        for message in response.text.strip().split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in message.splitlines() if not line.startswith(":"))
+            events.append((fields["event"], json.loads(fields["data"])))
+
+        assert events[-1] == ("status", {"job_uuid": job["job_uuid"], "status": "succeeded", "row_count": 2})
+        # A subscriber that connects late still gets the final status
+        if len(events) > 1:
+            phases = [data["phase"] for event, data in events if event == "phase"]
+            assert phases[:1] == ["detection"] and "normalization" in phases
+            assert ("rows", {"rows_parsed": 2, "rows_normalized": 2}) in events
+
+
+def test_cancel_queued_job():
+    """Test DELETE /jobs/{job_uuid} cancels a queued job and its event stream ends with that status"""
+    # Module-level client: no lifespan, so no job workers pick the job up
+    job = client.post(
+        "/jobs",
+        files={"file": ("tb.csv", b"Account,Amount\n1000,1.00\n", "text/csv")},
+        data={"entity_uuid": "test-entity"}
+    ).json()
+
+    cancelled = client.delete(f"/jobs/{job['job_uuid']}")
+    assert cancelled.status_code == 200
+    assert cancelled.json()["status"] == "cancelled"
+
+    events = client.get(job["events_url"]).text
+    assert "event: status" in events and '"status": "cancelled"' in events
+    assert client.delete("/jobs/unknown").status_code == 404
+
+
 if __name__ == "__main__":
-    pytest.main([__file__])
\ No newline at end of file
+    pytest.main([__file__])
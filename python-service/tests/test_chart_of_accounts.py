@@ -0,0 +1,45 @@
+import pytest
+
+from app.chart_of_accounts import SKR03, SKR04, detect_chart, get_chart_index, ledger_length_of
+
+
+def test_lookup_describes_and_classifies_accounts():
+    """Test exact descriptions, range classes, personal accounts and extended ledger lengths"""
+    entries = get_chart_index(SKR03).lookup(['27', '1200', '4711', '8400', '9000', '10001', '70002', 'Summe'])
+
+    assert entries['description'].tolist() == [
+        'EDV-Software', 'Bank', None, 'Erlöse 19 % USt', 'Saldenvorträge, Sachkonten', None, None, None
+    ]
+    assert entries['account_type'].tolist() == ['bs', 'bs', 'pl', 'pl', 'statistical', 'subledger', 'subledger', None]
+    assert entries['category'].tolist()[5:7] == ['receivables', 'liabilities']
+
+    # Five-digit ledger accounts (trailing zero), six-digit personal accounts
+    entries = get_chart_index(SKR04).lookup(['18000', '44000', '44001', '100010'])
+    assert entries['description'].tolist() == ['Bank', 'Erlöse 19 % USt', None, None]
+    assert entries['account_type'].tolist() == ['bs', 'pl', 'pl', 'subledger']
+
+def test_personal_accounts_outnumbering_ledger_accounts():
+    """Test 5-digit debtors in the majority are still read as personal accounts of 4-digit ledger accounts"""
+    numbers = ['1200', '4400', '8400'] + [str(10000 + i) for i in range(5)] + ['70000', '70001']
+    assert ledger_length_of(numbers) == 4
+
+    entries = get_chart_index(SKR03).lookup(numbers)
+    assert entries['description'].tolist()[:4] == ['Bank', None, 'Erlöse 19 % USt', None]
+    assert entries['account_type'].tolist()[3:] == ['subledger'] * 7
+    assert entries['category'].tolist()[3:] == ['receivables'] * 5 + ['liabilities'] * 2
+
+    # A single stray short number does not make the ledger length
+    assert ledger_length_of(['2024', '18000', '44000', '100010']) == 5
+
+def test_detect_chart(monkeypatch):
+    """Test the chart is told apart by known numbers and descriptions, or forced by configuration"""
+    monkeypatch.delenv('CHART_OF_ACCOUNTS', raising=False)
+    assert detect_chart(['1000', '1200', '1400', '1600', '8400']) == SKR03
+    assert detect_chart(['1600', '1800', '3300', '4400', '6815']) == SKR04
+    assert detect_chart(['1200', '1600'], ['Forderungen aus Lieferungen und Leistungen', 'Kasse']) == SKR04
+
+    monkeypatch.setenv('CHART_OF_ACCOUNTS', 'skr04')
+    assert detect_chart(['1000', '1200', '8400']) == SKR04
+
+    with pytest.raises(ValueError):
+        get_chart_index('skr07')
@@ -0,0 +1,295 @@
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+
+
+@pytest.mark.asyncio
+async def test_spool_upload_hashes_and_cleans_up(tmp_path):
+    """Test upload spooling writes one file and hashes it on the way"""
+    from app.ingest import spool_upload
+
+    content = b'Konto;Bezeichnung;Saldo\n' + b'1000;Kasse;100,00\n' * 1000
+    upload = UploadFile(file=io.BytesIO(content), filename='saldenliste.csv')
+
+    spooled = await spool_upload(upload, spool_dir=str(tmp_path))
+    with spooled:
+        assert spooled.size == len(content)
+        assert spooled.sha256 == hashlib.sha256(content).hexdigest()
+        assert spooled.path.endswith('.csv')
+        with spooled.open() as handle:
+            assert handle.read() == content
+    assert not os.path.exists(spooled.path)
+
+def test_source_helpers_accept_paths_and_bytes(tmp_path):
+    """Test the same helpers work for spooled files and in-memory bytes"""
+    from app.ingest import read_head_lines, read_prefix, detect_text_encoding, map_source
+
+    content = 'Konto;Bezeichnung\n1000;Kasse\n1200;Bankkonto Übersicht\n'.encode('latin1')
+    path = tmp_path / 'latin1.csv'
+    path.write_bytes(content)
+
+    for source in (content, str(path)):
+        assert read_prefix(source, 5) == b'Konto'
+        assert read_head_lines(source, 2, 'latin1') == ['Konto;Bezeichnung', '1000;Kasse']
+        assert detect_text_encoding(source, ['utf-8', 'latin1']) == 'latin1'
+        with map_source(source) as buffer:
+            assert buffer[:5] == b'Konto'
+
+@pytest.mark.asyncio
+async def test_file_detector_reads_spooled_path(tmp_path):
+    """Test file type detection from a path instead of bytes"""
+    from app.utils.file_detector import FileDetector
+
+    path = tmp_path / 'upload.csv'
+    path.write_bytes(b'Account,Description\n1000,Cash\n2000,Accounts Receivable')
+
+    detector = FileDetector()
+    assert await detector.detect_file_type(str(path), 'upload.csv') == 'csv'
+
+def test_spool_archive_extracts_members(tmp_path):
+    """Test ZIP members are spooled individually and Office files are not treated as archives"""
+    import zipfile
+    from openpyxl import Workbook
+    from app.ingest import is_zip_archive, spool_archive
+
+    archive_path = tmp_path / 'month_end.zip'
+    with zipfile.ZipFile(archive_path, 'w') as archive:
+        archive.writestr('jan/tb_01.csv', 'Konto;Saldo\n1000;1,00\n')
+        archive.writestr('jan/tb_02.csv', 'Konto;Saldo\n1200;2,00\n')
+        archive.writestr('__MACOSX/jan/._tb_01.csv', 'junk')
+    workbook_path = tmp_path / 'tb.xlsx'
+    Workbook().save(workbook_path)
+
+    assert is_zip_archive(str(archive_path))
+    assert not is_zip_archive(str(workbook_path))
+
+    members = spool_archive(str(archive_path), spool_dir=str(tmp_path))
+    assert sorted(member.filename for member in members) == ['tb_01.csv', 'tb_02.csv']
+    assert all(os.path.exists(member.path) for member in members)
+
+    with pytest.raises(ValueError):
+        spool_archive(str(archive_path), spool_dir=str(tmp_path), max_files=1)
+
+def test_ingest_context_parses_workbook_once(tmp_path, monkeypatch):
+    """Test raw previews and tabular parsing both read the frames cached by one IngestContext"""
+    import pandas as pd
+    from openpyxl import Workbook
+    from app.ingest_context import IngestContext
+    from app.pandas_analyzer import PandasAnalyzer
+    from app.raw_file_analyzer import RawFileAnalyzer
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Saldenliste'
+    sheet.append(['Konto', 'Bezeichnung', 'Saldo'])
+    sheet.append([1000, 'Kasse', 100.5])
+    sheet.append([1200, 'Bank', 2500])
+    workbook.create_sheet('Notizen').append(['Hinweis', 'vorläufig'])
+    path = tmp_path / 'tb.xlsx'
+    workbook.save(path)
+
+    opened = []
+    excel_file = pd.ExcelFile
+
+    def counting_excel_file(*args, **kwargs):
+        opened.append(args)
+        return excel_file(*args, **kwargs)
+
+    monkeypatch.setattr(pd, 'ExcelFile', counting_excel_file)
+
+    context = IngestContext.load(str(path), 'xlsx', 'tb.xlsx')
+    sheet_names, previews = RawFileAnalyzer().collect_excel_previews(context)
+    rows = PandasAnalyzer().parse_tabular_file(context, 'xlsx', 'tb.xlsx', {'recommended_sheet': 'Saldenliste'})
+
+    assert sheet_names == ['Saldenliste', 'Notizen']
+    assert 'Kasse' in previews['Saldenliste']
+    assert [row['Account_Description'] for row in rows] == ['Kasse', 'Bank']
+    assert len(opened) == 1
+
+
+def test_ingest_context_pickles_previews_only(tmp_path):
+    """Test a context handed between processes carries its previews but not full frames"""
+    import pickle
+    from app.ingest_context import CSV_FRAME, IngestContext
+
+    path = tmp_path / 'tb.csv'
+    path.write_text('Konto;Saldo\n' + ''.join(f'{1000 + i};{i},00\n' for i in range(500)))
+    context = IngestContext.load(str(path), 'csv', 'tb.csv')
+    assert len(context.sheet_frame(CSV_FRAME)) == 501
+
+    copy = pickle.loads(pickle.dumps(context))
+    assert copy.frames == {} and len(copy.previews[CSV_FRAME]) == len(context.previews[CSV_FRAME])
+    assert len(copy.sheet_frame(CSV_FRAME)) == 501
+    assert len(context.frames) == 1
+
+
+def test_spreadsheet_reader_engines_agree(tmp_path):
+    """Test calamine and openpyxl read the same raw values, and pyarrow CSV falls back on ragged rows"""
+    from openpyxl import Workbook
+    from app.spreadsheet_reader import CALAMINE, OPENPYXL, PANDAS_C, PYARROW, read_csv_frame, read_excel_sheets
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Saldenliste'
+    sheet.append(['Konto', 'Bezeichnung', 'Saldo'])
+    sheet.append([1000, 'Kasse', 100.5])
+    sheet.append([1200, None, -2500])
+    workbook.create_sheet('Notizen').append(['Hinweis'])
+    path = tmp_path / 'tb.xlsx'
+    workbook.save(path)
+
+    results = {engine: read_excel_sheets(str(path), max_sheets=1, engine=engine) for engine in (CALAMINE, OPENPYXL)}
+    sheet_names, frames = results[CALAMINE]
+    assert sheet_names == ['Saldenliste', 'Notizen'] and list(frames) == ['Saldenliste']
+    assert frames['Saldenliste'].astype(str).values.tolist() == results[OPENPYXL][1]['Saldenliste'].astype(str).values.tolist()
+
+    with pytest.raises(ValueError):
+        read_excel_sheets(str(path), engine='xlrd')
+
+    # A short trailing line is a parse error for pyarrow; the C parser pads it
+    csv_content = 'Konto;Bezeichnung;Saldo\n1000;Kasse;100,50\nSumme;100,50\n'.encode('cp1252')
+    for engine in (PYARROW, PANDAS_C):
+        frame = read_csv_frame(csv_content, ';', 'cp1252', engine=engine)
+        assert frame.shape == (3, 3)
+        assert frame.iloc[2].isna().tolist() == [False, False, True]
+
+
+@pytest.mark.asyncio
+async def test_csv_bytes_outside_the_guessed_encoding_stay_text(tmp_path):
+    """Test a byte the guessed encoding cannot decode, after the detection prefix, is replaced rather than read as binary"""
+    from app.ingest_context import CSV_FRAME, IngestContext
+    from app.spreadsheet_reader import PYARROW, read_csv_frame
+    from app.utils.file_detector import DETECTION_PREFIX_BYTES, FileDetector
+
+    frame = read_csv_frame(b'Konto;Bezeichnung\n1;K\xe4sse\n', ';', 'utf-8', engine=PYARROW)
+    assert frame.iloc[1, 1] == 'K\ufffdsse'
+
+    lines = [f'{1000 + i};Konto {i};{i},00' for i in range(DETECTION_PREFIX_BYTES // 16)]
+    path = tmp_path / 'datev.csv'
+    path.write_bytes('\n'.join(['Konto;Beschriftung;Saldo', *lines, '0200;Gebäude;1,00']).encode('cp1252'))
+    detection = await FileDetector().detect(str(path), 'datev.csv')
+    context = IngestContext.load(str(path), 'csv', 'datev.csv', detection=detection, csv_engine=PYARROW)
+    descriptions = context.sheet_frame(CSV_FRAME)[1]
+    assert all(isinstance(value, str) for value in descriptions)
+    # The prefix is plain ASCII, so the encoding is settled on the whole file
+    assert detection.encoding is None
+    assert context.encoding == 'cp1252' and context.encoding_verified
+    assert descriptions.iloc[-1] == 'Gebäude'
+
+
+def test_ingest_context_streams_bounded_previews(tmp_path, monkeypatch):
+    """Test loading streams sheet previews without parsing whole sheets, values matching a full parse"""
+    import datetime
+    import pandas as pd
+    from openpyxl import Workbook
+    from app.ingest_context import CSV_FRAME, PREVIEW_ROWS, IngestContext
+    from app.xlsx_stream import XlsxArchive
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Saldenliste'
+    sheet.append(['Konto', 'Bezeichnung', 'Saldo', 'Datum'])
+    sheet.append([])
+    for i in range(5000):
+        sheet.append([1000 + i, f'Konto {i}', i * 1.5, datetime.datetime(2024, 12, 31)])
+    hidden = workbook.create_sheet('Intern')
+    hidden.sheet_state = 'hidden'
+    hidden.append(['Hinweis'])
+    path = tmp_path / 'tb.xlsx'
+    workbook.save(path)
+
+    opened = []
+    excel_file = pd.ExcelFile
+
+    def counting_excel_file(*args, **kwargs):
+        opened.append(args)
+        return excel_file(*args, **kwargs)
+
+    monkeypatch.setattr(pd, 'ExcelFile', counting_excel_file)
+
+    context = IngestContext.load(str(path), 'xlsx', 'tb.xlsx')
+    assert context.sheet_names == ['Saldenliste', 'Intern']
+    assert opened == [] and context.frames == {}
+
+    preview = context.previews['Saldenliste']
+    assert len(preview) == PREVIEW_ROWS
+    assert preview.iloc[0].tolist() == ['Konto', 'Bezeichnung', 'Saldo', 'Datum']
+    assert preview.iloc[1].isna().all()
+    assert preview.iloc[3].tolist() == [1001, 'Konto 1', 1.5, datetime.datetime(2024, 12, 31)]
+
+    frame = context.sheet_frame('Saldenliste')
+    assert len(opened) == 1 and len(frame) == 5002
+    assert str(frame.iloc[3, 1]) == 'Konto 1'
+
+    with XlsxArchive(str(path)) as archive:
+        assert archive.sheet('Intern').state == 'hidden'
+
+    csv_path = tmp_path / 'tb.csv'
+    csv_path.write_text('Konto;Saldo\n' + '1000;1,00\n' * 5000, encoding='utf-8')
+    csv_context = IngestContext.load(str(csv_path), 'csv', 'tb.csv')
+    assert len(csv_context.previews[CSV_FRAME]) == PREVIEW_ROWS and csv_context.frames == {}
+
+
+def test_xlsx_stream_reads_iso_date_cells(tmp_path):
+    """Test cells stored as ISO 8601 dates (t="d") are read as their text"""
+    import xml.etree.ElementTree as ET
+    from openpyxl import Workbook
+    from app.xlsx_stream import XlsxArchive
+
+    path = tmp_path / 'tb.xlsx'
+    Workbook().save(path)
+    with XlsxArchive(str(path)) as archive:
+        cell = ET.fromstring('<c r="A1" t="d"><v>2024-12-31T00:00:00</v></c>')
+        assert archive._cell_value(cell) == '2024-12-31T00:00:00'
+
+
+def test_sheet_names_rank_by_keyword_priority():
+    """Test name-only ranking picks the sheet with the highest priority keyword, not the first match"""
+    from app.pandas_analyzer import PandasAnalyzer
+    from app.sheet_triage import rank_sheet_names
+
+    names = ['Deckblatt', 'Konto 1200', 'BWA', 'Summen und Salden']
+    assert [profile.name for profile in rank_sheet_names(names)] == [
+        'Summen und Salden', 'BWA', 'Konto 1200', 'Deckblatt'
+    ]
+    analyzer = PandasAnalyzer()
+    assert analyzer._select_best_sheet(names) == 'Summen und Salden'
+    assert analyzer._select_best_sheet(['Deckblatt', 'Notizen']) == 'Deckblatt'
+
+
+def test_sheet_triage_ranks_from_metadata(tmp_path):
+    """Test sheet triage prefers the visible, populated sheet with accounting headers"""
+    from openpyxl import Workbook
+    from app.ingest_context import IngestContext
+    from app.pandas_analyzer import PandasAnalyzer
+    from app.xlsx_stream import XlsxArchive
+    from app.sheet_triage import triage_workbook
+
+    workbook = Workbook()
+    cover = workbook.active
+    cover.title = 'Deckblatt'
+    cover.append(['Mandant 10001'])
+    old = workbook.create_sheet('Saldenliste 2022')
+    old.sheet_state = 'hidden'
+    old.append(['Konto', 'Saldo'])
+    data = workbook.create_sheet('Export')
+    data.append(['Kontonummer', 'Beschriftung', 'Soll', 'Haben'])
+    for i in range(200):
+        data.append([1000 + i, f'Konto {i}', i, 0])
+    path = tmp_path / 'tb.xlsx'
+    workbook.save(path)
+
+    with XlsxArchive(str(path)) as archive:
+        ranked = triage_workbook(archive)
+    assert [profile.name for profile in ranked] == ['Export', 'Saldenliste 2022', 'Deckblatt']
+    assert (ranked[0].rows, ranked[0].columns) == (201, 4)
+    assert ranked[0].header_keywords == ['konto', 'beschriftung', 'soll', 'haben']
+    assert ranked[1].state == 'hidden'
+
+    context = IngestContext.load(str(path), 'xlsx', 'tb.xlsx', max_sheets=1)
+    assert list(context.previews) == ['Export'] and context.best_sheet == 'Export'
+    rows = PandasAnalyzer().parse_tabular_file(context, 'xlsx', 'tb.xlsx')
+    assert len(rows) == 200 and list(context.frames) == ['Export']
@@ -0,0 +1,61 @@
+import pytest
+
+from app.ingest_context import IngestContext
+from app.layout_cache import LayoutCache, layout_fingerprint
+from app.models import FileType
+
+
+def _export(path, month, header="Konto;Beschriftung;Saldo", sign=""):
+    lines = [f"Summen- und Saldenliste {month:02d}/2024;;", header]
+    lines += [f"{1000 + i};Konto {i};{sign}{i * 7}.{i:03d},{month:02d}" for i in range(20)]
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return IngestContext.load(str(path), 'csv', path.name)
+
+
+def test_fingerprint_is_stable_across_months(tmp_path):
+    """Test next month's export of a layout matches, while another header does not"""
+    january = layout_fingerprint(_export(tmp_path / "jan.csv", 1))
+    assert layout_fingerprint(_export(tmp_path / "feb.csv", 2, sign="-")) == january
+    assert layout_fingerprint(_export(tmp_path / "other.csv", 1, header="Konto;Bezeichnung;Saldo")) != january
+
+@pytest.mark.asyncio
+async def test_known_layout_skips_llm(tmp_path, counting_analyzer):
+    """Test a stored analysis is reused with decaying confidence, and invalidation forces a new analysis"""
+    from app.raw_file_analyzer import RawFileAnalyzer
+
+    analyzer = RawFileAnalyzer()
+    analyzer.gpt5_analyzer = counting_analyzer
+    analyzer.layout_cache = LayoutCache(db_path=str(tmp_path / "layouts.sqlite3"), enabled=True)
+
+    first = await analyzer.analyze_raw_file_structure(_export(tmp_path / "jan.csv", 1), FileType.CSV, "jan.csv")
+    second = await analyzer.analyze_raw_file_structure(_export(tmp_path / "feb.csv", 2), FileType.CSV, "feb.csv")
+    fingerprint = first.processing_hints["layout_fingerprint"]
+
+    assert analyzer.gpt5_analyzer.calls == 1
+    assert second.processing_hints["layout_cache"] is True
+    assert second.processing_hints["layout_fingerprint"] == fingerprint
+    assert second.file_structure.column_hints == {"Konto": "account_number"}
+    assert "analysis_timestamp" not in second.processing_hints
+
+    await analyzer.layout_cache.store_column_mapping(fingerprint, ["Konto", "Saldo"], {"account_number": "Konto"})
+    assert await analyzer.layout_cache.column_mapping(fingerprint, ["Konto", "Saldo"]) == {"account_number": "Konto"}
+    assert await analyzer.layout_cache.column_mapping(fingerprint, ["Konto", "Betrag"]) is None
+
+    entry = analyzer.layout_cache.get(fingerprint)
+    # Two half-lives later 0.9 has decayed to 0.225, below the 0.6 minimum
+    half_life = analyzer.layout_cache.half_life_seconds
+    assert analyzer.layout_cache.decayed_confidence(0.9, entry["confirmed_at"], entry["confirmed_at"] + 2 * half_life) == 0.225
+    analyzer.layout_cache.half_life_seconds = 1e-9
+    await analyzer.analyze_raw_file_structure(_export(tmp_path / "mar.csv", 3), FileType.CSV, "mar.csv")
+    assert analyzer.gpt5_analyzer.calls == 2
+
+    analyzer.layout_cache.half_life_seconds = half_life
+    generation = analyzer.layout_cache.generation()
+    assert analyzer.layout_cache.invalidate(fingerprint)
+    assert analyzer.layout_cache.get(fingerprint) is None
+    # Invalidation makes cached /process-file results built with the layout stale
+    assert analyzer.layout_cache.generation() == generation + 1
+    assert not analyzer.layout_cache.invalidate(fingerprint)
+    assert analyzer.layout_cache.generation() == generation + 1
+    await analyzer.analyze_raw_file_structure(_export(tmp_path / "apr.csv", 4), FileType.CSV, "apr.csv")
+    assert analyzer.gpt5_analyzer.calls == 3
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from app.llm_cache import LLMResponseCache, llm_cache_key
+from app.result_cache import COALESCED, HIT, MISS
+
+
+@pytest.mark.asyncio
+async def test_identical_prompts_share_one_call():
+    """Test concurrent identical prompts coalesce and whitespace-only differences hit the cache"""
+    cache = LLMResponseCache(max_entries=10, db_path='', enabled=True)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return '{"mapping": {}}'
+
+    key = llm_cache_key('gpt-5', 'Headers: Konto, Saldo', 800)
+    results = await asyncio.gather(*(cache.get_or_call(key, call) for _ in range(4)))
+
+    assert len(calls) == 1
+    assert sorted(outcome for _, outcome in results) == [COALESCED] * 3 + [MISS]
+    assert llm_cache_key('gpt-5', 'Headers:  Konto,\nSaldo ', 800) == key
+    assert llm_cache_key('gpt-5', 'Headers: Konto, Saldo', 1500) != key
+    assert await cache.get_or_call(key, call) == ('{"mapping": {}}', HIT)
+    assert cache.stats == {HIT: 1, MISS: 1, COALESCED: 3}
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_coalesced_prompt():
+    """Test a caller waiting on a prompt another, since cancelled, caller started still gets the answer"""
+    cache = LLMResponseCache(max_entries=10, db_path='', enabled=True)
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return 'answer'
+
+    first = asyncio.ensure_future(cache.get_or_call('key', call))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(cache.get_or_call('key', call))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await second == ('answer', COALESCED)
+    assert cache.get('key') == 'answer'
+
+@pytest.mark.asyncio
+async def test_entries_expire_and_persist(tmp_path, monkeypatch):
+    """Test TTL expiry in memory and on disk, and LRU entries served from SQLite after eviction"""
+    import app.llm_cache as llm_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, 'time', lambda: now[0])
+    cache = LLMResponseCache(max_entries=1, ttl_seconds=60, db_path=str(tmp_path / 'llm.sqlite3'), enabled=True)
+
+    def answer(text):
+        async def call():
+            return text
+        return call
+
+    await cache.get_or_call('first', answer('one'))
+    await cache.get_or_call('second', answer('two'))
+    assert len(cache) == 1
+    # Evicted from memory, still persisted
+    assert await cache.get_or_call('first', answer('recomputed')) == ('one', HIT)
+
+    # A fresh process reads the same store
+    restarted = LLMResponseCache(max_entries=1, ttl_seconds=60, db_path=str(tmp_path / 'llm.sqlite3'), enabled=True)
+    assert await restarted.get_or_call('second', answer('recomputed')) == ('two', HIT)
+
+    now[0] += 61
+    assert await restarted.get_or_call('second', answer('fresh')) == ('fresh', MISS)
+    cache.close()
+    restarted.close()
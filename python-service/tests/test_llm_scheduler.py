@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from app.llm_scheduler import CLOSED, OPEN, CircuitOpen, DeadlineExceeded, LLMCallError, LLMScheduler
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried(monkeypatch):
+    """Test 429 and 503 answers are retried with backoff until a call succeeds"""
+    monkeypatch.setenv('LLM_BACKOFF_BASE_SECONDS', '0.01')
+    scheduler = LLMScheduler(rate_per_second=0, max_retries=3)
+    errors = [LLMCallError(429, 'rate limited', retry_after=0.02), LLMCallError(503, 'unavailable')]
+    timeouts = []
+
+    async def call(timeout):
+        timeouts.append(timeout)
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    assert await scheduler.run(call, call_site='column_mapping') == 'ok'
+    assert len(timeouts) == 3
+    assert all(0 < timeout <= scheduler.deadline_seconds for timeout in timeouts)
+
+    async def bad_request(timeout):
+        raise LLMCallError(400, 'bad request')
+
+    with pytest.raises(LLMCallError):
+        await scheduler.run(bad_request)
+    assert scheduler.breaker.failures == 0
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_recovers(monkeypatch):
+    """Test failing calls open the breaker, which rejects at once and closes after a good trial call"""
+    monkeypatch.setenv('LLM_BREAKER_FAILURES', '2')
+    monkeypatch.setenv('LLM_BREAKER_RESET_SECONDS', '0.05')
+    scheduler = LLMScheduler(rate_per_second=0, max_retries=0)
+    calls = []
+
+    async def failing(timeout):
+        calls.append(1)
+        raise LLMCallError(500, 'server error')
+
+    for _ in range(2):
+        with pytest.raises(LLMCallError):
+            await scheduler.run(failing)
+    assert scheduler.breaker.state == OPEN
+
+    with pytest.raises(CircuitOpen):
+        await scheduler.run(failing)
+    assert len(calls) == 2
+
+    async def healthy(timeout):
+        return 'ok'
+
+    await asyncio.sleep(0.06)
+    assert await scheduler.run(healthy) == 'ok'
+    assert scheduler.breaker.state == CLOSED
+
+@pytest.mark.asyncio
+async def test_deadline_bounds_slow_calls(monkeypatch):
+    """Test a call site deadline cuts a hanging call short"""
+    monkeypatch.setenv('LLM_CALL_DEADLINES', 'descriptions=0.05')
+    scheduler = LLMScheduler(rate_per_second=0)
+
+    async def hanging(timeout):
+        await asyncio.sleep(5)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    with pytest.raises(DeadlineExceeded):
+        await scheduler.run(hanging, call_site='descriptions')
+    assert loop.time() - started < 1
+    assert scheduler.deadline_for('descriptions') == 0.05
+    assert scheduler.deadline_for('column_mapping') == scheduler.deadline_seconds
+
+@pytest.mark.asyncio
+async def test_hedged_call_falls_back_and_caches_late_answer(monkeypatch):
+    """Test a slow LLM loses to the fallback at the budget, but its late answer still fills the cache"""
+    from app.llm_cache import LLMResponseCache
+
+    monkeypatch.setenv('LLM_HEDGE_BUDGETS', 'column_mapping=0.05')
+    scheduler = LLMScheduler(rate_per_second=0)
+    cache = LLMResponseCache(max_entries=10, db_path='', enabled=True)
+
+    async def completion(delay):
+        await asyncio.sleep(delay)
+        return 'llm'
+
+    def llm_call(delay):
+        return cache.get_or_call('key', lambda: scheduler.run(lambda timeout: completion(delay)))
+
+    async def fallback():
+        return 'fallback', 'local'
+
+    assert await scheduler.hedged('column_mapping', llm_call(0.2), fallback) == ('fallback', 'local')
+    assert cache.get('key') is None
+    await asyncio.sleep(0.3)
+    assert cache.get('key') == 'llm'
+    assert not scheduler._late_calls
+
+    # Answered within the budget, unless the answer is not acceptable
+    assert await scheduler.hedged('column_mapping', llm_call(0), fallback) == ('llm', 'hit')
+    rejected = await scheduler.hedged('column_mapping', llm_call(0), fallback, accept=lambda result: False)
+    assert rejected == ('fallback', 'local')
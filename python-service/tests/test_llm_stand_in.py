@@ -0,0 +1,67 @@
+import json
+
+import httpx
+import pytest
+
+from app.llm_stand_in import LLMStandIn, create_app, request_key
+
+
+def _payload(prompt):
+    return {
+        "model": "gpt-5",
+        "messages": [{"role": "system", "content": "system"}, {"role": "user", "content": prompt}],
+        "max_completion_tokens": 800,
+    }
+
+
+@pytest.mark.asyncio
+async def test_stand_in_records_and_replays(tmp_path, monkeypatch):
+    """Test misses are recorded from upstream once, then replayed from the recordings file"""
+    from app.llm_client import LLMHttpClient
+
+    upstream_calls = []
+
+    def upstream_handler(request):
+        upstream_calls.append(request.headers["authorization"])
+        return httpx.Response(200, json={"choices": [{"message": {"content": '{"mapping": {}}'}}]})
+
+    recordings = str(tmp_path / "recordings.jsonl")
+    upstream = LLMHttpClient(base_url="http://upstream/v1", http2=False, transport=httpx.MockTransport(upstream_handler))
+    recorder = LLMStandIn(recordings, mode="record", upstream=upstream)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(recorder)), base_url="http://stand-in") as client:
+        response = await client.post("/v1/chat/completions", json=_payload("Headers: Konto"), headers={"Authorization": "Bearer key"})
+        assert response.json()["choices"][0]["message"]["content"] == '{"mapping": {}}'
+        await client.post("/v1/chat/completions", json=_payload("Headers:   Konto"))
+    assert upstream_calls == ["Bearer key"]
+    with open(recordings) as handle:
+        assert [json.loads(line)["key"] for line in handle] == [request_key(_payload("Headers: Konto"))]
+
+    replayer = LLMStandIn(recordings)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(replayer)), base_url="http://stand-in") as client:
+        replayed = await client.post("/v1/chat/completions", json=_payload("Headers: Konto"))
+        missed = await client.post("/v1/chat/completions", json=_payload("Headers: Saldo"))
+    assert replayed.json()["choices"][0]["message"]["content"] == '{"mapping": {}}'
+    assert missed.status_code == 404
+    assert replayer.stats["replayed"] == 1 and replayer.stats["missed"] == 1
+
+    monkeypatch.setenv('LLM_STAND_IN_ERROR_RATE', '1')
+    monkeypatch.setenv('LLM_STAND_IN_ERROR_STATUS', '429')
+    failing = LLMStandIn(recordings)
+    status, body = await failing.complete(_payload("Headers: Konto"), {})
+    assert status == 429 and failing.stats["injected_errors"] == 1
+
+@pytest.mark.asyncio
+async def test_analyzer_switches_to_stand_in(monkeypatch):
+    """Test LLM_STAND_IN routes GPT-5 calls to the in-process stand-in without an API key"""
+    import app.llm_stand_in as llm_stand_in
+    from app.gpt5_column_analyzer import GPT5ColumnAnalyzer
+
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    monkeypatch.setenv('LLM_STAND_IN', 'true')
+    monkeypatch.setenv('LLM_STAND_IN_ON_MISS', 'empty')
+    monkeypatch.setenv('LLM_CACHE_ENABLED', 'false')
+    monkeypatch.setattr(llm_stand_in, '_stand_in_client', None)
+
+    analyzer = GPT5ColumnAnalyzer()
+    assert analyzer.llm_client.base_url == llm_stand_in.IN_PROCESS_BASE_URL
+    assert await analyzer._call_gpt5_api("Headers: Konto, Saldo") == "{}"
@@ -0,0 +1,127 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.mapping_memory import SOURCE_CUSTOM, USER_SOURCES, MappingMemory, header_signature
+
+
+def test_signature_ignores_order_case_and_internal_columns():
+    """Test reordered, re-cased headers share a signature while other headers do not"""
+    signature = header_signature(["Konto", "Saldo", "_source_row"])
+    assert header_signature([" saldo ", "KONTO"]) == signature
+    assert header_signature(["Konto", "Betrag"]) != signature
+
+
+@pytest.mark.asyncio
+async def test_entity_mapping_skips_llm(tmp_path, counting_analyzer):
+    """Test a GPT-5 mapping a file parsed with is reused per entity, and user mappings are never replaced"""
+    from app.pandas_analyzer import MAPPING_LLM, MAPPING_REMEMBERED, PandasAnalyzer
+
+    analyzer = PandasAnalyzer()
+    analyzer.gpt5_analyzer = counting_analyzer
+    analyzer.mapping_memory = memory = MappingMemory(db_path=str(tmp_path / "mappings.sqlite3"), enabled=True)
+    rows = [{"Konto": str(1200 + i), "Saldo": f"{i},00"} for i in range(4)]
+    first = {"account_number": "Konto", "amount": "Saldo"}
+
+    # Only identified, not parsed with: not remembered
+    assert await analyzer._identify_columns(["Konto", "Saldo"], rows, entity_uuid="entity-1") == (first, MAPPING_LLM)
+    assert memory.entries("entity-1") == []
+
+    # A file the mapping cannot parse does not confirm it either
+    await analyzer.normalize_data([{"Konto": "", "Saldo": "1,00"}] * 4, "entity-1", "tb.csv")
+    assert memory.entries("entity-1") == []
+
+    await analyzer.normalize_data(rows, "entity-1", "tb.csv")
+    reordered = [{"Saldo": row["Saldo"], "Konto": row["Konto"]} for row in rows]
+    calls = analyzer.gpt5_analyzer.calls
+    assert await analyzer._identify_columns(["Saldo", "Konto"], reordered, entity_uuid="entity-1") == (
+        first, MAPPING_REMEMBERED
+    )
+    assert analyzer.gpt5_analyzer.calls == calls
+
+    await analyzer._identify_columns(["Konto", "Saldo"], rows, entity_uuid="entity-2")
+    assert analyzer.gpt5_analyzer.calls == calls + 1
+
+    custom = {"account_number": "Konto", "amount": "Saldo", "description": "Konto"}
+    memory.remember("entity-1", ["Konto", "Saldo"], custom, SOURCE_CUSTOM)
+    assert memory.remember("entity-1", ["Konto", "Saldo"], first) is None
+    assert memory.lookup("entity-1", ["Konto", "Saldo"], USER_SOURCES) == custom
+    assert memory.lookup("entity-2", ["Konto", "Saldo"], USER_SOURCES) is None
+
+    [entry] = memory.entries("entity-1")
+    assert entry["source"] == SOURCE_CUSTOM and entry["hits"] == 2
+
+
+def test_stale_and_excess_entries_are_evicted(tmp_path):
+    """Test entries unused past their source's TTL are dropped, and the least recently used beyond max_entries"""
+    memory = MappingMemory(
+        db_path=str(tmp_path / "mappings.sqlite3"), enabled=True, ttl_days=10, llm_ttl_days=1, max_entries=2
+    )
+    for entity in ("a", "b", "c"):
+        memory.remember(entity, ["Konto"], {"account_number": "Konto"}, SOURCE_CUSTOM if entity == "c" else "llm")
+    assert memory.entries("a") == [] and memory.entries("c")
+
+    # Two days unused: past the GPT-5 TTL, within the user TTL
+    memory.connection.execute("UPDATE column_mappings SET last_used_at = ?", (time.time() - 2 * 86400,))
+    assert memory.lookup("b", ["Konto"]) is None
+    assert memory.lookup("c", ["Konto"]) == {"account_number": "Konto"}
+    memory.connection.execute("UPDATE column_mappings SET last_used_at = ?", (time.time() - 11 * 86400,))
+    assert memory.entries("c") == []
+    memory.remember("d", ["Konto"], {"account_number": "Konto"})
+    assert memory.connection.execute("SELECT COUNT(*) FROM column_mappings").fetchone()[0] == 1
+
+
+def test_column_mapping_api(tmp_path, monkeypatch):
+    """Test overriding, inspecting and forgetting an entity's mappings through the API"""
+    from app import main
+
+    memory = MappingMemory(db_path=str(tmp_path / "mappings.sqlite3"), enabled=True)
+    monkeypatch.setattr(main, "get_mapping_memory", lambda: memory)
+    client = TestClient(main.app)
+    url = "/entities/entity-1/column-mappings"
+
+    override = {"column_headers": ["Konto", "Saldo"], "column_mapping": {"account_number": "Konto"}}
+    response = client.put(url, json=override)
+    assert response.status_code == 200
+    signature = response.json()["header_signature"]
+    assert memory.remember("entity-1", ["Saldo", "Konto"], {"account_number": "Saldo"}) is None
+
+    bad = {"column_headers": ["Konto"], "column_mapping": {"amount": "Saldo"}}
+    assert client.put(url, json=bad).status_code == 400
+
+    [entry] = client.get(url).json()["column_mappings"]
+    assert entry["header_signature"] == signature and entry["source"] == "override"
+    assert entry["column_mapping"] == {"account_number": "Konto"}
+
+    assert client.delete(url, params={"header_signature": signature}).json()["removed"] == 1
+    assert client.delete(url, params={"header_signature": signature}).status_code == 404
+    assert client.get(url).json()["column_mappings"] == []
+
+
+def test_mapping_changes_invalidate_cached_results(tmp_path, monkeypatch):
+    """Test re-uploading a file after an override is processed again instead of served from the result cache"""
+    from app import main
+
+    memory = MappingMemory(db_path=str(tmp_path / "mappings.sqlite3"), enabled=True)
+    monkeypatch.setattr(main, "get_mapping_memory", lambda: memory)
+    client = TestClient(main.app)
+    csv_content = "Konto;Beschriftung;Saldo\n4711;Kasse;12,50\n"
+
+    def upload():
+        response = client.post(
+            "/process-file",
+            files={"file": ("override.csv", csv_content.encode(), "text/csv")},
+            data={"entity_uuid": "entity-override"}
+        )
+        assert response.status_code == 200
+        return response.headers["X-Result-Cache"]
+
+    assert upload() == "miss"
+    assert upload() == "hit"
+    override = {"column_headers": ["Konto", "Beschriftung", "Saldo"], "column_mapping": {"amount": "Saldo"}}
+    client.put("/entities/entity-override/column-mappings", json=override)
+    assert memory.generation("entity-override") == 1
+    assert upload() == "miss"
+    client.delete("/entities/entity-override/column-mappings")
+    assert upload() == "miss"
@@ -0,0 +1,47 @@
+import pandas as pd
+
+from app.prompt_compiler import (
+    PRIORITY_COLUMNS, PromptCompiler, PromptLine, estimate_tokens, header_candidates, profile_column, raw_sheet_lines
+)
+
+
+def _raw_sheet(rows=25):
+    data = [["Summen- und Saldenliste 2024", None, None, None], [None] * 4, ["Konto", "Beschriftung", "Saldo", "S/H"]]
+    data += [[str(1000 + i * 10), f"Bank {i}", f"{i}.234,{i:02d}", "S"] for i in range(rows)]
+    return pd.DataFrame(data)
+
+
+def test_column_profiles_and_header_candidates():
+    """Test columns are summarized by type ratios and the header row is found below a title row"""
+    profile = profile_column("Saldo", pd.Series(["1.234,56", "-7,10", "n/a", None, "", "12"]))
+    assert (profile.filled, profile.distinct) == (4, 4)
+    assert profile.numeric_ratio == 0.75 and profile.german_number_ratio == 0.5
+    assert profile.examples == ["1.234,56", "n/a", "12"]
+
+    frame = _raw_sheet()
+    assert header_candidates(frame)[0] == (2, ["Konto", "Beschriftung", "Saldo", "S/H"])
+    lines = [line.text for line in raw_sheet_lines('Sheet "SuSa"', frame)]
+    assert "header? row 3: Konto | Beschriftung | Saldo | S/H" in lines
+    assert any(line.startswith('C "Saldo": n=25 num=1.00 de=1.00') for line in lines)
+
+
+def test_compiler_enforces_token_budget():
+    """Test examples are dropped first, then lowest priority lines, and the budget is never exceeded"""
+    template = "Analyze this workbook.\n<<DATA>>\nReturn JSON."
+    lines = raw_sheet_lines('Sheet "SuSa"', _raw_sheet()) + raw_sheet_lines('Sheet "Notes"', _raw_sheet(), rank=1)
+
+    generous = PromptCompiler(2000).compile(template, lines)
+    assert not generous.lean and "ex=" in generous.text
+
+    lean = PromptCompiler(generous.tokens - 10).compile(template, lines)
+    assert lean.lean and lean.omitted_lines == 0 and "ex=" not in lean.text
+
+    tight = PromptCompiler(90).compile(template, lines)
+    assert tight.tokens <= 90 and tight.omitted_lines > 0
+    # Sheet titles and header rows outrank column profiles
+    assert 'Sheet "Notes"' in tight.text
+    assert 'more lines omitted' in tight.text
+
+    filler = [PromptLine(PRIORITY_COLUMNS, "x" * 350) for _ in range(10)]
+    assert PromptCompiler(200).compile(template, filler).tokens <= 200
+    assert estimate_tokens("x" * 350) == 100
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from app.llm_scheduler import LLMScheduler
+from app.result_cache import COALESCED, HIT, MISS, ResultCache, result_cache_key
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_computation():
+    """Test identical concurrent requests coalesce and later ones hit the cache"""
+    cache = ResultCache(max_bytes=1024, disk_dir='', enabled=True)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return b'{"success": true}'
+
+    key = result_cache_key('a' * 64, 'entity-1')
+    results = await asyncio.gather(*(cache.get_or_compute(key, compute) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert sorted(outcome for _, outcome in results) == [COALESCED] * 4 + [MISS]
+    assert await cache.get_or_compute(key, compute) == (b'{"success": true}', HIT)
+    assert result_cache_key('a' * 64, 'entity-2') != key
+
+@pytest.mark.asyncio
+async def test_first_caller_cancelled_does_not_cancel_waiters():
+    """Test a coalesced request still gets the value when the request that started it disconnects"""
+    cache = ResultCache(max_bytes=1024, disk_dir='', enabled=True)
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return b'shared'
+
+    first = asyncio.ensure_future(cache.get_or_compute('key', compute))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(cache.get_or_compute('key', compute))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await second == (b'shared', COALESCED)
+    assert first.cancelled()
+    assert await cache.get_or_compute('key', compute) == (b'shared', HIT)
+
+@pytest.mark.asyncio
+async def test_byte_budget_evicts_least_recently_used(tmp_path):
+    """Test LRU eviction by bytes, with evicted entries still served from disk"""
+    cache = ResultCache(max_bytes=20, disk_dir=str(tmp_path), enabled=True)
+
+    async def value(content):
+        async def compute():
+            return content
+        return compute
+
+    await cache.get_or_compute('first', await value(b'x' * 10))
+    await cache.get_or_compute('second', await value(b'y' * 10))
+    await cache.get_or_compute('first', await value(b'unused'))  # refresh 'first'
+    await cache.get_or_compute('third', await value(b'z' * 10))
+
+    assert len(cache) == 2 and cache.size_bytes == 20
+    # 'second' was evicted from memory but persisted on disk
+    assert await cache.get_or_compute('second', await value(b'recomputed')) == (b'y' * 10, HIT)
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached():
+    """Test a failed computation propagates and is retried on the next request"""
+    cache = ResultCache(max_bytes=1024, disk_dir='', enabled=True)
+
+    async def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await cache.get_or_compute('key', fail)
+
+    async def succeed():
+        return b'ok'
+
+    assert await cache.get_or_compute('key', succeed) == (b'ok', MISS)
+
+@pytest.mark.asyncio
+async def test_entries_expire_after_max_age(tmp_path):
+    """Test entries older than max_age_seconds are recomputed, in memory and on disk"""
+    cache = ResultCache(max_bytes=1024, disk_dir=str(tmp_path), enabled=True, max_age_seconds=60)
+
+    async def first():
+        return b'first'
+
+    async def second():
+        return b'second'
+
+    await cache.get_or_compute('key', first)
+    cache.max_age_seconds = 0
+    assert await cache.get_or_compute('key', second) == (b'second', MISS)
+
+    # A new process only sees the disk entry, which carries its own stored_at
+    reopened = ResultCache(max_bytes=1024, disk_dir=str(tmp_path), enabled=True, max_age_seconds=60)
+    assert await reopened.get_or_compute('key', first) == (b'second', HIT)
+    reopened.max_age_seconds = 0
+    reopened._entries.clear()
+    assert await reopened.get_or_compute('key', first) == (b'first', MISS)
+
+@pytest.mark.asyncio
+async def test_results_built_on_llm_fallbacks_are_not_cached():
+    """Test a result that used a fallback instead of the LLM is returned but computed again next time"""
+    cache = ResultCache(max_bytes=1024, disk_dir='', enabled=True)
+    scheduler = LLMScheduler(rate_per_second=0)
+
+    async def failing_llm():
+        raise ValueError("LLM unavailable")
+
+    async def compute():
+        mapping = await scheduler.hedged('column_mapping', failing_llm(), lambda: 'heuristic')
+        return mapping.encode()
+
+    assert await cache.get_or_compute('key', compute) == (b'heuristic', MISS)
+    assert len(cache) == 0
+    assert await cache.get_or_compute('key', compute) == (b'heuristic', MISS)